@@ -1,10 +1,29 @@
 import os
+import re
 import json
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import time
+import numpy as np
+from flask import Flask, Response, render_template, request, jsonify, redirect, send_file, url_for, stream_with_context
 from dotenv import load_dotenv
 from crawler import WebCrawler
-from embeddings import GoogleCloudEmbeddings, EmbeddingProcessor
+from crawl_state import CrawlStateStore
+from crawl_spill import CrawlSpill
+from embeddings import EmbeddingProcessor, create_embedding_client
+from embedding_cache import EmbeddingCache
+from embedding_store import EmbeddingStore
+from vector_index import VectorIndex
+from pipeline import StreamingPipeline
+from dedup import Deduplicator
 from visualizer import EmbeddingVisualizer
+from plot_cache import PlotPayloadCache
+from clustering import TopicClusterer, load_clusters, save_clusters
+from link_graph import LinkGraph
+from comparison import (COMPARISON_MODES, SiteComparison, crawl_sites, embed_sites, load_sites,
+                        save_sites, site_name)
+import export
+import metrics
+import reduction
+from jobs import JobManager, JobQueueFull, create_result_store, FINISHED_STATES, SUCCEEDED
 from flask_cors import CORS
 
 # Load environment variables
@@ -13,10 +32,368 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-# Global variables to store data
-crawled_data = []
-processed_data = []
-visualizations = {}
+# Crawl and embedding work runs in a background pool; each analysis is a job
+jobs = JobManager(
+    store=create_result_store(),
+    max_workers=int(os.getenv("JOB_WORKERS", 2)),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", 16)),
+    ttl_seconds=int(os.getenv("JOB_TTL_SECONDS", 3600))
+)
+
+# Visualization payloads, computed once per dataset version
+plot_cache = PlotPayloadCache()
+
+# Sites crawled concurrently by one /compare job
+MAX_COMPARED_SITES = 10
+
+# Memory-bounded crawls keep their frontier and page bodies on disk in the
+# job's artifact directory (see crawl_spill.py); a resident-memory ceiling
+# stops a crawl, which can then be resumed by a new job
+SPILL_CRAWLS = os.getenv("CRAWL_SPILL", "0") == "1"
+CRAWL_MAX_RSS_MB = int(os.getenv("CRAWL_MAX_RSS_MB", 0)) or None
+
+# Crawled pages listed in a memory-bounded crawl's result
+CRAWL_PREVIEW_PAGES = 20
+
+
+def crawl_options(source):
+    """Read crawl settings from request form data or query args."""
+    url = source.get('url')
+    if not url:
+        raise ValueError('URL is required')
+
+    try:
+        max_pages = int(source.get('max_pages', 20))
+    except ValueError:
+        max_pages = 20
+
+    resume = source.get('resume') or None
+    if resume is not None and not (re.fullmatch(r'[0-9a-f]{32}', resume)
+                                   and CrawlSpill.exists(os.path.join(jobs.artifact_dir(resume), 'crawl'))):
+        raise ValueError('No resumable crawl for this job')
+
+    return {
+        'url': url,
+        'max_pages': max_pages,
+        'same_domain': source.get('same_domain') == 'on',
+        'incremental': source.get('incremental') == 'on',
+        'bounded': SPILL_CRAWLS or resume is not None or source.get('bounded') == 'on',
+        'resume': resume
+    }
+
+
+def compare_options(source):
+    """Read multi-site comparison settings; the first URL is the reference site."""
+    urls = [url.strip() for url in re.split(r'[\s,]+', source.get('urls', '')) if url.strip()]
+    urls = list(dict.fromkeys(urls))
+    if len(urls) < 2:
+        raise ValueError('At least two site URLs are required')
+    if len(urls) > MAX_COMPARED_SITES:
+        raise ValueError(f'At most {MAX_COMPARED_SITES} sites can be compared')
+
+    mode = source.get('mode', 'joint')
+    if mode not in COMPARISON_MODES:
+        raise ValueError(f'Unknown comparison mode: {mode}')
+
+    try:
+        max_pages = int(source.get('max_pages', 20))
+    except ValueError:
+        max_pages = 20
+
+    return {
+        'urls': urls,
+        'max_pages': max_pages,
+        'mode': mode,
+        'incremental': source.get('incremental') == 'on'
+    }
+
+
+def build_crawler(url, max_pages, same_domain, incremental, spill_dir=None):
+    state_store = CrawlStateStore() if incremental else None
+    return WebCrawler(url, max_pages=max_pages, same_domain_only=same_domain,
+                      state_store=state_store, spill_dir=spill_dir, max_rss_mb=CRAWL_MAX_RSS_MB)
+
+
+def crawl_spill_dir(job, bounded, resume=None):
+    """Spill directory of a memory-bounded crawl job (taking over the resumed job's), or None."""
+    if not bounded:
+        return None
+    directory = os.path.join(job.artifact_dir, 'crawl')
+    if resume is not None:
+        previous = os.path.join(jobs.artifact_dir(resume), 'crawl')
+        if CrawlSpill.exists(previous) and not os.path.exists(directory):
+            os.makedirs(job.artifact_dir, exist_ok=True)
+            os.replace(previous, directory)
+            # The earlier job no longer owns its pages; point readers at this one
+            previous_job = jobs.get(resume)
+            if previous_job and previous_job.get('result'):
+                jobs.store.update(resume, result=dict(previous_job['result'], spill=None,
+                                                      resumed_by=job.job_id))
+    return directory
+
+
+def crawl_message(crawler):
+    message = f'Crawled {len(crawler.pages_data)} pages'
+    if crawler.memory_limited:
+        message += f' (stopped at the {crawler.max_rss_mb} MB memory limit'
+        message += '; resume it with a new crawl)' if crawler.spill is not None else ')'
+    return message
+
+
+def run_crawl(job, url, max_pages, same_domain, incremental, bounded=False, resume=None):
+    spill_dir = crawl_spill_dir(job, bounded, resume)
+    crawler = build_crawler(url, max_pages, same_domain, incremental, spill_dir)
+    try:
+        for _ in crawler.iter_pages():
+            job.report(crawled=len(crawler.pages_data))
+
+        if not crawler.pages_data:
+            raise ValueError('Failed to crawl any pages. Please check the URL and try again.')
+
+        # Kept with the crawl so a later vectorize job can attach it to its store
+        graph_dir = crawler.build_link_graph().save(os.path.join(job.artifact_dir, 'graph'))
+        result = {
+            'message': crawl_message(crawler),
+            'unchanged': len(crawler.unchanged_urls),
+            'page_count': len(crawler.pages_data),
+            'graph': graph_dir
+        }
+        if spill_dir is None:
+            result['pages'] = crawler.pages_data
+        else:
+            # Page bodies stay in the spill; vectorize reads them from there
+            result['spill'] = spill_dir
+            result['pages'] = [{'url': page['url'], 'title': page['title']}
+                               for page in crawler.pages_data[:CRAWL_PREVIEW_PAGES]]
+        return result
+    finally:
+        crawler.close()
+
+
+def run_compare(job, urls, max_pages, mode, incremental):
+    # Compile UMAP while crawling, so the first plot view does not wait for it
+    reduction.warm_up(background=True)
+    crawlers = [build_crawler(url, max_pages, True, incremental) for url in urls]
+    site_pages = crawl_sites(
+        crawlers,
+        on_page=lambda site, page: job.report(crawled=sum(len(c.pages_data) for c in crawlers))
+    )
+    if not any(site_pages):
+        raise ValueError('Failed to crawl any pages. Please check the URLs and try again.')
+
+    # Duplicates are only dropped within a site; shared pages across sites
+    # are part of the comparison
+    deduplicators = [Deduplicator() for _ in urls]
+    site_pages = [[dict(page) for page in deduplicator.dedupe(pages)]
+                  for deduplicator, pages in zip(deduplicators, site_pages)]
+    job.report(skipped=sum(deduplicator.skipped for deduplicator in deduplicators))
+
+    # Cached embeddings are reused, so only new or changed pages are embedded
+    embedding_client = create_embedding_client(cache=EmbeddingCache())
+    processor = EmbeddingProcessor(embedding_client)
+    try:
+        store, labels = embed_sites(processor, site_pages)
+    finally:
+        embedding_client.close()
+    job.report(vectorized=len(store), passages=len(processor.passages))
+
+    sites = [site_name(url) for url in urls]
+    counts = np.bincount(labels, minlength=len(sites))
+    note = ''
+    if mode == 'reference' and counts[0] == 0:
+        # Nothing to fit the reference projection on
+        mode = 'joint'
+        note = f'; no pages from {sites[0]}, so all sites share a joint projection'
+    save_sites(os.path.join(job.artifact_dir, 'store'), sites, labels, reference=0, mode=mode)
+    message = ', '.join(f'{name}: {count} pages' for name, count in zip(sites, counts))
+    return store_result(job, store, f'Compared {len(sites)} sites ({message}){note}',
+                        passages=processor.passages)
+
+
+def run_vectorize(job, crawl_job_id):
+    reduction.warm_up(background=True)
+    crawl_job = jobs.get(crawl_job_id)
+    if not crawl_job or crawl_job['status'] != SUCCEEDED:
+        raise ValueError('No crawled data available')
+
+    crawl_result = crawl_job['result']
+    if crawl_result.get('resumed_by'):
+        raise ValueError(f"This crawl was resumed by job {crawl_result['resumed_by']}; "
+                         'vectorize that job instead')
+    spill = None
+    if crawl_result.get('spill'):
+        if not CrawlSpill.exists(crawl_result['spill']):
+            raise ValueError('This crawl was resumed by another job; vectorize that job instead')
+        spill = CrawlSpill(crawl_result['spill'], create=False)
+
+    deduplicator = Deduplicator()
+    embedding_client = create_embedding_client(cache=EmbeddingCache())
+    processor = EmbeddingProcessor(embedding_client)
+    try:
+        if spill is None:
+            # Copy the pages so the crawl job's stored result is left untouched
+            pages = [dict(page) for page in deduplicator.dedupe(crawl_result['pages'])]
+            job.report(skipped=deduplicator.skipped)
+            processed_data = EmbeddingStore.from_pages(processor.process_pages(pages))
+        else:
+            # Read from the crawl's segment files and embedded a chunk at a time
+            processed_data = EmbeddingStore()
+            for chunk in spill.pages.iter_chunks():
+                pages = deduplicator.dedupe(chunk)
+                if pages:
+                    processed_data.extend(processor.process_pages(pages))
+                job.report(vectorized=len(processed_data), skipped=deduplicator.skipped)
+    finally:
+        embedding_client.close()
+        if spill is not None:
+            spill.close()
+    job.report(vectorized=len(processed_data), passages=len(processor.passages))
+
+    graph_dir = crawl_result.get('graph')
+    graph = LinkGraph.load(graph_dir) if graph_dir and LinkGraph.exists(graph_dir) else None
+    return store_result(job, processed_data, f'Vectorized {len(processed_data)} pages',
+                        deduplicator=deduplicator, passages=processor.passages, graph=graph)
+
+
+def run_analysis(job, url, max_pages, same_domain, incremental, bounded=False, resume=None):
+    reduction.warm_up(background=True)
+    crawler = build_crawler(url, max_pages, same_domain, incremental,
+                            crawl_spill_dir(job, bounded, resume))
+    embedding_client = create_embedding_client(cache=EmbeddingCache())
+    deduplicator = Deduplicator()
+    processor = EmbeddingProcessor(embedding_client)
+    pipeline = StreamingPipeline(crawler, processor, deduplicator=deduplicator)
+    index = VectorIndex()
+
+    try:
+        for event, payload in pipeline.run():
+            if event == 'embedded' and payload:
+                # Grow the search index batch by batch alongside the embeddings
+                # (a batch of pages without text embeds to nothing)
+                index.add([page['embedding'] for page in payload])
+            job.report(crawled=len(pipeline.pages), vectorized=len(pipeline.processed),
+                       passages=len(processor.passages), skipped=deduplicator.skipped)
+        if not pipeline.pages:
+            raise ValueError('Failed to crawl any pages. Please check the URL and try again.')
+        graph = crawler.build_link_graph()
+    finally:
+        embedding_client.close()
+        crawler.close()
+
+    return store_result(
+        job, pipeline.processed,
+        f'{crawl_message(crawler)} and vectorized {len(pipeline.processed)}',
+        index=index,
+        deduplicator=deduplicator,
+        passages=processor.passages,
+        graph=graph
+    )
+
+
+def store_result(job, store, message, index=None, deduplicator=None, passages=None, graph=None):
+    """Save embedded pages and their search index next to the job and return the job's result record."""
+    store.save(os.path.join(job.artifact_dir, 'store'))
+    (index or VectorIndex.from_store(store)).save(os.path.join(job.artifact_dir, 'store'))
+    if len(store):
+        with metrics.STAGE_SECONDS.time(stage='cluster'):
+            clusters = TopicClusterer().fit(store)
+        save_clusters(clusters, os.path.join(job.artifact_dir, 'store'))
+        job.report(topics=len(clusters['clusters']))
+    if passages is not None and len(passages):
+        # Chunk-level vectors so search can return the matching passage
+        passages.save(os.path.join(job.artifact_dir, 'passages'))
+        VectorIndex.from_store(passages).save(os.path.join(job.artifact_dir, 'passages'))
+    if graph is not None:
+        graph.save(os.path.join(job.artifact_dir, 'graph'))
+    if deduplicator is not None and deduplicator.skipped:
+        message += f' (skipped {deduplicator.skipped} duplicate pages)'
+    return {
+        'message': message,
+        'store': os.path.join(job.artifact_dir, 'store'),
+        'passages': os.path.join(job.artifact_dir, 'passages') if passages is not None and len(passages) else None,
+        'graph': os.path.join(job.artifact_dir, 'graph') if graph is not None else None,
+        'duplicates': deduplicator.duplicates if deduplicator is not None else {},
+        'pages': [{'url': url, 'title': title} for url, title in zip(store.urls, store.titles)]
+    }
+
+
+def submit_job(kind, fn, **params):
+    # Optional per-job profiling, e.g. POST /analyze with profile=cprofile
+    profile = request.values.get('profile') or None
+    if profile is not None and (profile not in metrics.PROFILERS
+                                or (profile == 'pyinstrument' and metrics.pyinstrument is None)):
+        return jsonify({'status': 'error', 'message': f'Unsupported profiler: {profile}'}), 400
+
+    try:
+        job_id = jobs.submit(kind, fn, profile=profile, **params)
+    except JobQueueFull as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job_id,
+        'status_url': url_for('job_status', job_id=job_id)
+    }), 202
+
+
+def job_summary(job):
+    """Job state without the bulky page contents and embeddings."""
+    result = job['result'] or {}
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'message': result.get('message'),
+        'pages': [{'url': page['url'], 'title': page['title']} for page in result.get('pages', [])],
+        'page_count': result.get('page_count', len(result.get('pages', [])))
+    }
+
+
+def processed_pages(job_id):
+    """EmbeddingStore of a finished vectorize/analyze/compare job (memory-mapped), or None."""
+    job = jobs.get(job_id) if job_id else None
+    if not job or job['status'] != SUCCEEDED or job['kind'] not in ('vectorize', 'analyze', 'compare'):
+        return None
+    return EmbeddingStore.load(job['result']['store'])
+
+
+def search_artifacts(job_id, passages=False):
+    """
+    EmbeddingStore and VectorIndex of a finished vectorize/analyze job, or (None, None).
+
+    With ``passages`` the chunk-level store and index are returned instead.
+    """
+    store = processed_pages(job_id)
+    if store is None:
+        return None, None
+    directory = jobs.get(job_id)['result']['store']
+    if passages:
+        directory = jobs.get(job_id)['result'].get('passages')
+        if not directory:
+            return None, None
+        store = EmbeddingStore.load(directory)
+    index = VectorIndex.load(directory) if VectorIndex.exists(directory) else VectorIndex.from_store(store)
+    return store, index
+
+
+def result_count():
+    try:
+        return max(1, min(int(request.args.get('k', 10)), 100))
+    except ValueError:
+        return 10
+
+
+def search_results(store, hits, passages=False):
+    results = []
+    for i, score in hits:
+        result = {'url': store.urls[i], 'title': store.titles[i], 'score': score}
+        if passages:
+            result['passage'] = store.content(i)
+        results.append(result)
+    return results
+
 
 @app.route('/')
 def index():
@@ -24,96 +401,311 @@ def index():
 
 @app.route('/crawl', methods=['POST'])
 def crawl():
-    global crawled_data
-    
     try:
-        # Get form data
-        url = request.form.get('url')
-        if not url:
-            return jsonify({
-                'status': 'error',
-                'message': 'URL is required'
-            }), 400
-            
-        try:
-            max_pages = int(request.form.get('max_pages', 20))
-        except ValueError:
-            max_pages = 20
-            
-        same_domain = request.form.get('same_domain') == 'on'
-        
-        # Initialize and run crawler
-        crawler = WebCrawler(url, max_pages=max_pages, same_domain_only=same_domain)
-        crawled_data = crawler.crawl()
-        
-        if not crawled_data:
-            return jsonify({
-                'status': 'error',
-                'message': 'Failed to crawl any pages. Please check the URL and try again.'
-            }), 400
-        
-        return jsonify({
-            'status': 'success',
-            'message': f'Crawled {len(crawled_data)} pages',
-            'pages': [{'url': page['url'], 'title': page['title']} for page in crawled_data]
-        })
-    except Exception as e:
-        app.logger.error(f"Error in /crawl endpoint: {str(e)}")
+        options = crawl_options(request.form)
+    except ValueError as e:
         return jsonify({
             'status': 'error',
-            'message': f'An error occurred: {str(e)}'
-        }), 500
+            'message': str(e)
+        }), 400
+
+    return submit_job('crawl', run_crawl, **options)
 
 @app.route('/vectorize', methods=['POST'])
 def vectorize():
-    global crawled_data, processed_data
-    
-    if not crawled_data:
-        return jsonify({'status': 'error', 'message': 'No crawled data available'})
-    
+    crawl_job_id = request.form.get('job_id') or request.args.get('job_id')
+    crawl_job = jobs.get(crawl_job_id) if crawl_job_id else None
+    if not crawl_job or crawl_job['kind'] != 'crawl' or crawl_job['status'] != SUCCEEDED:
+        return jsonify({'status': 'error', 'message': 'No crawled data available'}), 400
+
+    return submit_job('vectorize', run_vectorize, crawl_job_id=crawl_job_id)
+
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    """Crawl and vectorize in one overlapping pipeline job."""
     try:
-        # Initialize embedding client with default project ID from embeddings.py
-        embedding_client = GoogleCloudEmbeddings()
-        processor = EmbeddingProcessor(embedding_client)
-        
-        # Process the crawled data
-        processed_data = processor.process_pages(crawled_data)
-        
+        options = crawl_options(request.form)
+    except ValueError as e:
         return jsonify({
-            'status': 'success',
-            'message': f'Vectorized {len(processed_data)} pages'
-        })
-        
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return submit_job('analyze', run_analysis, **options)
+
+@app.route('/compare', methods=['POST'])
+def compare():
+    """Crawl several sites concurrently and embed them into one comparable store."""
+    try:
+        options = compare_options(request.form)
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return submit_job('compare', run_compare, **options)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+    return jsonify({
+        'status': 'success',
+        'job': job_summary(job)
+    })
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Report a job's progress as server-sent events until it finishes."""
+    if not jobs.get(job_id):
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def events():
+        last_progress = None
+        while True:
+            job = jobs.get(job_id)
+            if not job:
+                yield sse('failed', {'message': 'Job expired'})
+                return
+            if job['progress'] != last_progress:
+                last_progress = job['progress']
+                yield sse('progress', last_progress)
+            if job['status'] in FINISHED_STATES:
+                summary = job_summary(job)
+                yield sse('done' if job['status'] == SUCCEEDED else 'failed', {
+                    'message': summary['message'] or summary['error'],
+                    'job_id': job_id
+                })
+                return
+            time.sleep(0.5)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/profile', methods=['GET'])
+def job_profile(job_id):
+    """Profiler report of a job submitted with ``profile=cprofile|pyinstrument``."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    if job['status'] not in FINISHED_STATES:
+        return jsonify({'status': 'error', 'message': 'Job is still running'}), 409
+
+    directory = jobs.artifact_dir(job_id)
+    for name, mimetype in (('profile.html', 'text/html'), ('profile.txt', 'text/plain')):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return send_file(os.path.abspath(path), mimetype=mimetype)
+    return jsonify({'status': 'error', 'message': 'Job was not profiled'}), 404
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Pipeline metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/visualize', methods=['GET'])
 def visualize():
-    global processed_data, visualizations
-    
+    job_id = request.args.get('job_id')
+    processed_data = processed_pages(job_id)
     if not processed_data:
         return redirect(url_for('index'))
-    
-    # Generate visualizations
-    visualizer = EmbeddingVisualizer(processed_data)
-    visualizations = visualizer.generate_visualizations()
-    
-    # Convert plots to JSON
-    plots_json = {
-        'pca_3d': visualizations['pca_3d'].to_json(),
-        'pca_2d': visualizations['pca_2d'].to_json(),
-        'umap_3d': visualizations['umap_3d'].to_json(),
-        'umap_2d': visualizations['umap_2d'].to_json()
-    }
-    
-    return render_template('results.html', plots=plots_json)
+
+    # The page is a light shell; the plots are loaded from /jobs/<id>/plots
+    return render_template('results.html', job_id=job_id, parquet=export.parquet_available())
+
+@app.route('/jobs/<job_id>/plots', methods=['GET'])
+def plot_payload(job_id):
+    """Projections for every view as one compressed, cacheable payload."""
+    processed_data = processed_pages(job_id)
+    if not processed_data:
+        return jsonify({'status': 'error', 'message': 'No processed data available'}), 404
+
+    directory = jobs.get(job_id)['result']['store']
+    visualizer = EmbeddingVisualizer(processed_data, clusters=load_clusters(directory),
+                                     sites=load_sites(directory))
+    payload = plot_cache.get(
+        directory,
+        visualizer.build_payload,
+        params=(visualizer.max_points, visualizer.lazy_hover_threshold)
+    )
+
+    body, encoding = payload.body(request.accept_encodings)
+    response = Response(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(payload.etag)
+    return response.make_conditional(request)
+
+@app.route('/jobs/<job_id>/clusters', methods=['GET'])
+def job_clusters(job_id):
+    """Topic clusters of a job: size, keywords and representative pages."""
+    processed_data = processed_pages(job_id)
+    clusters = load_clusters(jobs.get(job_id)['result']['store']) if processed_data else None
+    if clusters is None:
+        return jsonify({'status': 'error', 'message': 'No clusters available'}), 404
+
+    return jsonify({
+        'status': 'success',
+        'method': clusters['method'],
+        'clusters': [{
+            'id': cluster['id'],
+            'size': cluster['size'],
+            'keywords': cluster['keywords'],
+            'representatives': [{'url': processed_data.urls[i], 'title': processed_data.titles[i]}
+                                for i in cluster['representatives']]
+        } for cluster in clusters['clusters']]
+    })
+
+@app.route('/jobs/<job_id>/comparison', methods=['GET'])
+def job_comparison(job_id):
+    """Site centroid distances and the reference site's coverage gaps for a compare job."""
+    processed_data = processed_pages(job_id)
+    directory = jobs.get(job_id)['result']['store'] if processed_data else None
+    sites = load_sites(directory) if directory else None
+    if sites is None:
+        return jsonify({'status': 'error', 'message': 'No site comparison available'}), 404
+
+    try:
+        threshold = float(request.args.get('threshold', 0.75))
+        limit = max(1, min(int(request.args.get('limit', 20)), 500))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'threshold and limit must be numbers'}), 400
+
+    comparison = SiteComparison(processed_data, sites['labels'], sites['sites'], sites['reference'])
+    report = comparison.report(clusters=load_clusters(directory), threshold=threshold, limit=limit)
+    return jsonify({'status': 'success', 'mode': sites['mode'], **report})
+
+def link_graph_artifacts(job_id):
+    """EmbeddingStore and LinkGraph of a finished vectorize/analyze job, or (None, None)."""
+    store = processed_pages(job_id)
+    graph_dir = jobs.get(job_id)['result'].get('graph') if store is not None else None
+    if not graph_dir or not LinkGraph.exists(graph_dir):
+        return None, None
+    return store, LinkGraph.load(graph_dir)
+
+@app.route('/jobs/<job_id>/graph', methods=['GET'])
+def job_graph(job_id):
+    """Site structure of a job: link counts, click depths, top pages by PageRank and orphans."""
+    store, graph = link_graph_artifacts(job_id)
+    if graph is None:
+        return jsonify({'status': 'error', 'message': 'No link graph available'}), 404
+
+    try:
+        top = max(1, min(int(request.args.get('top', 20)), 500))
+    except ValueError:
+        top = 20
+    titles = dict(zip(store.urls, store.titles))
+    return jsonify({'status': 'success', **graph.summary(titles=titles, top=top)})
+
+@app.route('/jobs/<job_id>/graph/unlinked', methods=['GET'])
+def similar_unlinked(job_id):
+    """Pairs of semantically similar pages that do not link to each other."""
+    store, graph = link_graph_artifacts(job_id)
+    if graph is None:
+        return jsonify({'status': 'error', 'message': 'No link graph available'}), 404
+
+    try:
+        threshold = float(request.args.get('threshold', 0.85))
+        limit = max(1, min(int(request.args.get('limit', 50)), 1000))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'threshold and limit must be numbers'}), 400
+
+    pairs = graph.similar_unlinked(store, threshold=threshold, limit=limit)
+    return jsonify({
+        'status': 'success',
+        'pairs': [{
+            'source': {'url': store.urls[i], 'title': store.titles[i]},
+            'target': {'url': store.urls[j], 'title': store.titles[j]},
+            'similarity': score
+        } for i, j, score in pairs]
+    })
+
+@app.route('/jobs/<job_id>/pages/<int:index>', methods=['GET'])
+def page_preview(job_id, index):
+    """Content preview for one plotted point, loaded on demand by large plots."""
+    processed_data = processed_pages(job_id)
+    if not processed_data or index >= len(processed_data):
+        return jsonify({'status': 'error', 'message': 'Page not found'}), 404
+
+    return jsonify({
+        'status': 'success',
+        'url': processed_data.urls[index],
+        'title': processed_data.titles[index],
+        'content_preview': EmbeddingVisualizer._preview(processed_data.content(index))
+    })
+
+@app.route('/search', methods=['GET'])
+def search():
+    """Nearest pages (or passages, with ``scope=passages``) to a free-text query."""
+    passages = request.args.get('scope') == 'passages'
+    store, index = search_artifacts(request.args.get('job_id'), passages=passages)
+    if store is None:
+        return jsonify({'status': 'error', 'message': 'No processed data available'}), 404
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'status': 'error', 'message': 'Query is required'}), 400
+
+    try:
+        embedding_client = create_embedding_client(cache=EmbeddingCache())
+        try:
+            query_vector = embedding_client.embed_query(query)
+        finally:
+            embedding_client.close()
+    except Exception as e:
+        app.logger.error(f"Error in /search endpoint: {str(e)}")
+        return jsonify({'status': 'error', 'message': f'An error occurred: {str(e)}'}), 500
+
+    return jsonify({
+        'status': 'success',
+        'results': search_results(store, index.search(query_vector, k=result_count()), passages=passages)
+    })
+
+@app.route('/similar/<path:url>', methods=['GET'])
+def similar(url):
+    """Pages most similar to an already crawled page."""
+    store, index = search_artifacts(request.args.get('job_id'))
+    if store is None:
+        return jsonify({'status': 'error', 'message': 'No processed data available'}), 404
+
+    try:
+        position = store.urls.index(url)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Page not found'}), 404
+
+    hits = index.search(index.vector(position), k=result_count(), exclude=position)
+    return jsonify({
+        'status': 'success',
+        'results': search_results(store, hits)
+    })
 
 @app.route('/export', methods=['GET'])
 def export_data():
-    global processed_data
-    
+    """
+    Export a finished job's pages.
+
+    Without ``format`` this returns a JSON preview (no vectors) for the
+    results page. ``format=jsonl|npy|parquet`` downloads the embeddings,
+    optionally with ``quantization=float16|int8``; JSONL and NPY are streamed
+    chunk by chunk and Parquet is written once into the job's artifacts.
+    ``format=metadata`` streams the JSONL sidecar of an NPY export.
+    """
+    job_id = request.args.get('job_id')
+    processed_data = processed_pages(job_id)
     if not processed_data:
         return jsonify({'status': 'error', 'message': 'No processed data available'})
+
+    export_format = request.args.get('format')
+    if export_format:
+        return export_download(job_id, processed_data, export_format)
     
     # Create a simplified version for export (without the large embedding vectors)
     export_data = []
@@ -129,5 +721,41 @@ def export_data():
         'data': export_data
     })
 
+def export_download(job_id, store, export_format):
+    quantization = request.args.get('quantization') or 'float32'
+    if export_format not in export.EXPORT_FORMATS + ('metadata',):
+        return jsonify({'status': 'error', 'message': f'Unknown export format: {export_format}'}), 400
+    if quantization not in export.QUANTIZATIONS:
+        return jsonify({'status': 'error', 'message': f'Unknown quantization: {quantization}'}), 400
+
+    name = f"embeddings-{job_id}-{quantization}"
+    if export_format == 'parquet':
+        directory = os.path.join(jobs.artifact_dir(job_id), 'exports')
+        path = os.path.join(directory, f"embeddings-{quantization}.parquet")
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            try:
+                export.write_parquet(store, path + '.tmp', quantization)
+            except ImportError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            except Exception as e:
+                app.logger.error(f"Error writing Parquet export: {str(e)}")
+                if os.path.exists(path + '.tmp'):
+                    os.remove(path + '.tmp')
+                return jsonify({'status': 'error', 'message': f'Parquet export failed: {str(e)}'}), 500
+            os.replace(path + '.tmp', path)
+        return send_file(os.path.abspath(path), mimetype='application/vnd.apache.parquet',
+                         as_attachment=True, download_name=f"{name}.parquet")
+
+    if export_format == 'npy':
+        body, mimetype, filename = export.iter_npy(store, quantization), 'application/octet-stream', f"{name}.npy"
+    else:
+        body = export.iter_jsonl(store, quantization, include_vectors=export_format == 'jsonl',
+                                 include_content=request.args.get('content') == '1')
+        mimetype = 'application/x-ndjson'
+        filename = f"{name}.jsonl" if export_format == 'jsonl' else f"metadata-{job_id}-{quantization}.jsonl"
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    app.run(debug=True) 
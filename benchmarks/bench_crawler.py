@@ -0,0 +1,102 @@
+"""Benchmark WebCrawler throughput against the local fixture site.
+
+Usage:
+    python benchmarks/bench_crawler.py --pages 100 --latency 0.05 --workers 1 2 4 8 16
+    python benchmarks/bench_crawler.py --pages 5000 --discovery
+    python benchmarks/bench_crawler.py --pages 5000 --latency 0 --workers 8 --spill
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+from crawler import WebCrawler  # noqa: E402
+from benchmarks.fixture_site import FixtureServer, build_site  # noqa: E402
+
+
+def run(base_url, pages, workers, per_host_limit, spill_dir=None):
+    crawler = WebCrawler(base_url, max_pages=pages, max_workers=workers,
+                         per_host_limit=per_host_limit, spill_dir=spill_dir)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = crawler.crawl(max_pages=pages)
+    elapsed = time.perf_counter() - start
+    crawler.close()
+    return len(result), elapsed
+
+
+def memory(base_url, pages, workers):
+    """Resident memory growth of an in-memory crawl vs. a spilled one."""
+    results = {}
+    for mode in ('memory', 'spill'):
+        spill_dir = tempfile.mkdtemp() if mode == 'spill' else None
+        before = metrics.process_rss()
+        crawler = WebCrawler(base_url, max_pages=pages, max_workers=workers,
+                             per_host_limit=workers, spill_dir=spill_dir)
+        peak = before
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in crawler.iter_pages():
+                peak = max(peak, metrics.process_rss())
+        results[mode] = (len(crawler.pages_data), time.perf_counter() - start, peak - before)
+        crawler.close()
+        del crawler
+        if spill_dir is not None:
+            shutil.rmtree(spill_dir)
+    return results
+
+
+def discovery(base_url, pages):
+    """Requests needed to learn every URL: sitemap seeding vs. the whole site."""
+    crawler = WebCrawler(base_url, max_pages=pages)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        seeded = crawler.seed_from_sitemaps()
+    return seeded, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Artificial per-request server latency in seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--discovery", action="store_true",
+                        help="Measure URL discovery through robots.txt and sitemaps")
+    parser.add_argument("--spill", action="store_true",
+                        help="Compare memory growth of in-memory and spilled (memory-bounded) crawls")
+    args = parser.parse_args()
+
+    site = build_site(args.pages)
+    if args.spill:
+        with FixtureServer(site, latency=args.latency) as server:
+            print(f"{'mode':>8} {'pages':>6} {'seconds':>8} {'RSS growth MB':>14}")
+            for mode, (crawled, elapsed, growth) in memory(server.base_url, args.pages,
+                                                           args.workers[-1]).items():
+                print(f"{mode:>8} {crawled:>6} {elapsed:>8.2f} {growth / 1e6:>14.1f}")
+        return
+
+    if args.discovery:
+        with FixtureServer(site, latency=args.latency, sitemaps=True) as server:
+            seeded, elapsed = discovery(server.base_url, args.pages)
+            print(f"sitemaps: {seeded} URLs from {server.requests} requests in {elapsed:.2f}s "
+                  f"(link following needs {args.pages} page fetches)")
+        return
+
+    with FixtureServer(site, latency=args.latency) as server:
+        print(f"{'workers':>8} {'pages':>6} {'seconds':>8} {'pages/sec':>10}")
+        for workers in args.workers:
+            crawled, elapsed = run(server.base_url, args.pages, workers,
+                                   per_host_limit=workers)
+            print(f"{workers:>8} {crawled:>6} {elapsed:>8.2f} {crawled / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark batched embedding throughput against the local stub or a local backend.
+
+With ``--backend`` a local CPU backend (see local_embeddings.py) is timed
+with each worker count instead of the stub API at each batch size.
+
+Usage:
+    python benchmarks/bench_embeddings.py --texts 500 --latency 0.2 --batch-sizes 1 20 100
+    python benchmarks/bench_embeddings.py --texts 5000 --backend hashing --workers 1 2 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+
+from embeddings import GoogleCloudEmbeddings, create_embedding_client  # noqa: E402
+from benchmarks.stub_embeddings import StubEmbedContent  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="Simulated round-trip time per request in seconds")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 20, 100])
+    parser.add_argument("--in-flight", type=int, default=4)
+    parser.add_argument("--backend", help="Local backend to time instead of the stub API")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    if args.backend:
+        bench_local(args)
+        return
+
+    texts = [f"synthetic page {i} about vectors and content" for i in range(args.texts)]
+    print(f"{'batch':>6} {'requests':>9} {'seconds':>8} {'texts/sec':>10}")
+    for batch_size in args.batch_sizes:
+        stub = StubEmbedContent(latency=args.latency)
+        client = GoogleCloudEmbeddings(batch_size=batch_size, max_in_flight=args.in_flight,
+                                       embed_fn=stub)
+        start = time.perf_counter()
+        client.get_embeddings(texts)
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>6} {stub.calls:>9} {elapsed:>8.2f} {len(texts) / elapsed:>10.1f}")
+
+
+def bench_local(args):
+    # Page-like texts of very different lengths, where length sorting matters
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    texts = [" ".join(rng.choices(vocabulary, k=rng.randint(20, 1500))) for _ in range(args.texts)]
+    print(f"{'workers':>7} {'seconds':>8} {'texts/sec':>10}")
+    for workers in args.workers:
+        client = create_embedding_client(args.backend, workers=workers)
+        try:
+            # Warm up: several batches, so worker processes start here
+            client.get_embeddings(texts[:256])
+            start = time.perf_counter()
+            client.get_embeddings(texts)
+            elapsed = time.perf_counter() - start
+        finally:
+            client.close()
+        print(f"{workers:>7} {elapsed:>8.2f} {len(texts) / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
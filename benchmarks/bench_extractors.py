@@ -0,0 +1,99 @@
+"""Micro-benchmark the HTML extraction backends on saved HTML pages.
+
+Usage:
+    python benchmarks/bench_extractors.py [page.html ...] [--repeat 20]
+
+Without arguments a large synthetic article is generated. Before timing,
+every backend is checked against the others on a few edge-case documents
+(XHTML, scripts inside paragraphs, empty pages); the script exits with an
+error if their output differs.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractors import available_backends, get_extractor  # noqa: E402
+
+
+def synthetic_article(paragraphs=800, links=400, seed=0):
+    rng = random.Random(seed)
+    words = ["vector", "embedding", "crawler", "content", "semantic", "search",
+             "cluster", "page", "topic", "model", "index", "graph"]
+    body = []
+    for i in range(paragraphs):
+        text = " ".join(rng.choice(words) for _ in range(60))
+        body.append(f"<div class='section'><p>{text} <b>bold</b> <a href='/p/{i}'>more</a></p></div>")
+    nav = "".join(f"<a href='/nav/{i}'>Nav {i}</a>" for i in range(links))
+    scripts = "<script>var data = {" + ", ".join(f"k{i}: {i}" for i in range(2000)) + "};</script>"
+    return (f"<html><head><title>Synthetic article</title>{scripts}</head>"
+            f"<body><nav>{nav}</nav>{''.join(body)}</body></html>")
+
+
+EDGE_CASES = {
+    "xhtml": ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" '
+              '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">\n'
+              '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>XHTML page</title>'
+              '<link rel="canonical" href="/xhtml" /></head>'
+              '<body><p>First <a href="/a">link</a></p><p>Caf\u00e9 second</p></body></html>'),
+    "nested-script": ('<html><head><title>T</title></head><body><p>Hello '
+                      '<script>var x = 1;</script><style>p {}</style>'
+                      '<noscript>no js <a href="/n">n</a></noscript>world</p></body></html>'),
+    "no-paragraphs": '<html><head><title>Home</title></head><body><div>Menu</div></body></html>',
+    "empty": '',
+}
+
+
+def check_backends():
+    """Names of the edge cases on which some backend disagrees with the first one."""
+    backends = available_backends()
+    mismatches = []
+    for name, html in EDGE_CASES.items():
+        expected = get_extractor(backends[0])(html)
+        for backend in backends[1:]:
+            if get_extractor(backend)(html) != expected:
+                mismatches.append(f"{name}: {backend} differs from {backends[0]}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="Saved HTML files")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    mismatches = check_backends()
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    if mismatches:
+        sys.exit(1)
+
+    documents = []
+    for path in args.pages:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            documents.append(f.read())
+    if not documents:
+        documents = [synthetic_article()]
+    total_bytes = sum(len(doc.encode("utf-8")) for doc in documents)
+
+    print(f"{len(documents)} document(s), {total_bytes / 1024:.0f} KiB, {args.repeat} repeats")
+    print(f"{'backend':>12} {'ms/doc':>9} {'MiB/sec':>9}")
+    for backend in available_backends():
+        extract = get_extractor(backend)
+        extract(documents[0])  # warm up imports
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for doc in documents:
+                extract(doc)
+        elapsed = time.perf_counter() - start
+        per_doc = elapsed / (args.repeat * len(documents)) * 1000
+        throughput = total_bytes * args.repeat / elapsed / (1024 * 1024)
+        print(f"{backend:>12} {per_doc:>9.2f} {throughput:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Check the cold-start import time of the Flask app against a budget.
+
+Imports ``app`` in fresh interpreters and fails (exit status 1) if the median
+wall time exceeds the budget or if a heavy dependency that should only load
+on demand was imported.
+
+Usage:
+    python benchmarks/bench_import.py --budget 1.0 --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded lazily by the routes that need them, never by ``import app``
+DEFERRED_MODULES = ("pandas", "plotly", "sklearn", "umap", "numba", "scipy",
+                    "pynndescent", "google.generativeai", "google.cloud.aiplatform")
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {deferred!r} if name in sys.modules]
+print(elapsed)
+print(",".join(loaded))
+"""
+
+
+def measure(module):
+    code = PROBE.format(module=module, deferred=DEFERRED_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=ROOT, check=True)
+    # The probe's two lines come last, after anything the module printed
+    elapsed, loaded = output.stdout.split("\n")[-3:-1]
+    return float(elapsed), [name for name in loaded.split(",") if name]
+
+
+def slowest_imports(module, count=10):
+    """Modules with the largest cumulative import time, from ``-X importtime``."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=ROOT, check=True)
+    rows = []
+    for line in output.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds allowed for the import")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # The first run warms the filesystem cache and .pyc files
+    measure(args.module)
+    timings = []
+    loaded = []
+    for _ in range(args.runs):
+        elapsed, loaded = measure(args.module)
+        timings.append(elapsed)
+    median = statistics.median(timings)
+
+    print(f"import {args.module}: median {median:.3f}s over {args.runs} runs "
+          f"(min {min(timings):.3f}s, budget {args.budget:.3f}s)")
+    print("slowest imports (cumulative):")
+    for microseconds, name in slowest_imports(args.module):
+        print(f"  {microseconds / 1e6:8.3f}s  {name}")
+
+    failed = False
+    if median > args.budget:
+        print(f"FAIL: import time {median:.3f}s exceeds budget {args.budget:.3f}s")
+        failed = True
+    if loaded:
+        print(f"FAIL: heavy modules imported eagerly: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""End-to-end benchmark: crawl, embed and visualize a synthetic site.
+
+Each size runs in a fresh subprocess so peak RSS is measured per run, against
+a fixture site served from this process. Results are printed (or written
+with --output) as JSON, one record per size, for comparing changes.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 10 1000 50000 --topology random
+    python benchmarks/bench_pipeline.py --sizes 1000 --embed-latency 0.2 --output results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+
+from benchmarks.fixture_site import TOPOLOGIES, FixtureServer, build_site  # noqa: E402
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def stage(name, items, seconds):
+    return {
+        "stage": name,
+        "items": items,
+        "seconds": round(seconds, 4),
+        "per_second": round(items / seconds, 2) if seconds > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_pipeline(base_url, pages, args):
+    """Run the three stages in this process and return the result record."""
+    import metrics
+    from benchmarks.stub_embeddings import stub_client
+    from crawler import WebCrawler
+    from embeddings import EmbeddingProcessor
+    from visualizer import EmbeddingVisualizer
+
+    stages = []
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    crawler = WebCrawler(base_url, max_pages=pages, max_workers=args.workers,
+                         per_host_limit=args.workers)
+    start = time.perf_counter()
+    with quiet:
+        crawled = crawler.crawl()
+    stages.append(stage("crawl", len(crawled), time.perf_counter() - start))
+
+    client = stub_client(dimensions=args.dimensions, latency=args.embed_latency,
+                         batch_size=args.batch_size)
+    processor = EmbeddingProcessor(client)
+    start = time.perf_counter()
+    store = processor.build_store(crawled)
+    stages.append(stage("embed", len(store), time.perf_counter() - start))
+
+    if not args.skip_visualize:
+        visualizer = EmbeddingVisualizer(store)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            visualizer.build_payload()
+        stages.append(stage("visualize", len(store), time.perf_counter() - start))
+
+    # Finer-grained time from the pipeline's own instrumentation
+    breakdown = {}
+    for histogram in (metrics.STAGE_SECONDS, metrics.REDUCER_FIT_SECONDS):
+        for key, (total, count) in histogram.totals().items():
+            breakdown[f"{histogram.name}:{','.join(key)}"] = {"seconds": round(total, 4),
+                                                               "count": count}
+
+    return {
+        "pages": pages,
+        "topology": args.topology,
+        "total_seconds": round(sum(s["seconds"] for s in stages), 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": stages,
+        "breakdown": breakdown,
+        "passages": len(processor.passages),
+    }
+
+
+def run_size(pages, args):
+    """Serve a site of ``pages`` pages and benchmark it in a child process."""
+    site = build_site(pages, links_per_page=args.links_per_page, topology=args.topology)
+    with FixtureServer(site, latency=args.latency, sitemaps=args.sitemaps) as server:
+        command = [sys.executable, os.path.abspath(__file__), "--child", server.base_url,
+                   "--sizes", str(pages)] + child_arguments(args)
+        output = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+    if output.returncode != 0:
+        raise RuntimeError(f"Benchmark of {pages} pages failed:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def child_arguments(args):
+    arguments = ["--topology", args.topology, "--workers", str(args.workers),
+                 "--dimensions", str(args.dimensions), "--batch-size", str(args.batch_size),
+                 "--embed-latency", str(args.embed_latency)]
+    if args.skip_visualize:
+        arguments.append("--skip-visualize")
+    return arguments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="random")
+    parser.add_argument("--links-per-page", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Artificial per-request server latency in seconds")
+    parser.add_argument("--sitemaps", action="store_true",
+                        help="Publish robots.txt and sitemaps for the fixture site")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--embed-latency", type=float, default=0.0,
+                        help="Simulated embedding API round-trip time in seconds")
+    parser.add_argument("--skip-visualize", action="store_true")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--child", metavar="BASE_URL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_pipeline(args.child, args.sizes[0], args)))
+        return
+
+    results = []
+    for pages in args.sizes:
+        result = run_size(pages, args)
+        results.append(result)
+        summary = ", ".join(f"{s['stage']} {s['seconds']:.2f}s" for s in result["stages"])
+        print(f"{pages} pages: {summary}, peak RSS {result['peak_rss_mb']} MB", file=sys.stderr)
+
+    report = json.dumps({"python": platform.python_version(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark planned UMAP/PCA projections on synthetic embeddings of several sizes.
+
+Each size is projected the way the visualizer does it (PCA and UMAP, 3D and
+2D) with the settings ``plan_reduction`` picks, after warming up UMAP's
+compiled kernels, and the time is compared with the budget.
+
+Usage:
+    python benchmarks/bench_reduction.py --sizes 10 300 3000 20000 --budget 60
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reduction  # noqa: E402
+
+
+def synthetic_embeddings(n, dimensions, topics=20, seed=0):
+    """Unit vectors scattered around ``topics`` random directions."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dimensions))
+    vectors = centers[rng.integers(0, topics, n)] + 0.5 * rng.normal(size=(n, dimensions))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 300, 3000, 20000])
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--budget", type=float, default=reduction.DEFAULT_TIME_BUDGET,
+                        help="Seconds allowed for the UMAP views of one dataset")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reduction.warm_up()
+    print(f"warm-up: {time.perf_counter() - start:.1f}s")
+
+    print(f"{'points':>8} {'umap':>5} {'neighbors':>9} {'epochs':>6} {'fit on':>7} "
+          f"{'pca s':>7} {'umap s':>7} {'budget':>7}")
+    for n in args.sizes:
+        vectors = synthetic_embeddings(n, args.dimensions)
+        plan = reduction.plan_reduction(n, args.dimensions, time_budget=args.budget)
+        engine = reduction.ReductionEngine(vectors, **plan)
+        start = time.perf_counter()
+        for dimensions in (3, 2):
+            engine.project('pca', dimensions)
+        pca_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for dimensions in (3, 2):
+            engine.project('umap', dimensions)
+        umap_seconds = time.perf_counter() - start
+        print(f"{n:>8} {'yes' if plan['use_umap'] else 'no':>5} {plan['n_neighbors']:>9} "
+              f"{plan['n_epochs'] or 'auto':>6} {plan['fit_samples'] or n:>7} "
+              f"{pca_seconds:>7.2f} {umap_seconds:>7.2f} {args.budget:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Local fixture website used by the benchmarks.
+
+Serves a synthetic site of ``num_pages`` HTML pages from a background
+thread. Every page links to a few others so the crawler has a frontier to
+work through, and each response can be delayed to simulate network latency.
+The server can also publish a robots.txt and (gzipped) sitemaps for the site.
+"""
+import gzip
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+TOPOLOGIES = ("random", "chain", "tree", "hub")
+
+
+def _link_targets(i, num_pages, links_per_page, topology, rng):
+    if topology == "chain":
+        # One long path: the frontier never holds more than one URL
+        return {(i + 1) % num_pages}
+    if topology == "tree":
+        # Each page links to its children, so the frontier widens quickly
+        first = i * links_per_page + 1
+        return set(range(first, min(first + links_per_page, num_pages))) or {0}
+    if topology == "hub":
+        # The root links to everything, every other page only back to it
+        return set(range(1, num_pages)) if i == 0 else {0}
+    # Link the next page first so every page is reachable from the root
+    targets = {(i + 1) % num_pages}
+    while len(targets) < min(links_per_page, num_pages):
+        targets.add(rng.randrange(num_pages))
+    return targets
+
+
+def build_site(num_pages, links_per_page=5, paragraphs=5, seed=0, topology="random"):
+    """
+    Generate the HTML for a synthetic site.
+
+    Args:
+        topology: Link structure: 'random' (next page plus random pages),
+            'chain', 'tree' (``links_per_page`` children each) or 'hub'
+
+    Returns:
+        Dictionary mapping request path to HTML body
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology: {topology}")
+    rng = random.Random(seed)
+    words = ["vector", "embedding", "crawler", "content", "semantic", "search",
+             "cluster", "page", "topic", "model", "index", "graph"]
+    pages = {}
+    for i in range(num_pages):
+        targets = _link_targets(i, num_pages, links_per_page, topology, rng)
+        links = "".join(f'<a href="/page/{t}">Page {t}</a>' for t in sorted(targets))
+        body = "".join(
+            "<p>" + " ".join(rng.choice(words) for _ in range(40)) + "</p>"
+            for _ in range(paragraphs)
+        )
+        path = "/" if i == 0 else f"/page/{i}"
+        pages[path] = (f"<html><head><title>Page {i}</title></head>"
+                       f"<body>{body}{links}</body></html>")
+    pages["/page/0"] = pages["/"]
+    return pages
+
+
+def build_sitemaps(paths, base_url, urls_per_sitemap=1000, compress=True):
+    """
+    Sitemap index plus child sitemaps listing ``paths``.
+
+    Returns:
+        Dictionary mapping request path to body bytes; the index is
+        ``/sitemap.xml``
+    """
+    base_url = base_url.rstrip("/")
+    paths = sorted(set(paths))
+    suffix = ".xml.gz" if compress else ".xml"
+    files = {}
+    index = []
+    for number, start in enumerate(range(0, len(paths), urls_per_sitemap)):
+        entries = "".join(
+            f"<url><loc>{base_url}{path}</loc><lastmod>2024-01-{1 + i % 28:02d}</lastmod>"
+            f"<priority>{1.0 if path == '/' else 0.5}</priority></url>"
+            for i, path in enumerate(paths[start:start + urls_per_sitemap])
+        )
+        data = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f"{entries}</urlset>").encode("utf-8")
+        name = f"/sitemap-{number}{suffix}"
+        files[name] = gzip.compress(data) if compress else data
+        index.append(f"<sitemap><loc>{base_url}{name}</loc></sitemap>")
+    files["/sitemap.xml"] = ('<?xml version="1.0" encoding="UTF-8"?>'
+                             '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                             f"{''.join(index)}</sitemapindex>").encode("utf-8")
+    return files
+
+
+class FixtureServer:
+    """Threaded HTTP server for a synthetic site, usable as a context manager."""
+
+    def __init__(self, pages, latency=0.0, host="127.0.0.1", port=0, etags=True,
+                 sitemaps=False, crawl_delay=None, disallow=()):
+        self.pages = dict(pages)
+        self.latency = latency
+        self.etags = etags
+        self.sitemaps = sitemaps
+        self.crawl_delay = crawl_delay
+        self.disallow = disallow
+        self.requests = 0
+        self.bytes_sent = 0
+        handler = self._make_handler()
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.pages.get(self.path.split("?")[0])
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                server.requests += 1
+                data = body if isinstance(body, bytes) else body.encode("utf-8")
+                etag = '"%s"' % hashlib.md5(data).hexdigest() if server.etags else None
+                if etag and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                server.bytes_sent += len(data)
+                self.send_response(200)
+                if self.path.startswith("/sitemap"):
+                    self.send_header("Content-Type", "application/xml")
+                elif self.path == "/robots.txt":
+                    self.send_header("Content-Type", "text/plain")
+                else:
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        # Discovery files need the bound address, so they are added on start
+        page_paths = [path for path in self.pages if path != "/page/0"]
+        if self.sitemaps:
+            self.pages.update(build_sitemaps(page_paths, self.base_url))
+        if self.sitemaps or self.crawl_delay or self.disallow:
+            lines = ["User-agent: *"]
+            lines += [f"Disallow: {path}" for path in self.disallow]
+            if self.crawl_delay:
+                lines.append(f"Crawl-delay: {self.crawl_delay}")
+            if self.sitemaps:
+                lines.append(f"Sitemap: {self.base_url}sitemap.xml")
+            self.pages["/robots.txt"] = "\n".join(lines) + "\n"
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
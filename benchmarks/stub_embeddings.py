@@ -0,0 +1,60 @@
+"""Deterministic local stand-in for the Gemini embedding API.
+
+``StubEmbedContent`` has the same call signature as ``genai.embed_content``
+and can be passed to ``GoogleCloudEmbeddings(embed_fn=...)``. Vectors are
+derived from a hash of the text, so identical inputs always embed the same.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class StubEmbedContent:
+    def __init__(self, dimensions=768, latency=0.0, per_item_latency=0.0):
+        """
+        Args:
+            dimensions: Length of each returned vector
+            latency: Fixed delay per request, simulating a network round trip
+            per_item_latency: Additional delay per text in the request
+        """
+        self.dimensions = dimensions
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+        vec = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (vec / np.linalg.norm(vec)).tolist()
+
+    def __call__(self, model, content, task_type=None):
+        batch = not isinstance(content, str)
+        items = list(content) if batch else [content]
+        with self._lock:
+            self.calls += 1
+            self.texts += len(items)
+        delay = self.latency + self.per_item_latency * len(items)
+        if delay:
+            time.sleep(delay)
+        vectors = [self.vector(text) for text in items]
+        return {"embedding": vectors if batch else vectors[0]}
+
+
+def stub_client(dimensions=768, latency=0.0, per_item_latency=0.0, **options):
+    """
+    ``GoogleCloudEmbeddings`` backed by a ``StubEmbedContent``: the real
+    client (batching, retries, cache) with the API call replaced.
+
+    Args:
+        options: Passed through to ``GoogleCloudEmbeddings``
+    """
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    from embeddings import GoogleCloudEmbeddings
+
+    stub = StubEmbedContent(dimensions, latency, per_item_latency)
+    return GoogleCloudEmbeddings(embed_fn=stub, **options)
@@ -0,0 +1,115 @@
+import re
+
+import numpy as np
+
+_PARAGRAPH = re.compile(r'[^\n]*\S[^\n]*')
+
+POOLING_METHODS = ('mean', 'max', 'weighted')
+
+
+class Chunker:
+    """
+    Split long text into overlapping windows that fit the embedding model.
+
+    Lengths are approximated in tokens as ``chars_per_token`` characters each.
+    In ``paragraph`` mode whole paragraphs (lines) are packed into a window
+    and the last paragraphs of a window are repeated at the start of the
+    next one as overlap; a paragraph that is too long on its own is cut into
+    plain windows. ``tokens`` mode cuts plain windows at whitespace.
+
+    Chunks are produced lazily from character offsets into the original
+    string, so the only allocation per chunk is the chunk text itself.
+    """
+
+    def __init__(self, max_tokens=512, overlap_tokens=64, chars_per_token=4, mode='paragraph'):
+        if mode not in ('paragraph', 'tokens'):
+            raise ValueError(f"Unknown chunking mode: {mode}")
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_chars = max_tokens * chars_per_token
+        self.overlap_chars = overlap_tokens * chars_per_token
+        self.mode = mode
+
+    def chunks(self, text):
+        """Yield the chunk strings of ``text``."""
+        for start, end in self.spans(text):
+            chunk = text[start:end].strip()
+            if chunk:
+                yield chunk
+
+    def spans(self, text):
+        """Yield ``(start, end)`` character offsets of each chunk."""
+        if self.mode == 'tokens':
+            yield from self._windows(text, 0, len(text))
+            return
+
+        chunk_start = chunk_end = None
+        members = []
+        for match in _PARAGRAPH.finditer(text):
+            start, end = match.span()
+            if end - start > self.max_chars:
+                if chunk_start is not None:
+                    yield chunk_start, chunk_end
+                    chunk_start = None
+                    members = []
+                yield from self._windows(text, start, end)
+                continue
+
+            if chunk_start is not None and end - chunk_start > self.max_chars:
+                yield chunk_start, chunk_end
+                # Carry trailing paragraphs that fit in the overlap budget
+                new_start = start
+                for member_start, _ in reversed(members):
+                    if chunk_end - member_start > self.overlap_chars or end - member_start > self.max_chars:
+                        break
+                    new_start = member_start
+                members = [member for member in members if member[0] >= new_start]
+                chunk_start = new_start
+
+            if chunk_start is None:
+                chunk_start = start
+            chunk_end = end
+            members.append((start, end))
+
+        if chunk_start is not None:
+            yield chunk_start, chunk_end
+
+    def _windows(self, text, start, end):
+        """Fixed-size windows over ``text[start:end]``, cut at whitespace where possible."""
+        position = start
+        while position < end:
+            window_end = min(position + self.max_chars, end)
+            if window_end < end:
+                cut = text.rfind(' ', position + self.max_chars // 2, window_end)
+                if cut != -1:
+                    window_end = cut
+            yield position, window_end
+            if window_end >= end:
+                return
+            next_position = max(window_end - self.overlap_chars, position + 1)
+            boundary = text.find(' ', next_position, window_end)
+            position = boundary + 1 if boundary != -1 else next_position
+
+
+def pool_vectors(vectors, lengths=None, method='mean'):
+    """
+    Combine chunk vectors into one page vector.
+
+    Args:
+        vectors: Chunk embeddings, shape (n_chunks, dimensions)
+        lengths: Character length of each chunk, used by ``weighted``
+        method: 'mean', 'max' (element-wise) or 'weighted' (length-weighted mean)
+
+    Returns:
+        float32 array of shape (dimensions,)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.shape[0] == 1:
+        return vectors[0]
+    if method == 'mean':
+        return vectors.mean(axis=0)
+    if method == 'max':
+        return vectors.max(axis=0)
+    if method == 'weighted':
+        return np.average(vectors, axis=0, weights=np.asarray(lengths, dtype=np.float32)).astype(np.float32)
+    raise ValueError(f"Unknown pooling method: {method}")
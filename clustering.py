@@ -0,0 +1,217 @@
+import json
+import os
+
+import numpy as np
+
+from reduction import ReductionEngine
+
+NOISE = -1
+CLUSTER_METHODS = ('kmeans', 'hdbscan')
+
+
+class TopicClusterer:
+    """
+    Group embedded pages into topics and summarize each topic.
+
+    ``kmeans`` runs MiniBatchKMeans on the full-dimensional (L2-normalized)
+    embeddings; when ``n_clusters`` is not given, k is chosen by silhouette
+    score over a sample. ``hdbscan`` first reduces the embeddings with PCA
+    and lets HDBSCAN find the clusters on a sample, marking outliers as
+    noise (-1); the remaining pages join their nearest sampled neighbor.
+
+    Every cluster gets a centroid, the pages nearest to it as representatives
+    and TF-IDF keywords that distinguish it from the rest of the site. All of
+    the summary work is matrix operations over the whole dataset, with no
+    per-cluster Python loops over pages.
+    """
+
+    def __init__(self, method='kmeans', n_clusters=None, max_clusters=20, min_cluster_size=5,
+                 reduced_dimensions=20, sample_size=4000, n_keywords=6, n_representatives=3,
+                 random_state=0):
+        if method not in CLUSTER_METHODS:
+            raise ValueError(f"Unknown clustering method: {method}")
+        self.method = method
+        self.n_clusters = n_clusters
+        self.max_clusters = max_clusters
+        self.min_cluster_size = min_cluster_size
+        self.reduced_dimensions = reduced_dimensions
+        self.sample_size = sample_size
+        self.n_keywords = n_keywords
+        self.n_representatives = n_representatives
+        self.random_state = random_state
+
+    def fit(self, store):
+        """
+        Cluster the pages of an EmbeddingStore.
+
+        Returns:
+            Dictionary with 'method', 'labels' (int32 array, one per page),
+            'centroids' (float32 array, one row per cluster) and 'clusters',
+            a list of {'id', 'size', 'representatives', 'keywords'} sorted by
+            cluster id
+        """
+        vectors = self._normalized(store.vectors)
+        if len(vectors) < 3:
+            labels = np.zeros(len(vectors), dtype=np.int32)
+        elif self.method == 'kmeans':
+            labels = self._kmeans(vectors)
+        else:
+            labels = self._hdbscan(vectors)
+
+        cluster_ids = np.unique(labels[labels != NOISE])
+        # Renumber clusters 0..k-1 so labels index straight into the summaries
+        lookup = np.full(labels.max() + 2, NOISE, dtype=np.int32)
+        lookup[cluster_ids] = np.arange(len(cluster_ids), dtype=np.int32)
+        labels = np.where(labels == NOISE, NOISE, lookup[labels]).astype(np.int32)
+
+        members = self._membership(labels, len(cluster_ids))
+        sizes = np.asarray(members.sum(axis=1)).ravel().astype(int)
+        centroids = self._normalized(np.asarray(members @ vectors) / np.maximum(sizes, 1)[:, None])
+        representatives = self._representatives(vectors, labels, centroids)
+        keywords = self._keywords(store, members)
+
+        clusters = [{
+            'id': int(cluster),
+            'size': int(sizes[cluster]),
+            'representatives': representatives[cluster],
+            'keywords': keywords[cluster]
+        } for cluster in range(len(cluster_ids))]
+        return {'method': self.method, 'labels': labels, 'centroids': centroids, 'clusters': clusters}
+
+    @staticmethod
+    def _normalized(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _sample(self, n):
+        if n <= self.sample_size:
+            return np.arange(n)
+        rng = np.random.default_rng(self.random_state)
+        return np.sort(rng.choice(n, self.sample_size, replace=False))
+
+    def _candidate_ks(self, n):
+        upper = min(self.max_clusters, n - 1)
+        # Roughly geometric spacing keeps the search to a handful of fits
+        ks = sorted({int(round(k)) for k in np.geomspace(2, max(upper, 2), num=8)})
+        return [k for k in ks if 2 <= k <= upper]
+
+    def _kmeans(self, vectors):
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.metrics import silhouette_score
+
+        k = self.n_clusters
+        if k is None:
+            sample = vectors[self._sample(len(vectors))]
+            best_score = -1.0
+            k = 2
+            for candidate in self._candidate_ks(len(sample)):
+                model = MiniBatchKMeans(n_clusters=candidate, random_state=self.random_state,
+                                        n_init=3, batch_size=1024)
+                sample_labels = model.fit_predict(sample)
+                if len(np.unique(sample_labels)) < 2:
+                    continue
+                score = silhouette_score(sample, sample_labels, sample_size=min(len(sample), 2000),
+                                         random_state=self.random_state)
+                if score > best_score:
+                    best_score, k = score, candidate
+
+        k = max(1, min(k, len(vectors)))
+        model = MiniBatchKMeans(n_clusters=k, random_state=self.random_state, n_init=3,
+                                batch_size=1024)
+        return model.fit_predict(vectors).astype(np.int32)
+
+    def _hdbscan(self, vectors):
+        from sklearn.cluster import HDBSCAN
+        from sklearn.neighbors import NearestNeighbors
+
+        dimensions = min(self.reduced_dimensions, vectors.shape[1])
+        reduced = ReductionEngine(vectors, max_dimensions=dimensions).project('pca', dimensions)
+
+        # HDBSCAN is fit on a sample; every other page takes the label of its
+        # nearest sampled neighbor, which keeps large sites to a few seconds
+        sample = self._sample(len(reduced))
+        model = HDBSCAN(min_cluster_size=max(2, min(self.min_cluster_size, len(sample) // 2)),
+                        copy=True)
+        sample_labels = model.fit_predict(reduced[sample]).astype(np.int32)
+        if (sample_labels == NOISE).all():
+            # No dense region at all: treat the whole site as one topic
+            return np.zeros(len(reduced), dtype=np.int32)
+        if len(sample) == len(reduced):
+            return sample_labels
+
+        nearest = NearestNeighbors(n_neighbors=1).fit(reduced[sample])
+        _, neighbor = nearest.kneighbors(reduced)
+        labels = sample_labels[neighbor[:, 0]]
+        labels[sample] = sample_labels
+        return labels
+
+    @staticmethod
+    def _membership(labels, n_clusters):
+        """Sparse (clusters x pages) 0/1 matrix; noise pages belong to no cluster."""
+        from scipy import sparse
+
+        pages = np.flatnonzero(labels != NOISE)
+        return sparse.csr_matrix((np.ones(len(pages), dtype=np.float32), (labels[pages], pages)),
+                                 shape=(n_clusters, len(labels)))
+
+    def _representatives(self, vectors, labels, centroids):
+        """Indices of the pages closest to each centroid, nearest first."""
+        representatives = [[] for _ in range(len(centroids))]
+        pages = np.flatnonzero(labels != NOISE)
+        if not len(pages):
+            return representatives
+        similarity = np.einsum('ij,ij->i', vectors[pages], centroids[labels[pages]])
+        order = np.lexsort((-similarity, labels[pages]))
+        ranked_pages = pages[order]
+        ranked_labels = labels[pages][order]
+        starts = np.searchsorted(ranked_labels, np.arange(len(centroids)))
+        ends = np.append(starts[1:], len(ranked_labels))
+        for cluster, (start, end) in enumerate(zip(starts, ends)):
+            representatives[cluster] = ranked_pages[start:min(end, start + self.n_representatives)].tolist()
+        return representatives
+
+    def _keywords(self, store, members):
+        """Terms with the highest TF-IDF weight in a cluster relative to the whole site."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        n_clusters = members.shape[0]
+        documents = [f"{store.titles[i] or ''} {store.content(i)[:5000]}" for i in range(len(store))]
+        try:
+            vectorizer = TfidfVectorizer(stop_words='english', max_features=20000, sublinear_tf=True,
+                                         token_pattern=r'(?u)\b[a-zA-Z][a-zA-Z]+\b')
+            tfidf = vectorizer.fit_transform(documents)
+        except ValueError:
+            # Only stop words or no text at all
+            return [[] for _ in range(n_clusters)]
+
+        terms = vectorizer.get_feature_names_out()
+        sizes = np.maximum(np.asarray(members.sum(axis=1)).ravel(), 1)
+        cluster_mean = np.asarray((members @ tfidf).todense()) / sizes[:, None]
+        site_mean = np.asarray(tfidf.mean(axis=0)).ravel()
+        distinctiveness = cluster_mean - site_mean
+        count = min(self.n_keywords, len(terms))
+        top = np.argsort(-distinctiveness, axis=1)[:, :count]
+        return [[str(terms[t]) for t in row if cluster_mean[cluster, t] > 0]
+                for cluster, row in enumerate(top)]
+
+
+def save_clusters(result, directory):
+    """Write a ``TopicClusterer.fit`` result next to a saved EmbeddingStore."""
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'cluster_labels.npy'), result['labels'])
+    np.save(os.path.join(directory, 'cluster_centroids.npy'), result['centroids'])
+    with open(os.path.join(directory, 'clusters.json'), 'w') as f:
+        json.dump({'method': result['method'], 'clusters': result['clusters']}, f)
+
+
+def load_clusters(directory):
+    """Read clusters written by ``save_clusters``, or None if there are none."""
+    path = os.path.join(directory, 'clusters.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        summary = json.load(f)
+    summary['labels'] = np.load(os.path.join(directory, 'cluster_labels.npy'))
+    summary['centroids'] = np.load(os.path.join(directory, 'cluster_centroids.npy'))
+    return summary
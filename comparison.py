@@ -0,0 +1,224 @@
+"""
+Multi-site comparison.
+
+Several sites are crawled at once and embedded into one EmbeddingStore,
+with a site label per page. ``SiteComparison`` then reports how far apart
+the sites are (cosine distance between site centroids) and where the
+reference site has gaps: competitor pages with no close match on the
+reference site, and topics the reference site does not cover at all.
+
+Embedding goes through the client's content-addressed cache, so adding
+another competitor to a comparison only embeds that competitor's pages.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+COMPARISON_MODES = ('joint', 'reference')
+SITES_FILE = 'sites.json'
+SITE_LABELS_FILE = 'site_labels.npy'
+
+
+def site_name(url):
+    """Short label for a site: its host name."""
+    return urlparse(url).netloc or url
+
+
+def crawl_sites(crawlers, on_page=None):
+    """
+    Crawl several sites concurrently, one crawler (and worker pool) per site.
+
+    Args:
+        crawlers: One WebCrawler per site
+        on_page: Optional callback ``on_page(site_index, page)``, called from
+            the crawl threads
+
+    Returns:
+        List of page lists, in the order of ``crawlers``
+    """
+    def crawl(site):
+        for page in crawlers[site].iter_pages():
+            if on_page is not None:
+                on_page(site, page)
+        return crawlers[site].pages_data
+
+    if not crawlers:
+        return []
+    with ThreadPoolExecutor(max_workers=len(crawlers)) as executor:
+        return list(executor.map(crawl, range(len(crawlers))))
+
+
+def embed_sites(processor, site_pages):
+    """
+    Embed each site's pages into one store.
+
+    Args:
+        processor: EmbeddingProcessor (its client's cache is reused across runs)
+        site_pages: List of page lists, one per site
+
+    Returns:
+        Tuple (EmbeddingStore, int32 array with the site index of every page)
+    """
+    store = EmbeddingStore()
+    labels = []
+    for site, pages in enumerate(site_pages):
+        embedded = processor.generate_embeddings(pages)
+        store.extend(embedded)
+        labels.extend([site] * len(embedded))
+    return store, np.asarray(labels, dtype=np.int32)
+
+
+class SiteComparison:
+    """
+    Compare the sites of a combined store.
+
+    Args:
+        store: EmbeddingStore with the pages of every site
+        labels: Site index of every page
+        sites: Site names, indexed by label
+        reference: Index of the site the others are compared against
+    """
+
+    def __init__(self, store, labels, sites, reference=0):
+        self.store = store
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.sites = list(sites)
+        self.reference = reference
+        self._vectors = None
+
+    @property
+    def vectors(self):
+        """L2-normalized page vectors, computed once."""
+        if self._vectors is None:
+            vectors = np.asarray(self.store.vectors, dtype=np.float32)
+            self._vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return self._vectors
+
+    def page_counts(self):
+        return np.bincount(self.labels, minlength=len(self.sites))
+
+    def centroids(self):
+        """Normalized mean direction of each site's pages (zero for an empty site)."""
+        from scipy import sparse
+
+        membership = sparse.csr_matrix(
+            (np.ones(len(self.labels), dtype=np.float32), (self.labels, np.arange(len(self.labels)))),
+            shape=(len(self.sites), len(self.labels)))
+        sums = np.asarray(membership @ self.vectors)
+        return sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+    def centroid_distances(self):
+        """Cosine distance between every pair of site centroids."""
+        centroids = self.centroids()
+        return np.clip(1.0 - centroids @ centroids.T, 0.0, 2.0)
+
+    def best_matches(self, rows, candidates, block_elements=1 << 24):
+        """
+        For each page in ``rows``, its most similar page among ``candidates``.
+
+        Returns:
+            Tuple (candidate index per row, cosine similarity per row)
+        """
+        best = np.full(len(rows), -1, dtype=np.int64)
+        scores = np.full(len(rows), -np.inf, dtype=np.float32)
+        if not len(rows) or not len(candidates):
+            return best, scores
+        targets = self.vectors[candidates]
+        size = max(1, block_elements // len(candidates))
+        for start in range(0, len(rows), size):
+            similarity = self.vectors[rows[start:start + size]] @ targets.T
+            top = similarity.argmax(axis=1)
+            best[start:start + size] = candidates[top]
+            scores[start:start + size] = similarity[np.arange(len(top)), top]
+        return best, scores
+
+    def coverage_gaps(self, threshold=0.75, limit=20):
+        """
+        Competitor pages without a close match on the reference site.
+
+        Args:
+            threshold: A competitor page counts as covered when some
+                reference page has at least this cosine similarity to it
+            limit: Gap pages listed per site, least covered first
+
+        Returns:
+            One entry per competitor: 'site', 'pages', 'uncovered',
+            'coverage' (share of its pages covered) and 'gaps'
+        """
+        reference_rows = np.flatnonzero(self.labels == self.reference)
+        report = []
+        for site, name in enumerate(self.sites):
+            if site == self.reference:
+                continue
+            rows = np.flatnonzero(self.labels == site)
+            best, scores = self.best_matches(rows, reference_rows)
+            uncovered = np.flatnonzero(scores < threshold)
+            order = uncovered[np.argsort(scores[uncovered], kind='stable')][:limit]
+            report.append({
+                'site': name,
+                'pages': int(len(rows)),
+                'uncovered': int(len(uncovered)),
+                'coverage': float(1.0 - len(uncovered) / len(rows)) if len(rows) else None,
+                'gaps': [{
+                    'url': self.store.urls[rows[i]],
+                    'title': self.store.titles[rows[i]],
+                    'closest_url': self.store.urls[best[i]] if best[i] >= 0 else None,
+                    'similarity': float(scores[i]) if best[i] >= 0 else None
+                } for i in order]
+            })
+        return report
+
+    def topic_coverage(self, clusters):
+        """
+        Pages per site in each topic of a ``TopicClusterer.fit`` result over
+        the combined store; 'missing' marks topics the reference site has no
+        pages in.
+        """
+        labels = clusters['labels']
+        clustered = labels >= 0
+        n_topics = len(clusters['clusters'])
+        counts = np.bincount(labels[clustered] * len(self.sites) + self.labels[clustered],
+                             minlength=n_topics * len(self.sites)).reshape(n_topics, len(self.sites))
+        return [{
+            'id': cluster['id'],
+            'keywords': cluster['keywords'],
+            'pages': {name: int(counts[cluster['id'], site]) for site, name in enumerate(self.sites)},
+            'missing': bool(counts[cluster['id'], self.reference] == 0)
+        } for cluster in clusters['clusters']]
+
+    def report(self, clusters=None, threshold=0.75, limit=20):
+        """JSON-serializable comparison summary."""
+        counts = self.page_counts()
+        report = {
+            'reference': self.sites[self.reference],
+            'sites': [{'site': name, 'pages': int(counts[site])} for site, name in enumerate(self.sites)],
+            'centroid_distances': self.centroid_distances().round(4).tolist(),
+            'coverage': self.coverage_gaps(threshold, limit)
+        }
+        if clusters is not None:
+            report['topics'] = self.topic_coverage(clusters)
+        return report
+
+
+def save_sites(directory, sites, labels, reference=0, mode='joint'):
+    """Write the site names and per-page site labels next to a saved EmbeddingStore."""
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, SITE_LABELS_FILE), np.asarray(labels, dtype=np.int32))
+    with open(os.path.join(directory, SITES_FILE), 'w') as f:
+        json.dump({'sites': list(sites), 'reference': reference, 'mode': mode}, f)
+
+
+def load_sites(directory):
+    """Read sites written by ``save_sites``, or None for a single-site store."""
+    path = os.path.join(directory, SITES_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        sites = json.load(f)
+    sites['labels'] = np.load(os.path.join(directory, SITE_LABELS_FILE))
+    return sites
@@ -0,0 +1,408 @@
+"""
+Disk-backed crawl state for memory-bounded, resumable crawls.
+
+``CrawlSpill`` keeps what a crawl accumulates in one directory instead of in
+RAM:
+
+- the frontier, in a SQLite table with one row per URL ever queued; the URL
+  column is unique, so the table is also an exact on-disk visited set
+- page bodies, as zlib-compressed records appended to segment files and
+  read back lazily through ``SpilledPages``
+- each page's outlinks, as one row of int32 node ids, for the link graph
+
+Writes are committed together every ``checkpoint_pages`` pages. Reopening
+the directory after a crash resumes from the last checkpoint: URLs that
+were being fetched are queued again and segment bytes written after the
+last committed record are truncated.
+"""
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections import Counter, deque
+from urllib.parse import urlparse
+
+import numpy as np
+
+from discovery import frontier_priority
+from link_graph import LinkGraph
+
+QUEUED, IN_FLIGHT, VISITED, BLOCKED = 0, 1, 2, 3
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS frontier (
+        id INTEGER PRIMARY KEY,
+        url TEXT NOT NULL UNIQUE,
+        host TEXT NOT NULL,
+        priority REAL NOT NULL,
+        recency REAL NOT NULL,
+        state INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS frontier_queue ON frontier (host, state, priority, recency, id);
+    CREATE TABLE IF NOT EXISTS pages (
+        seq INTEGER PRIMARY KEY,
+        segment INTEGER NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS links (
+        source INTEGER PRIMARY KEY,
+        targets BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+"""
+
+
+class CrawlSpill:
+    """
+    A crawl's frontier, pages and links in ``directory``.
+
+    Args:
+        directory: An existing spill is resumed; a missing one is created
+            unless ``create`` is False
+        segment_bytes: Size at which a new segment file is started
+        checkpoint_pages: Pages written between commits
+        cache_kb: SQLite page cache size, the part of the spill kept in RAM
+    """
+
+    DATABASE_FILE = 'crawl.sqlite'
+
+    def __init__(self, directory, segment_bytes=64 << 20, checkpoint_pages=32, cache_kb=2048,
+                 create=True):
+        if not create and not self.exists(directory):
+            raise FileNotFoundError(f"No crawl spill in {directory}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.checkpoint_pages = max(1, checkpoint_pages)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, self.DATABASE_FILE),
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA cache_size=-{int(cache_kb)}")
+        self._conn.executescript(_SCHEMA)
+        # Anything in flight when the last run stopped is fetched again
+        self._conn.execute("UPDATE frontier SET state = ? WHERE state = ?", (QUEUED, IN_FLIGHT))
+        self._conn.commit()
+        self._uncommitted = 0
+        self.frontier = DiskFrontier(self)
+        self.pages = SpilledPages(self)
+        self.links = DiskLinkGraphBuilder(self)
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, cls.DATABASE_FILE))
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               (key, json.dumps(value)))
+
+    def _written(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.checkpoint_pages:
+            self.checkpoint()
+
+    def checkpoint(self, release_memory=False):
+        """
+        Commit everything written so far; segment data is flushed first so a
+        committed record is always complete on disk.
+
+        Args:
+            release_memory: Also hand SQLite's page cache back to the allocator
+        """
+        with self._lock:
+            self.pages.flush()
+            self._conn.commit()
+            self._uncommitted = 0
+            if release_memory:
+                self._conn.execute("PRAGMA shrink_memory")
+
+    def close(self):
+        with self._lock:
+            self.checkpoint()
+            self.pages.close()
+            self._conn.close()
+
+
+class DiskFrontier:
+    """
+    Per-host priority queues in SQLite, with the same interface as the
+    crawler's in-memory ``MemoryFrontier``.
+
+    Only a short buffer of upcoming URLs per host and the number of queued
+    URLs per host are kept in memory.
+    """
+
+    def __init__(self, spill, buffer_size=64):
+        self.spill = spill
+        self._conn = spill._conn
+        self._lock = spill._lock
+        self.buffer_size = buffer_size
+        self._heads = {}
+        self._queued = Counter(dict(self._conn.execute(
+            "SELECT host, COUNT(*) FROM frontier WHERE state = ? GROUP BY host", (QUEUED,))))
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM frontier WHERE url = ?", (url,)).fetchone() is not None
+
+    def __len__(self):
+        """Number of queued URLs."""
+        return sum(self._queued.values())
+
+    def add(self, url, priority=None):
+        """Queue ``url`` unless it was seen before; returns whether it was added."""
+        return self._insert(url, priority)[1]
+
+    def extend(self, urls):
+        """
+        Queue the unseen ``urls``.
+
+        Returns:
+            Frontier id of every URL, new or not
+        """
+        with self._lock:
+            return [self._insert(url)[0] for url in urls]
+
+    def _insert(self, url, priority=None):
+        priority = priority or frontier_priority()
+        host = urlparse(url).netloc
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO frontier (url, host, priority, recency) VALUES (?, ?, ?, ?)",
+                (url, host, priority[0], priority[1]))
+            if cursor.rowcount:
+                self._queued[host] += 1
+                return cursor.lastrowid, True
+            return self._conn.execute("SELECT id FROM frontier WHERE url = ?", (url,)).fetchone()[0], False
+
+    def hosts(self):
+        return [host for host, count in self._queued.items() if count]
+
+    def peek(self, host):
+        """Next URL to fetch from ``host``, or None."""
+        head = self._heads.get(host)
+        if not head:
+            if not self._queued[host]:
+                return None
+            with self._lock:
+                head = self._heads[host] = deque(self._conn.execute(
+                    "SELECT url FROM frontier WHERE host = ? AND state = ? "
+                    "ORDER BY priority, recency, id LIMIT ?", (host, QUEUED, self.buffer_size)))
+            if not head:
+                return None
+        return head[0][0]
+
+    def pop(self, host):
+        """Take the next URL of ``host`` off the queue; it is being fetched."""
+        return self._take(host, IN_FLIGHT)
+
+    def drop(self, host):
+        """Take the next URL of ``host`` off the queue without fetching it."""
+        return self._take(host, BLOCKED)
+
+    def _take(self, host, state):
+        if self.peek(host) is None:
+            return None
+        url = self._heads[host].popleft()[0]
+        self._queued[host] -= 1
+        self._set_state([url], state)
+        return url
+
+    def complete(self, url):
+        self._set_state([url], VISITED)
+
+    def release(self, urls):
+        """Queue URLs that were taken off the queue but not fetched again."""
+        if not urls:
+            return
+        self._set_state(urls, QUEUED)
+        for url in urls:
+            host = urlparse(url).netloc
+            self._queued[host] += 1
+            # Refilled from SQLite so the released URLs keep their place
+            self._heads.pop(host, None)
+
+    def _set_state(self, urls, state):
+        with self._lock:
+            self._conn.executemany("UPDATE frontier SET state = ? WHERE url = ?",
+                                   [(state, url) for url in urls])
+
+
+class SpilledPages:
+    """
+    The crawled pages, list-like (``append``, ``len``, indexing and
+    iteration) but stored compressed in append-only segment files and read
+    from disk on access.
+    """
+
+    def __init__(self, spill, compression_level=6):
+        self.spill = spill
+        self._conn = spill._conn
+        self._lock = spill._lock
+        self.compression_level = compression_level
+        self._writer = None
+        self._writer_segment = None
+        self._count, last_segment, end = self._conn.execute(
+            "SELECT COUNT(*), MAX(segment), "
+            "(SELECT offset + length FROM pages ORDER BY seq DESC LIMIT 1) FROM pages").fetchone()
+        self._recover(last_segment, end)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.spill.directory, f'segment-{segment:05d}.z')
+
+    def _segments(self):
+        return sorted(int(name[8:13]) for name in os.listdir(self.spill.directory)
+                      if name.startswith('segment-') and name.endswith('.z'))
+
+    def _recover(self, last_segment, end):
+        """Drop segment data written after the last committed record."""
+        for segment in self._segments():
+            if last_segment is None or segment > last_segment:
+                os.remove(self._segment_path(segment))
+            elif segment == last_segment and os.path.getsize(self._segment_path(segment)) > end:
+                os.truncate(self._segment_path(segment), end)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, page):
+        data = zlib.compress(json.dumps(page).encode('utf-8'), self.compression_level)
+        with self._lock:
+            writer, segment = self._segment_writer()
+            offset = writer.tell()
+            writer.write(data)
+            self._conn.execute("INSERT INTO pages (seq, segment, offset, length) VALUES (?, ?, ?, ?)",
+                               (self._count, segment, offset, len(data)))
+            self._count += 1
+            self.spill._written()
+
+    def _segment_writer(self):
+        if self._writer is not None and self._writer.tell() >= self.spill.segment_bytes:
+            self._writer.close()
+            self._writer = None
+            self._writer_segment += 1
+        if self._writer is None:
+            if self._writer_segment is None:
+                segments = self._segments()
+                self._writer_segment = segments[-1] if segments else 0
+            self._writer = open(self._segment_path(self._writer_segment), 'ab')
+        return self._writer, self._writer_segment
+
+    def flush(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def _read(self, locations):
+        self.flush()
+        pages = []
+        handle, handle_segment = None, None
+        try:
+            for segment, offset, length in locations:
+                if segment != handle_segment:
+                    if handle is not None:
+                        handle.close()
+                    handle, handle_segment = open(self._segment_path(segment), 'rb'), segment
+                handle.seek(offset)
+                pages.append(json.loads(zlib.decompress(handle.read(length))))
+        finally:
+            if handle is not None:
+                handle.close()
+        return pages
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('page index out of range')
+        with self._lock:
+            location = self._conn.execute("SELECT segment, offset, length FROM pages WHERE seq = ?",
+                                          (index,)).fetchone()
+        return self._read([location])[0]
+
+    def __iter__(self):
+        return self.iter_chunks(chunk_size=256, flatten=True)
+
+    def iter_chunks(self, chunk_size=256, flatten=False):
+        """Pages in crawl order, read ``chunk_size`` at a time (as lists, or one by one with ``flatten``)."""
+        start, end = 0, len(self)
+        while start < end:
+            with self._lock:
+                locations = self._conn.execute(
+                    "SELECT segment, offset, length FROM pages WHERE seq >= ? AND seq < ? ORDER BY seq",
+                    (start, min(start + chunk_size, end))).fetchall()
+            pages = self._read(locations)
+            start += chunk_size
+            if flatten:
+                yield from pages
+            else:
+                yield pages
+
+
+class DiskLinkGraphBuilder:
+    """
+    ``LinkGraphBuilder`` counterpart that uses frontier ids as node ids and
+    stores each page's outlinks as a row of int32 ids.
+    """
+
+    def __init__(self, spill):
+        self.spill = spill
+        self._conn = spill._conn
+        self._lock = spill._lock
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+
+    def __contains__(self, url):
+        return url in self.spill.frontier
+
+    def add_page(self, url, links):
+        """Record a crawled page and the URLs it links to (self-links are ignored)."""
+        source, *targets = self.spill.frontier.extend([url] + list(links))
+        targets = np.array(sorted(set(targets) - {source}), dtype=np.int32)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO links (source, targets) VALUES (?, ?)",
+                               (source, targets.tobytes()))
+
+    def build(self, root=None):
+        """
+        Args:
+            root: URL crawl depth is measured from (default: first URL queued)
+
+        Returns:
+            LinkGraph
+        """
+        with self._lock:
+            # Frontier ids run from 1 without gaps, so node = id - 1
+            urls = [url for url, in self._conn.execute("SELECT url FROM frontier ORDER BY id")]
+            rows = self._conn.execute("SELECT source, targets FROM links").fetchall()
+            root_row = self._conn.execute("SELECT id FROM frontier WHERE url = ?", (root,)).fetchone()
+        targets = [np.frombuffer(blob, dtype=np.int32) for _, blob in rows]
+        sources = np.array([source for source, _ in rows], dtype=np.int64)
+        crawled = np.zeros(len(urls), dtype=bool)
+        crawled[sources - 1] = True
+        sources = np.repeat(sources - 1, [len(t) for t in targets])
+        targets = np.concatenate(targets).astype(np.int64) - 1 if targets else np.empty(0, np.int64)
+        root_id = (root_row[0] - 1 if root_row else 0) if urls else None
+        return LinkGraph.from_edges(urls, sources, targets, crawled, root_id)
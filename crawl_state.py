@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_STATE_PATH = os.getenv("CRAWL_STATE_PATH", os.path.join(".cache", "crawl_state.sqlite"))
+
+
+class CrawlStateStore:
+    """
+    Persistent per-URL crawl state used for incremental re-crawls.
+
+    For every fetched URL it keeps the validators needed for conditional
+    requests (ETag, Last-Modified), a hash of the response body and the
+    extracted title, content and outlinks, so unchanged pages can be
+    restored without downloading or parsing them again.
+    """
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                title TEXT,
+                content TEXT,
+                links TEXT,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, url):
+        """
+        Returns:
+            Dictionary with the stored state for ``url``, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, title, content, links, fetched_at "
+                "FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'url': url,
+            'etag': row[0],
+            'last_modified': row[1],
+            'content_hash': row[2],
+            'title': row[3],
+            'content': row[4],
+            'links': json.loads(row[5]) if row[5] else [],
+            'fetched_at': row[6],
+        }
+
+    def put(self, url, etag, last_modified, content_hash, title, content, links):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages "
+                "(url, etag, last_modified, content_hash, title, content, links, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_hash, title, content,
+                 json.dumps(links), time.time())
+            )
+            self._conn.commit()
+
+    def touch(self, url, etag=None, last_modified=None):
+        """Record a revalidation, refreshing validators the server sent back."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified), fetched_at = ? WHERE url = ?",
+                (etag, last_modified, time.time(), url)
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,19 +1,149 @@
 import requests
-from bs4 import BeautifulSoup
+import gc
 import re
 from urllib.parse import urljoin, urlparse
 import time
 import json
+import hashlib
+import heapq
+import itertools
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from crawl_spill import CrawlSpill
+from dedup import canonicalize_url
+from discovery import DEFAULT_USER_AGENT, RobotsCache, SitemapLoader, frontier_priority
+from extractors import available_backends, extract_page, get_extractor
+from link_graph import LinkGraphBuilder
+from politeness import PolitenessScheduler
+import metrics
+
+class MemoryFrontier:
+    """
+    Per-host priority queues of URLs to fetch, with every URL ever queued
+    kept in a set so none is queued twice.
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.priority = {}
+        self._heaps = defaultdict(list)
+        self._order = itertools.count()
+
+    def __contains__(self, url):
+        return url in self.seen
+
+    def __len__(self):
+        """Number of queued URLs."""
+        return sum(len(heap) for heap in self._heaps.values())
+
+    def add(self, url, priority=None):
+        """Queue ``url`` unless it was seen before; returns whether it was added."""
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        if priority is not None:
+            self.priority[url] = priority
+        self._push(url)
+        return True
+
+    def extend(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def _push(self, url):
+        heapq.heappush(self._heaps[urlparse(url).netloc],
+                       (self.priority.get(url) or frontier_priority(), next(self._order), url))
+
+    def hosts(self):
+        return list(self._heaps)
+
+    def peek(self, host):
+        """Next URL to fetch from ``host``, or None."""
+        heap = self._heaps.get(host)
+        return heap[0][2] if heap else None
+
+    def pop(self, host):
+        """Take the next URL of ``host`` off the queue."""
+        heap = self._heaps.get(host)
+        if not heap:
+            return None
+        url = heapq.heappop(heap)[2]
+        if not heap:
+            del self._heaps[host]
+        return url
+
+    drop = pop
+
+    def complete(self, url):
+        pass
+
+    def release(self, urls):
+        """Queue URLs that were taken off the queue but not fetched again."""
+        for url in urls:
+            self._push(url)
+
 
 class WebCrawler:
-    def __init__(self, base_url, max_pages=50, same_domain_only=True):
-        self.base_url = base_url
+    def __init__(self, base_url, max_pages=50, same_domain_only=True,
+                 max_workers=8, per_host_limit=4, timeout=10, session=None,
+                 state_store=None, extractor=None, parse_workers=0,
+                 respect_robots=True, use_sitemaps=True, requests_per_second=None,
+                 user_agent=DEFAULT_USER_AGENT, spill_dir=None, max_rss_mb=None):
+        # Normalized like every discovered link, so the same-domain check and
+        # the frontier's dedup compare like with like
+        self.base_url = canonicalize_url(base_url)
         self.max_pages = max_pages
         self.same_domain_only = same_domain_only
-        self.visited_urls = set()
-        self.to_visit = [base_url]
-        self.domain = urlparse(base_url).netloc
-        self.pages_data = []
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.timeout = timeout
+        self.domain = urlparse(self.base_url).netloc
+        # Memory-bounded mode: the frontier, page bodies and links live in
+        # spill_dir (see crawl_spill.py), and reopening it resumes the crawl
+        self.spill = CrawlSpill(spill_dir) if spill_dir else None
+        if self.spill is not None:
+            self.frontier = self.spill.frontier
+            self.pages_data = self.spill.pages
+            # Every crawled page's outlinks, for site-structure analytics
+            self.link_graph = self.spill.links
+        else:
+            self.frontier = MemoryFrontier()
+            self.pages_data = []
+            self.link_graph = LinkGraphBuilder()
+        self.frontier.add(self.base_url)
+        # Past this resident size no new fetches start, and the crawl stops
+        # (resumably, when spilling) once the ones in flight finish
+        self.max_rss_mb = max_rss_mb
+        self.memory_limited = False
+        self.user_agent = user_agent
+        self.session = session or self._build_session()
+        # robots.txt rules and Crawl-delay per host; sitemap entries seed the
+        # frontier and carry their priority/lastmod as the URL's rank
+        self.robots = RobotsCache(self.session, user_agent, timeout) if respect_robots else None
+        self.use_sitemaps = use_sitemaps
+        self.scheduler = PolitenessScheduler(requests_per_second, burst=self.per_host_limit)
+        self.blocked_urls = set()
+        self._seeded = self.spill is not None and self.spill.get('seeded', False)
+        # Optional CrawlStateStore enabling conditional, incremental re-crawls
+        self.state_store = state_store
+        self.unchanged_urls = set()
+        # HTML extraction backend (see extractors.py); parse_workers > 0 moves
+        # parsing into a process pool so it runs in parallel with fetching
+        self.extractor = extractor or available_backends()[0]
+        self._extract = get_extractor(self.extractor)
+        self.parse_workers = parse_workers
+        self._parse_pool = None
+
+    def _build_session(self):
+        """Create a pooled session sized for the worker count."""
+        session = requests.Session()
+        session.headers['User-Agent'] = self.user_agent
+        adapter = HTTPAdapter(pool_connections=self.max_workers,
+                              pool_maxsize=self.max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
         
     def is_valid_url(self, url):
         """Check if URL should be crawled."""
@@ -29,94 +159,253 @@ class WebCrawler:
             
         return True
     
-    def extract_text(self, soup):
-        """Extract meaningful text from the page."""
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.extract()
-            
-        # Get text
-        text = soup.get_text(separator=' ', strip=True)
-        
-        # Break into lines and remove leading and trailing space on each
-        lines = (line.strip() for line in text.splitlines())
-        # Break multi-headlines into a line each
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # Remove blank lines
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        return text
-    
     def extract_links(self, soup, current_url):
-        """Extract links from the page."""
+        """Extract links from a BeautifulSoup document."""
+        return self.resolve_links([a_tag['href'] for a_tag in soup.find_all('a', href=True)],
+                                  current_url)
+
+    def resolve_links(self, hrefs, current_url):
+        """
+        Turn raw href values into crawlable absolute URLs, including ones
+        already visited (the link graph needs every edge; the frontier
+        skips visited URLs itself).
+        """
         links = []
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            # Convert relative URLs to absolute
-            absolute_url = urljoin(current_url, href)
-            # Remove fragments
-            absolute_url = absolute_url.split('#')[0]
-            if self.is_valid_url(absolute_url) and absolute_url not in self.visited_urls:
+        for href in hrefs:
+            # Convert relative URLs to absolute, dropping fragments and
+            # tracking parameters so URL variants are only fetched once
+            absolute_url = canonicalize_url(urljoin(current_url, href))
+            if self.is_valid_url(absolute_url):
                 links.append(absolute_url)
-        return links
+        return list(dict.fromkeys(links))
     
-    def crawl(self, max_pages=5):
-        self._crawl_recursive(self.base_url, max_pages)
+    def crawl(self, max_pages=None):
+        """
+        Crawl the site breadth-first with a pool of worker threads.
+
+        Args:
+            max_pages: Maximum number of pages to collect (defaults to the
+                value given to the constructor)
+
+        Returns:
+            List of dictionaries with url, title and content (a lazily read
+            ``SpilledPages`` when crawling with ``spill_dir``)
+        """
+        for _ in self.iter_pages(max_pages):
+            pass
         return self.pages_data
-        
-    def _crawl_recursive(self, url, max_pages):
-        if len(self.pages_data) >= max_pages or url in self.visited_urls:
-            return
-            
+
+    def close(self):
+        """Commit and close the spill directory, if any."""
+        if self.spill is not None:
+            self.spill.close()
+
+    def seed_from_sitemaps(self):
+        """
+        Add the URLs listed in the site's sitemaps to the frontier.
+
+        Returns:
+            Number of URLs added
+        """
+        self._seeded = True
+        loader = SitemapLoader(self.session, self.robots, self.timeout)
+        added = 0
+        for url, priority, lastmod in loader.discover(self.base_url):
+            url = canonicalize_url(url)
+            if self.is_valid_url(url) and self.frontier.add(url, frontier_priority(priority, lastmod)):
+                added += 1
+        if self.spill is not None:
+            self.spill.set('seeded', True)
+            self.spill.checkpoint()
+        print(f"Seeded {added} URLs from sitemaps ({loader.requests} requests)")
+        return added
+
+    def _allowed(self, url, host):
+        """Check robots.txt, configuring the host's pacing the first time it is seen."""
+        if not self.scheduler.is_configured(host):
+            delay = self.robots.crawl_delay(url) if self.robots is not None else None
+            self.scheduler.configure(host, delay)
+        if self.robots is not None and not self.robots.allowed(url):
+            print(f"Blocked by robots.txt: {url}")
+            self.blocked_urls.add(url)
+            return False
+        return True
+
+    def iter_pages(self, max_pages=None):
+        """
+        Crawl like ``crawl`` but yield each page as soon as it is fetched.
+
+        Fetching continues in the background while the caller handles a page,
+        but the frontier only advances when the generator is resumed, so a
+        slow consumer throttles the crawl.
+        """
+        if max_pages is None:
+            max_pages = self.max_pages
+        if self.use_sitemaps and not self._seeded:
+            self.seed_from_sitemaps()
+
+        # The frontier keeps one priority queue per host so a paced or
+        # saturated host never blocks dispatching to the others
+        frontier = self.frontier
+        in_flight = {}
+        host_in_flight = defaultdict(int)
+        started = time.perf_counter()
+        collected = len(self.pages_data)
+
+        if self.parse_workers > 0:
+            self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while len(self.pages_data) < max_pages:
+                    # Fill free worker slots host by host, respecting each
+                    # host's concurrency cap and request rate
+                    over_memory = self._over_memory()
+                    wait_time = None
+                    for host in ([] if over_memory else frontier.hosts()):
+                        while (len(in_flight) < self.max_workers
+                               and len(self.pages_data) + len(in_flight) < max_pages
+                               and host_in_flight[host] < self.per_host_limit):
+                            url = frontier.peek(host)
+                            if url is None:
+                                break
+                            if not self._allowed(url, host):
+                                frontier.drop(host)
+                                continue
+                            delay = self.scheduler.reserve(host)
+                            if delay:
+                                wait_time = delay if wait_time is None else min(wait_time, delay)
+                                break
+                            frontier.pop(host)
+                            host_in_flight[host] += 1
+                            in_flight[executor.submit(self._fetch_page, url)] = (url, host)
+
+                    if not in_flight:
+                        if over_memory:
+                            self.memory_limited = True
+                            print(f"Stopping crawl: memory use exceeds {self.max_rss_mb} MB")
+                            break
+                        if wait_time is None:
+                            break
+                        time.sleep(wait_time)
+                        continue
+
+                    done, _ = wait(in_flight, timeout=wait_time, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        url, host = in_flight.pop(future)
+                        host_in_flight[host] -= 1
+                        page, links = future.result()
+                        if page is not None and len(self.pages_data) >= max_pages:
+                            # Fetched past the limit; left for a later call
+                            frontier.release([url])
+                            continue
+                        frontier.complete(url)
+                        if page is None:
+                            continue
+                        # The page goes last: a spill checkpoints on append,
+                        # and must never commit a page without its links
+                        self.link_graph.add_page(url, links)
+                        frontier.extend(links)
+                        self.pages_data.append(page)
+                        metrics.PAGES_CRAWLED.inc()
+                        yield page
+        finally:
+            elapsed = time.perf_counter() - started
+            if len(self.pages_data) > collected and elapsed > 0:
+                metrics.CRAWL_PAGES_PER_SECOND.set((len(self.pages_data) - collected) / elapsed)
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown()
+                self._parse_pool = None
+            # Keep unfinished work so a later call can resume the crawl
+            frontier.release([url for url, _ in in_flight.values()])
+            if self.spill is not None:
+                self.spill.checkpoint()
+
+    def _over_memory(self):
+        """Whether resident memory is above ``max_rss_mb``, after releasing what can be released."""
+        if self.max_rss_mb is None:
+            return False
+        limit = self.max_rss_mb * 1024 * 1024
+        rss = metrics.process_rss()
+        if rss > limit:
+            gc.collect()
+            if self.spill is not None:
+                self.spill.checkpoint(release_memory=True)
+            rss = metrics.process_rss()
+        metrics.CRAWL_RSS_BYTES.set(rss)
+        return rss > limit
+
+    def _fetch_page(self, url):
+        """Download and parse a single page; runs on a worker thread."""
         try:
-            self.visited_urls.add(url)
             print(f"Crawling: {url}")
-            
-            response = requests.get(url, timeout=10)
+
+            previous = self.state_store.get(url) if self.state_store is not None else None
+            headers = {}
+            if previous:
+                if previous['etag']:
+                    headers['If-None-Match'] = previous['etag']
+                if previous['last_modified']:
+                    headers['If-Modified-Since'] = previous['last_modified']
+
+            host = urlparse(url).netloc
+            with metrics.FETCH_SECONDS.time(host=host), metrics.STAGE_SECONDS.time(stage='fetch'):
+                response = self.session.get(url, timeout=self.timeout, headers=headers)
+            metrics.FETCH_BYTES.inc(len(response.content), host=host)
+            metrics.FETCH_RESPONSES.inc(host=host, status=response.status_code)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+
+            if response.status_code == 304 and previous:
+                self.state_store.touch(url, etag, last_modified)
+                return self._restore_page(previous)
             if response.status_code != 200:
-                return
-                
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract title and content
-            title = soup.title.string if soup.title else "No Title"
-            
-            # Get main content (this is a simple approach, might need refinement)
-            content = ""
-            for paragraph in soup.find_all('p'):
-                content += paragraph.get_text() + "\n"
-                
-            # Store the data
-            self.pages_data.append({
+                return None, []
+
+            content_hash = hashlib.sha256(response.content).hexdigest()
+            if previous and previous['content_hash'] == content_hash:
+                self.state_store.touch(url, etag, last_modified)
+                return self._restore_page(previous)
+
+            # Title, paragraph text and links come from a single parse
+            with metrics.STAGE_SECONDS.time(stage='parse'):
+                if self._parse_pool is not None:
+                    extracted = self._parse_pool.submit(extract_page, response.text,
+                                                        self.extractor).result()
+                else:
+                    extracted = self._extract(response.text)
+            title = extracted['title']
+            content = extracted['content']
+
+            page = {
                 'url': url,
                 'title': title,
                 'content': content
-            })
-            
-            # If we've reached our limit, stop
-            if len(self.pages_data) >= max_pages:  # Limit to max_pages
-                return
-                
-            # Find links and crawl them
-            links = self.extract_links(soup, url)
-            for link in links:
-                if len(self.pages_data) >= max_pages:
-                    break
-                self._crawl_recursive(link, max_pages)
-                    
+            }
+            if extracted['canonical_url']:
+                page['canonical_url'] = urljoin(url, extracted['canonical_url'])
+            links = self.resolve_links(extracted['links'], url)
+
+            if self.state_store is not None:
+                self.state_store.put(url, etag, last_modified, content_hash,
+                                     title, content, links)
+            return page, links
+
         except Exception as e:
             print(f"Error crawling {url}: {e}")
-            
-    def _extract_links(self, soup, current_url):
-        links = []
-        base_domain = urlparse(self.base_url).netloc
-        
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            absolute_url = urljoin(current_url, href)
-            
-            # Only include links to the same domain
-            if urlparse(absolute_url).netloc == base_domain:
-                links.append(absolute_url)
-                
-        return links 
\ No newline at end of file
+            return None, []
+
+    def build_link_graph(self):
+        """LinkGraph of the pages crawled so far, with depth measured from the start URL."""
+        return self.link_graph.build(root=self.base_url)
+
+    def _restore_page(self, previous):
+        """Rebuild a page from stored state when the server reports no change."""
+        self.unchanged_urls.add(previous['url'])
+        page = {
+            'url': previous['url'],
+            'title': previous['title'],
+            'content': previous['content']
+        }
+        links = [link for link in previous['links'] if self.is_valid_url(link)]
+        return page, links
@@ -0,0 +1,157 @@
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import numpy as np
+
+# Query parameters that only track campaigns or sessions and never change content
+TRACKING_PARAMS = {
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl',
+    'igshid', 'ref', 'ref_src', 'spm', 'sessionid', 'sid', 'phpsessid', 'jsessionid',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so trivially different spellings of a page compare equal.
+
+    Lowercases the scheme and host, drops default ports, fragments and
+    tracking parameters, sorts the remaining query parameters and removes
+    the trailing slash from non-root paths.
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    if parsed.port and parsed.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parsed.port}"
+
+    path = re.sub(r'/{2,}', '/', parsed.path or '/')
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+
+    query = [(key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+             if key.lower() not in TRACKING_PARAMS
+             and not key.lower().startswith(TRACKING_PREFIXES)]
+    query.sort()
+
+    return urlunparse((scheme, host, path, '', urlencode(query), ''))
+
+
+def simhash(text, shingle_size=3):
+    """
+    64-bit SimHash of ``text`` over word shingles.
+
+    Near-identical texts get fingerprints that differ in only a few bits.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return 0
+    if len(words) < shingle_size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    hashes = np.frombuffer(
+        b''.join(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest() for s in shingles),
+        dtype='<u8'
+    )
+    # One row of 64 bits per shingle; each bit votes +1/-1
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    fingerprint = np.packbits(votes > 0, bitorder='little').view('<u8')[0]
+    return int(fingerprint)
+
+
+class Deduplicator:
+    """
+    Detect duplicate pages before they are embedded.
+
+    A page is a duplicate when its canonical URL (its ``<link rel=canonical>``
+    target if the crawler found one, otherwise its own URL) was already seen,
+    when its normalized text is identical to an earlier page, or when the
+    SimHash fingerprints differ in at most ``max_distance`` bits. The
+    fingerprints are split into ``max_distance + 1`` bands so only pages
+    sharing a band are compared.
+
+    Pages are checked one at a time, so it works on a stream as well as a list.
+    """
+
+    def __init__(self, max_distance=3, min_words=20):
+        """
+        Args:
+            max_distance: Largest Hamming distance treated as a near duplicate
+            min_words: Pages with fewer words are only matched exactly, since
+                SimHash is unreliable on very short texts
+        """
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self._by_url = {}
+        self._by_text = {}
+        self._band_tables = [{} for _ in range(self.bands)]
+        self._fingerprints = {}
+        # Maps each skipped page URL to the URL of the page it duplicates
+        self.duplicates = {}
+
+    @property
+    def skipped(self):
+        return len(self.duplicates)
+
+    def check(self, page):
+        """
+        Register ``page`` and return the URL of the page it duplicates, or
+        None when it is new.
+        """
+        url = page['url']
+        canonical = canonicalize_url(page.get('canonical_url') or url)
+        representative = self._by_url.get(canonical)
+        if representative is None:
+            representative = self._match_text(page['content'])
+        if representative is not None:
+            self.duplicates[url] = representative
+            return representative
+
+        self._register(url, canonical, page['content'])
+        return None
+
+    def dedupe(self, pages):
+        """
+        Returns:
+            List of the pages that are not duplicates, in input order
+        """
+        return [page for page in pages if self.check(page) is None]
+
+    def _match_text(self, content):
+        normalized = ' '.join(content.split())
+        digest = hashlib.sha1(normalized.encode('utf-8')).digest()
+        if digest in self._by_text:
+            return self._by_text[digest]
+        if len(normalized.split(' ')) < self.min_words:
+            return None
+
+        fingerprint = simhash(normalized)
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for candidate in self._band_tables[band].get(key, ()):
+                if (fingerprint ^ self._fingerprints[candidate]).bit_count() <= self.max_distance:
+                    return candidate
+        return None
+
+    def _band_keys(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def _register(self, url, canonical, content):
+        self._by_url[canonical] = url
+        self._by_url.setdefault(canonicalize_url(url), url)
+        normalized = ' '.join(content.split())
+        self._by_text[hashlib.sha1(normalized.encode('utf-8')).digest()] = url
+        if len(normalized.split(' ')) >= self.min_words:
+            fingerprint = simhash(normalized)
+            self._fingerprints[url] = fingerprint
+            for band, key in enumerate(self._band_keys(fingerprint)):
+                self._band_tables[band].setdefault(key, []).append(url)
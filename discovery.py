@@ -0,0 +1,184 @@
+import gzip
+import io
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+DEFAULT_USER_AGENT = 'VectorizeBot/1.0 (+https://github.com/metehan777/vectorize-app)'
+DEFAULT_PRIORITY = 0.5
+
+
+class RobotsCache:
+    """
+    robots.txt rules and Crawl-delay, fetched once per host and cached.
+
+    Follows the usual conventions: a 401/403 for robots.txt disallows the
+    whole host, any other error or a missing file allows everything.
+    """
+
+    def __init__(self, session, user_agent=DEFAULT_USER_AGENT, timeout=10):
+        self.session = session
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self._parsers = {}
+        self._lock = threading.Lock()
+
+    def _parser(self, url):
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with self._lock:
+            parser = self._parsers.get(origin)
+        if parser is not None:
+            return parser
+
+        parser = RobotFileParser(origin + '/robots.txt')
+        try:
+            response = self.session.get(origin + '/robots.txt', timeout=self.timeout)
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code == 200:
+                parser.parse(response.text.splitlines())
+            else:
+                parser.allow_all = True
+        except Exception as e:
+            print(f"Error fetching robots.txt for {origin}: {e}")
+            parser.allow_all = True
+
+        with self._lock:
+            return self._parsers.setdefault(origin, parser)
+
+    def allowed(self, url):
+        """Whether robots.txt lets us fetch ``url``."""
+        return self._parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        """Crawl-delay in seconds for the host of ``url``, or None."""
+        parser = self._parser(url)
+        delay = parser.crawl_delay(self.user_agent)
+        if delay is None:
+            rate = parser.request_rate(self.user_agent)
+            if rate is not None and rate.requests:
+                return rate.seconds / rate.requests
+            return None
+        return float(delay)
+
+    def sitemaps(self, url):
+        """Sitemap URLs announced in the host's robots.txt."""
+        return list(self._parser(url).site_maps() or [])
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_lastmod(value):
+    """W3C datetime (or plain date) to a POSIX timestamp; 0.0 if unparseable."""
+    if not value:
+        return 0.0
+    value = value.strip().replace('Z', '+00:00')
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_sitemap(data):
+    """
+    Parse a sitemap or sitemap index, gzip-compressed or not.
+
+    Args:
+        data: Raw response body (bytes)
+
+    Returns:
+        Tuple (entries, child_sitemaps); entries are (url, priority,
+        lastmod timestamp) tuples, child_sitemaps are the URLs listed by a
+        sitemap index
+    """
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+
+    entries = []
+    children = []
+    loc = lastmod = priority = None
+    # iterparse keeps memory flat on 50k-URL sitemaps
+    for event, element in ET.iterparse(io.BytesIO(data), events=('end',)):
+        name = _local_name(element.tag)
+        if name == 'loc':
+            loc = (element.text or '').strip()
+        elif name == 'lastmod':
+            lastmod = element.text
+        elif name == 'priority':
+            try:
+                priority = min(max(float(element.text), 0.0), 1.0)
+            except (TypeError, ValueError):
+                priority = None
+        elif name in ('url', 'sitemap'):
+            if loc:
+                if name == 'url':
+                    entries.append((loc, DEFAULT_PRIORITY if priority is None else priority,
+                                    _parse_lastmod(lastmod)))
+                else:
+                    children.append(loc)
+            loc = lastmod = priority = None
+            element.clear()
+    return entries, children
+
+
+class SitemapLoader:
+    """Seed a crawl from a site's sitemaps instead of following links."""
+
+    def __init__(self, session, robots=None, timeout=10, max_sitemaps=50, max_urls=50000):
+        self.session = session
+        self.robots = robots
+        self.timeout = timeout
+        self.max_sitemaps = max_sitemaps
+        self.max_urls = max_urls
+        self.requests = 0
+
+    def discover(self, base_url):
+        """
+        Collect URLs from the sitemaps of ``base_url``'s host.
+
+        Sitemaps listed in robots.txt are used when present, otherwise
+        ``/sitemap.xml``. Sitemap indexes are followed up to ``max_sitemaps``
+        files in total.
+
+        Returns:
+            List of (url, priority, lastmod timestamp) tuples
+        """
+        pending = self.robots.sitemaps(base_url) if self.robots is not None else []
+        if not pending:
+            pending = [urljoin(base_url, '/sitemap.xml')]
+
+        seen = set()
+        entries = []
+        while pending and len(seen) < self.max_sitemaps and len(entries) < self.max_urls:
+            sitemap_url = pending.pop(0)
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            try:
+                self.requests += 1
+                response = self.session.get(sitemap_url, timeout=self.timeout)
+                if response.status_code != 200:
+                    continue
+                found, children = parse_sitemap(response.content)
+            except Exception as e:
+                print(f"Error reading sitemap {sitemap_url}: {e}")
+                continue
+            entries.extend(found[:self.max_urls - len(entries)])
+            pending.extend(children)
+        return entries
+
+
+def frontier_priority(priority=DEFAULT_PRIORITY, lastmod=0.0):
+    """
+    Heap key for a frontier URL: higher sitemap priority first, then the most
+    recently modified. Links found while crawling use the defaults.
+    """
+    return (-priority, -lastmod)
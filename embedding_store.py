@@ -0,0 +1,152 @@
+import json
+import os
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Columnar storage for embedded pages.
+
+    Vectors live in one contiguous float32 (or float16) matrix, with urls and
+    titles in parallel lists and page content kept separately so it can be
+    read lazily. A saved store is a directory holding ``vectors.npy``
+    (memory-mapped on load), ``metadata.json`` and ``content.txt`` with a
+    byte-offset index, so loading reads only what is accessed.
+
+    Indexing or iterating yields the same page dictionaries that
+    ``EmbeddingProcessor.generate_embeddings`` returns, so code written for a
+    list of pages keeps working.
+    """
+
+    VECTORS_FILE = 'vectors.npy'
+    METADATA_FILE = 'metadata.json'
+    CONTENT_FILE = 'content.txt'
+    OFFSETS_FILE = 'content_offsets.npy'
+
+    def __init__(self, dimensions=None, dtype=np.float32, capacity=64):
+        self.dtype = np.dtype(dtype)
+        self.dimensions = dimensions
+        self.urls = []
+        self.titles = []
+        self._vectors = None
+        self._size = 0
+        self._capacity = capacity
+        self._contents = []
+        self._content_path = None
+        self._offsets = None
+        if dimensions is not None:
+            self._vectors = np.empty((capacity, dimensions), dtype=self.dtype)
+
+    @classmethod
+    def from_pages(cls, pages, dtype=np.float32):
+        """Build a store from page dictionaries with url, title, content and embedding."""
+        store = cls(dtype=dtype)
+        store.extend(pages)
+        return store
+
+    def extend(self, pages):
+        """Append embedded page dictionaries, growing the matrix geometrically."""
+        if self._content_path is not None:
+            raise ValueError("Stores loaded from disk are read-only")
+        pages = list(pages)
+        if not pages:
+            return
+        batch = np.asarray([page['embedding'] for page in pages], dtype=self.dtype)
+        if self._vectors is None:
+            self.dimensions = batch.shape[1]
+            self._vectors = np.empty((max(self._capacity, len(pages)), self.dimensions),
+                                     dtype=self.dtype)
+        if batch.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions}-dimensional embeddings, got {batch.shape[1]}")
+
+        needed = self._size + len(pages)
+        if needed > self._vectors.shape[0]:
+            grown = np.empty((max(needed, 2 * self._vectors.shape[0]), self.dimensions),
+                             dtype=self.dtype)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size:needed] = batch
+        self._size = needed
+
+        for page in pages:
+            self.urls.append(page['url'])
+            # str() drops BeautifulSoup string objects that pin the parse tree
+            self.titles.append(str(page['title']) if page['title'] is not None else None)
+            self._contents.append(page['content'])
+
+    @property
+    def vectors(self):
+        """The (n_pages, dimensions) embedding matrix, without copying."""
+        if self._vectors is None:
+            return np.empty((0, self.dimensions or 0), dtype=self.dtype)
+        return self._vectors[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def content(self, index):
+        if self._content_path is None:
+            return self._contents[index]
+        start, end = self._offsets[index], self._offsets[index + 1]
+        with open(self._content_path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode('utf-8')
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return {
+            'url': self.urls[index],
+            'title': self.titles[index],
+            'content': self.content(index),
+            'embedding': self._vectors[index]
+        }
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+    def save(self, directory):
+        """Write the store to ``directory`` so it can be memory-mapped later."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, self.VECTORS_FILE), self.vectors)
+
+        offsets = np.zeros(self._size + 1, dtype=np.int64)
+        with open(os.path.join(directory, self.CONTENT_FILE), 'wb') as f:
+            for index in range(self._size):
+                data = self.content(index).encode('utf-8')
+                f.write(data)
+                offsets[index + 1] = offsets[index] + len(data)
+        np.save(os.path.join(directory, self.OFFSETS_FILE), offsets)
+
+        with open(os.path.join(directory, self.METADATA_FILE), 'w') as f:
+            json.dump({
+                'dtype': self.dtype.name,
+                'dimensions': self.dimensions,
+                'urls': self.urls,
+                'titles': self.titles
+            }, f)
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Open a saved store. Vectors are memory-mapped (no copy) unless
+        ``mmap`` is False; content is read from disk only when accessed.
+        """
+        with open(os.path.join(directory, cls.METADATA_FILE)) as f:
+            metadata = json.load(f)
+
+        store = cls(dtype=metadata['dtype'])
+        store.dimensions = metadata['dimensions']
+        store.urls = metadata['urls']
+        store.titles = metadata['titles']
+        store._vectors = np.load(os.path.join(directory, cls.VECTORS_FILE),
+                                 mmap_mode='r' if mmap else None)
+        store._size = store._vectors.shape[0]
+        store._content_path = os.path.join(directory, cls.CONTENT_FILE)
+        store._offsets = np.load(os.path.join(directory, cls.OFFSETS_FILE))
+        return store
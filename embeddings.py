@@ -1,49 +1,301 @@
 import os
-from google.cloud import aiplatform
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import google.generativeai as genai
 from dotenv import load_dotenv
+from chunking import POOLING_METHODS, Chunker, pool_vectors
+from embedding_store import EmbeddingStore
+import metrics
 
 # Load environment variables
 load_dotenv()
 
-# Get Gemini API key from environment variables
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
+try:
+    from google.api_core import exceptions as google_exceptions
+    TRANSIENT_ERRORS = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        ConnectionError,
+        TimeoutError,
+    )
+except ImportError:
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
 
-# Configure Gemini with the API key
-genai.configure(api_key=GEMINI_API_KEY)
 
-class GoogleCloudEmbeddings:
-    def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables.")
-        genai.configure(api_key=api_key)
+class RateLimiter:
+    """Thread-safe limiter that spaces calls to at most ``requests_per_minute``."""
+
+    def __init__(self, requests_per_minute=None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_BACKENDS = {}
+DEFAULT_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini")
+
+
+def register_backend(name):
+    def decorator(cls):
+        _BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def embedding_backends():
+    """Names of the registered embedding backends."""
+    # The local backends register themselves on import
+    import local_embeddings  # noqa: F401
+    return list(_BACKENDS)
+
+
+def create_embedding_client(backend=None, **options):
+    """
+    Create the embedding client for ``backend`` (``EMBEDDING_BACKEND`` or
+    "gemini" if None); ``options`` go to the backend's constructor.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in embedding_backends():
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return _BACKENDS[backend](**options)
+
+
+class EmbeddingClient:
+    """
+    Interface every embedding backend provides to ``EmbeddingProcessor``.
+
+    Subclasses set ``model_name`` and ``task_type`` and implement
+    ``_embed_batched(texts, task_type)``; the optional ``EmbeddingCache`` in
+    ``cache`` is consulted here, before any text reaches the backend.
+    """
+
+    model_name = None
+    task_type = "retrieval_document"
+    cache = None
+
+    def embed_text(self, text):
+        if not text.strip():
+            raise ValueError("Content for embedding must not be empty.")
+        return self.get_embeddings([text])[0]
+
+    def embed_query(self, text):
+        """Embed a search query, which the model encodes differently from documents."""
+        if not text.strip():
+            raise ValueError("Query must not be empty.")
+        return self.get_embeddings([text], task_type="retrieval_query")[0]
+
+    def get_embeddings(self, texts, task_type=None):
+        """
+        Embed many texts, reusing cached vectors where possible.
+
+        Args:
+            texts: List of strings to embed
+            task_type: Overrides the client's task type (e.g. "retrieval_query")
+
+        Returns:
+            List of embeddings in the same order as ``texts``
+        """
+        task_type = task_type or self.task_type
+        texts = list(texts)
+        if any(not text.strip() for text in texts):
+            raise ValueError("Content for embedding must not be empty.")
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._embed_batched(texts, task_type)
+
+        keys = [self.cache.make_key(self.model_name, task_type, text) for text in texts]
+        found = self.cache.get_many(keys)
+        metrics.EMBEDDING_CACHE_LOOKUPS.inc(len(found), result='hit')
+        metrics.EMBEDDING_CACHE_LOOKUPS.inc(len(keys) - len(found), result='miss')
+
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            fresh = self._embed_batched(list(missing.values()), task_type)
+            new_entries = list(zip(missing.keys(), fresh))
+            self.cache.put_many(new_entries, self.model_name, task_type)
+            found.update(new_entries)
+
+        return [found[key] for key in keys]
+
+    def close(self):
+        """Release resources held by the backend (worker pools, sessions)."""
+
+    def _embed_batched(self, texts, task_type=None):
+        raise NotImplementedError
+
+
+@register_backend("gemini")
+class GoogleCloudEmbeddings(EmbeddingClient):
+    def __init__(self, batch_size=100, max_in_flight=4, max_retries=5,
+                 backoff_seconds=1.0, requests_per_minute=None, embed_fn=None,
+                 cache=None):
+        """
+        Args:
+            batch_size: Number of texts sent per embedding request
+            max_in_flight: Maximum number of batches requested concurrently
+            max_retries: Retries per batch for transient or rate-limit errors
+            backoff_seconds: Base delay for exponential backoff between retries
+            requests_per_minute: Optional client-side cap on request rate
+            embed_fn: Replacement for ``genai.embed_content`` (e.g. a local stub)
+            cache: Optional ``EmbeddingCache`` consulted before calling the API
+        """
+        if embed_fn is None:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY not found in environment variables.")
+            # Imported here so the SDK's import cost is only paid when a
+            # client is created, not on every cold start of the app
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            embed_fn = genai.embed_content
+        self.embed_fn = embed_fn
         self.model_name = "models/gemini-embedding-exp-03-07"
+        self.task_type = "retrieval_document"
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.cache = cache
 
     def embed_text(self, text):
         if not text.strip():
             raise ValueError("Content for embedding must not be empty.")
-        embedding_response = genai.embed_content(
-            model=self.model_name,
-            content=text,
-            task_type="retrieval_document"
-        )
-        return embedding_response["embedding"]
+        if self.cache is None:
+            return self._embed_with_retry(text)
+        return self.get_embeddings([text])[0]
+
+    def _embed_batched(self, texts, task_type=None):
+        batches = [texts[i:i + self.batch_size]
+                   for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.max_in_flight == 1:
+            results = [self._embed_with_retry(batch, task_type) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches))) as executor:
+                # map() yields in submission order, which keeps input order
+                results = list(executor.map(lambda batch: self._embed_with_retry(batch, task_type),
+                                            batches))
+
+        return [embedding for batch in results for embedding in batch]
+
+    def _embed_with_retry(self, content, task_type=None):
+        """Call the embedding API, retrying transient errors with jittered backoff."""
+        texts = [content] if isinstance(content, str) else content
+        metrics.EMBEDDING_BATCH_SIZE.observe(len(texts))
+        metrics.EMBEDDING_TOKENS.inc(sum(len(text) for text in texts) // 4)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                with metrics.STAGE_SECONDS.time(stage='embed'):
+                    embedding_response = self.embed_fn(
+                        model=self.model_name,
+                        content=content,
+                        task_type=task_type or self.task_type
+                    )
+                metrics.EMBEDDING_REQUESTS.inc(outcome='success')
+                return embedding_response["embedding"]
+            except TRANSIENT_ERRORS:
+                if attempt >= self.max_retries:
+                    metrics.EMBEDDING_REQUESTS.inc(outcome='failed')
+                    raise
+                metrics.EMBEDDING_REQUESTS.inc(outcome='retry')
+                delay = self.backoff_seconds * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+                attempt += 1
+
 
 class EmbeddingProcessor:
-    def __init__(self, embedding_client):
+    """
+    Embed pages for visualization and search.
+
+    Page text is split by ``chunker`` so long pages are embedded whole
+    instead of truncated, every chunk of every page goes through the client
+    in the same batched call, and the chunk vectors are pooled back into one
+    vector per page. The chunk vectors themselves are kept in ``passages``
+    (an ``EmbeddingStore`` whose content is the passage text) for passage
+    search.
+    """
+
+    def __init__(self, embedding_client, chunker=None, pooling='mean'):
+        if pooling not in POOLING_METHODS:
+            raise ValueError(f"Unknown pooling method: {pooling}")
         self.embedding_client = embedding_client
+        self.chunker = chunker or Chunker()
+        self.pooling = pooling
+        self.passages = EmbeddingStore()
+
+    def embed_chunked(self, texts):
+        """
+        Embed each text as the pool of its chunk embeddings.
+
+        Args:
+            texts: List of texts to embed
+
+        Returns:
+            One (page vector, chunk list, chunk vectors) tuple per text, or
+            None for a text with nothing to embed (e.g. only whitespace)
+        """
+        chunks = [list(self.chunker.chunks(text)) for text in texts]
+        flat = [chunk for page_chunks in chunks for chunk in page_chunks]
+        vectors = np.asarray(self.embedding_client.get_embeddings(flat), dtype=np.float32) if flat else None
+
+        results = []
+        offset = 0
+        for page_chunks in chunks:
+            if not page_chunks:
+                results.append(None)
+                continue
+            page_vectors = vectors[offset:offset + len(page_chunks)]
+            offset += len(page_chunks)
+            pooled = pool_vectors(page_vectors, [len(chunk) for chunk in page_chunks], self.pooling)
+            results.append((pooled, page_chunks, page_vectors))
+        return results
+
+    def _embed_pages(self, items, texts):
+        """Page vectors for ``items`` (None where there was nothing to embed)."""
+        results = self.embed_chunked(texts)
+        for item, result in zip(items, results):
+            if result is None:
+                continue
+            _, page_chunks, page_vectors = result
+            self.passages.extend([{
+                'url': item['url'],
+                'title': item['title'],
+                'content': chunk,
+                'embedding': vector
+            } for chunk, vector in zip(page_chunks, page_vectors)])
+        return [result[0] if result is not None else None for result in results]
 
     def generate_embeddings(self, content):
+        # Skip empty content
+        items = [item for item in content if item['content'].strip()]
+        embeddings = self._embed_pages(items, [item['content'] for item in items])
+
         embeddings_data = []
-        for item in content:
-            if not item['content'].strip():
-                # Skip empty content
+        for item, embedding in zip(items, embeddings):
+            if embedding is None:
                 continue
-            embedding = self.embedding_client.embed_text(item['content'])
             embeddings_data.append({
                 'url': item['url'],
                 'title': item['title'],
@@ -52,6 +304,13 @@ class EmbeddingProcessor:
             })
         return embeddings_data
 
+    def build_store(self, content, dtype=np.float32):
+        """
+        Embed pages like ``generate_embeddings`` but return a columnar
+        ``EmbeddingStore`` instead of a list of dictionaries.
+        """
+        return EmbeddingStore.from_pages(self.generate_embeddings(content), dtype=dtype)
+
     def process_pages(self, pages_data):
         """
         Process crawled pages and add embeddings.
@@ -60,16 +319,17 @@ class EmbeddingProcessor:
             pages_data: List of dictionaries with page information
             
         Returns:
-            Updated pages_data with embeddings
+            The pages of pages_data that had text to embed, with embeddings
         """
-        # Extract texts to embed
-        texts = [f"{page['title']} {page['content'][:1000]}" for page in pages_data]
-        
-        # Get embeddings
-        embeddings = self.embedding_client.get_embeddings(texts)
+        # Embed the full page (title plus all of its content), chunk by chunk
+        texts = [f"{page['title']}\n{page['content']}" for page in pages_data]
+        embeddings = self._embed_pages(pages_data, texts)
         
-        # Add embeddings to pages_data
-        for i, page in enumerate(pages_data):
-            page['embedding'] = embeddings[i]
-            
-        return pages_data 
\ No newline at end of file
+        # Add embeddings to pages_data, skipping pages with no text
+        embedded = []
+        for page, embedding in zip(pages_data, embeddings):
+            if embedding is not None:
+                page['embedding'] = embedding
+                embedded.append(page)
+
+        return embedded
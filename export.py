@@ -0,0 +1,173 @@
+"""
+Bulk export of embedded pages.
+
+Every exporter walks an ``EmbeddingStore`` ``chunk_size`` rows at a time, so
+memory stays flat however large the store is (a loaded store is memory-mapped
+and only the current chunk is read). Vectors can be exported as float32,
+float16 or int8; int8 uses one symmetric scale per vector, exported next to
+it, so ``vector ~= int8_values * scale``.
+"""
+import importlib.util
+import io
+import json
+import os
+
+import numpy as np
+
+QUANTIZATIONS = ('float32', 'float16', 'int8')
+EXPORT_FORMATS = ('jsonl', 'npy', 'parquet')
+
+
+def parquet_available():
+    """Whether pyarrow is installed, without importing it."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def quantize(vectors, quantization=None):
+    """
+    Convert a block of float vectors for export.
+
+    Args:
+        vectors: 2D array of embeddings
+        quantization: 'float32' (or None), 'float16' or 'int8'
+
+    Returns:
+        Tuple (converted array, per-row float32 scales or None)
+    """
+    quantization = quantization or 'float32'
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if quantization == 'float32':
+        return vectors, None
+    if quantization == 'float16':
+        return vectors.astype(np.float16), None
+    if quantization == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization: {quantization}")
+
+
+def _chunks(store, chunk_size):
+    for start in range(0, len(store), chunk_size):
+        yield start, min(start + chunk_size, len(store))
+
+
+def _metadata(store, index, scale=None, include_content=False):
+    record = {'index': index, 'url': store.urls[index], 'title': store.titles[index]}
+    if scale is not None:
+        record['scale'] = float(scale)
+    if include_content:
+        record['content'] = store.content(index)
+    return record
+
+
+def iter_jsonl(store, quantization=None, include_vectors=True, include_content=False,
+               chunk_size=1024):
+    """
+    Yield the store as JSON Lines, one string per chunk of records.
+
+    With ``include_vectors=False`` this is the metadata sidecar for an
+    ``.npy`` export (index, url, title and, for int8, the scale).
+    """
+    for start, end in _chunks(store, chunk_size):
+        vectors, scales = quantize(store.vectors[start:end], quantization)
+        lines = []
+        for offset, index in enumerate(range(start, end)):
+            record = _metadata(store, index, scales[offset] if scales is not None else None,
+                               include_content)
+            if include_vectors:
+                record['embedding'] = vectors[offset].tolist()
+            lines.append(json.dumps(record))
+        yield '\n'.join(lines) + '\n'
+
+
+def npy_header(shape, dtype):
+    """Bytes of a version 1.0 ``.npy`` header for an array of ``shape`` and ``dtype``."""
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': tuple(shape)
+    })
+    return header.getvalue()
+
+
+def iter_npy(store, quantization=None, chunk_size=1024):
+    """
+    Yield a complete ``.npy`` file of the (quantized) vectors in pieces: the
+    header first, then the raw rows chunk by chunk.
+    """
+    dtype = {'float16': np.float16, 'int8': np.int8}.get(quantization, np.float32)
+    yield npy_header((len(store), store.dimensions or 0), dtype)
+    for start, end in _chunks(store, chunk_size):
+        vectors, _ = quantize(store.vectors[start:end], quantization)
+        yield np.ascontiguousarray(vectors, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+
+
+def write_jsonl(store, path, quantization=None, include_content=False, chunk_size=1024):
+    with open(path, 'w') as f:
+        for piece in iter_jsonl(store, quantization, include_content=include_content,
+                                chunk_size=chunk_size):
+            f.write(piece)
+    return path
+
+
+def write_npy(store, directory, quantization=None, chunk_size=1024):
+    """
+    Write ``embeddings.npy`` plus a ``metadata.jsonl`` sidecar.
+
+    Returns:
+        Tuple (vectors path, metadata path)
+    """
+    os.makedirs(directory, exist_ok=True)
+    vectors_path = os.path.join(directory, 'embeddings.npy')
+    with open(vectors_path, 'wb') as f:
+        for piece in iter_npy(store, quantization, chunk_size):
+            f.write(piece)
+    metadata_path = os.path.join(directory, 'metadata.jsonl')
+    with open(metadata_path, 'w') as f:
+        for piece in iter_jsonl(store, quantization, include_vectors=False, chunk_size=chunk_size):
+            f.write(piece)
+    return vectors_path, metadata_path
+
+
+def write_parquet(store, path, quantization=None, chunk_size=4096):
+    """
+    Write a Parquet file with url, title and an ``embedding`` fixed-size list
+    column (plus ``scale`` for int8), one row group per chunk.
+
+    Requires pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install -r requirements-parquet.txt)")
+
+    value_type = {'float16': pa.float16(), 'int8': pa.int8()}.get(quantization, pa.float32())
+    dimensions = store.dimensions or 0
+    fields = [
+        pa.field('url', pa.string()),
+        pa.field('title', pa.string()),
+        pa.field('embedding', pa.list_(value_type, dimensions)),
+    ]
+    if quantization == 'int8':
+        fields.append(pa.field('scale', pa.float32()))
+    schema = pa.schema(fields)
+
+    with pq.ParquetWriter(path, schema) as writer:
+        for start, end in _chunks(store, chunk_size):
+            vectors, scales = quantize(store.vectors[start:end], quantization)
+            # Fixed-size lists wrap the flat buffer without copying per row
+            embedding = pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel(), type=value_type),
+                                                          dimensions)
+            columns = [
+                pa.array(store.urls[start:end], type=pa.string()),
+                pa.array(store.titles[start:end], type=pa.string()),
+                embedding,
+            ]
+            if scales is not None:
+                columns.append(pa.array(scales, type=pa.float32()))
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+    return path
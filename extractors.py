@@ -0,0 +1,229 @@
+"""
+HTML extraction backends for the crawler.
+
+Every backend turns an HTML document into the same dictionary in a single
+parse: ``title``, ``content`` (the text of each ``<p>`` followed by a
+newline, as the crawler has always stored it), ``links`` (raw ``href``
+values of ``<a>`` tags) and ``canonical_url`` (raw ``href`` of
+``<link rel=canonical>``, or None).
+
+Backends, fastest first: ``selectolax`` and ``lxml`` when installed, and
+``stream``, a pure standard-library streaming parser. ``bs4`` keeps the
+original BeautifulSoup behavior available for comparison.
+"""
+import re
+from html.parser import HTMLParser
+
+_BACKENDS = {}
+# Elements whose text is never page content, wherever they appear
+_SKIP_TAGS = ('script', 'style', 'noscript', 'template')
+# lxml refuses str input that declares an encoding, as XHTML pages often do
+_XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+def register_backend(name):
+    def decorator(fn):
+        _BACKENDS[name] = fn
+        return fn
+    return decorator
+
+
+def _selectolax_parser():
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser
+    except ImportError:
+        # selectolax < 1.0 only ships the Modest backend
+        from selectolax.parser import HTMLParser as ModestHTMLParser
+        return ModestHTMLParser
+
+
+def available_backends():
+    """Names of the backends whose parser library is importable, fastest first."""
+    names = []
+    for name, probe in (('selectolax', _selectolax_parser),
+                        ('lxml', lambda: __import__('lxml.html')),
+                        ('stream', None),
+                        ('bs4', lambda: __import__('bs4'))):
+        if probe is not None:
+            try:
+                probe()
+            except ImportError:
+                continue
+        names.append(name)
+    return names
+
+
+def get_extractor(name=None):
+    """
+    Return the extraction function for backend ``name`` (the fastest
+    available one if None).
+    """
+    if name is None:
+        name = available_backends()[0]
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown HTML extractor backend: {name}")
+    return _BACKENDS[name]
+
+
+def extract_page(html, backend=None):
+    """Module-level entry point so extraction can run in a process pool."""
+    return get_extractor(backend)(html)
+
+
+def _result(title, paragraphs, links, canonical_url):
+    content = "\n".join(paragraphs)
+    if content:
+        content += "\n"
+    return {
+        'title': title,
+        'content': content,
+        'links': links,
+        'canonical_url': canonical_url
+    }
+
+
+def _is_canonical(rel):
+    return rel is not None and 'canonical' in rel.lower().split()
+
+
+class _StreamingExtractor(HTMLParser):
+    """Collects title, paragraph text and links while the document streams by."""
+
+    _SKIP = set(_SKIP_TAGS)
+    # Opening or closing one of these ends an open paragraph, as in browsers
+    _BLOCKS = {'address', 'article', 'aside', 'blockquote', 'body', 'div', 'dl', 'fieldset',
+               'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header',
+               'hr', 'li', 'main', 'nav', 'ol', 'pre', 'section', 'table', 'td', 'ul'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.paragraphs = []
+        self.links = []
+        self.canonical_url = None
+        self._in_title = False
+        self._title_parts = None
+        self._paragraph = None
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif tag in self._BLOCKS:
+            self._close_paragraph()
+        elif tag == 'p':
+            # A new paragraph implicitly closes an open one
+            self._close_paragraph()
+            self._paragraph = []
+        elif tag == 'a':
+            href = dict(attrs).get('href')
+            if href is not None:
+                self.links.append(href)
+        elif tag == 'title' and self._title_parts is None:
+            self._in_title = True
+            self._title_parts = []
+        elif tag == 'link' and self.canonical_url is None:
+            attributes = dict(attrs)
+            if _is_canonical(attributes.get('rel')) and attributes.get('href'):
+                self.canonical_url = attributes['href']
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in ('a', 'link'):
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == 'p' or tag in self._BLOCKS:
+            self._close_paragraph()
+        elif tag == 'title' and self._in_title:
+            self._in_title = False
+            self.title = ''.join(self._title_parts) or None
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+        elif self._paragraph is not None and not self._skip_depth:
+            self._paragraph.append(data)
+
+    def _close_paragraph(self):
+        if self._paragraph is not None:
+            self.paragraphs.append(''.join(self._paragraph))
+            self._paragraph = None
+
+    def finish(self):
+        self.close()
+        self._close_paragraph()
+        if self._in_title:
+            self.title = ''.join(self._title_parts) or None
+        return self
+
+
+@register_backend('stream')
+def extract_stream(html):
+    parser = _StreamingExtractor()
+    parser.feed(html)
+    parser.finish()
+    title = parser.title if parser._title_parts is not None else "No Title"
+    return _result(title, parser.paragraphs, parser.links, parser.canonical_url)
+
+
+@register_backend('lxml')
+def extract_lxml(html):
+    import lxml.etree
+    import lxml.html
+
+    html = _XML_DECLARATION.sub('', html, count=1)
+    if not html.strip():
+        return _result("No Title", [], [], None)
+    doc = lxml.html.document_fromstring(html)
+    title = "No Title"
+    links = []
+    canonical_url = None
+    for element in doc.iter('title', 'a', 'link'):
+        tag = element.tag
+        if tag == 'a':
+            href = element.get('href')
+            if href is not None:
+                links.append(href)
+        elif tag == 'title':
+            if title == "No Title":
+                title = element.text_content() or None
+        elif canonical_url is None and _is_canonical(element.get('rel')):
+            canonical_url = element.get('href')
+    # Links inside <noscript> still count, but its text (like scripts') does not
+    lxml.etree.strip_elements(doc, *_SKIP_TAGS, with_tail=False)
+    paragraphs = [element.text_content() for element in doc.iter('p')]
+    return _result(title, paragraphs, links, canonical_url)
+
+
+@register_backend('selectolax')
+def extract_selectolax(html):
+    tree = _selectolax_parser()(html)
+    title_node = tree.css_first('title')
+    title = (title_node.text() or None) if title_node is not None else "No Title"
+    links = [node.attributes.get('href') for node in tree.css('a[href]')]
+    canonical_url = None
+    for node in tree.css('link[rel][href]'):
+        if _is_canonical(node.attributes.get('rel')):
+            canonical_url = node.attributes.get('href')
+            break
+    tree.strip_tags(list(_SKIP_TAGS))
+    paragraphs = [node.text(deep=True) for node in tree.css('p')]
+    return _result(title, paragraphs, [href for href in links if href is not None], canonical_url)
+
+
+@register_backend('bs4')
+def extract_bs4(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    title = str(soup.title.string) if soup.title and soup.title.string else (
+        None if soup.title else "No Title")
+    links = [a_tag['href'] for a_tag in soup.find_all('a', href=True)]
+    canonical = soup.find('link', rel='canonical', href=True)
+    for element in soup.find_all(_SKIP_TAGS):
+        element.decompose()
+    paragraphs = [paragraph.get_text() for paragraph in soup.find_all('p')]
+    return _result(title, paragraphs, links, canonical['href'] if canonical else None)
@@ -0,0 +1,237 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from metrics import capture_profile
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while too many jobs are already pending."""
+
+
+class MemoryResultStore:
+    """Keeps job records in a dictionary; state is lost when the process exits."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def save(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def delete_finished_before(self, cutoff):
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['status'] in FINISHED_STATES and job['updated_at'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return expired
+
+
+class SQLiteResultStore:
+    """
+    Keeps job records in SQLite so every worker process of a multi-worker
+    server can read job status and results.
+    """
+
+    _JSON_FIELDS = ('params', 'progress', 'result')
+    _COLUMNS = ('id', 'kind', 'status', 'params', 'progress', 'result', 'error',
+                'created_at', 'updated_at')
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def _encode(self, field, value):
+        return json.dumps(value) if field in self._JSON_FIELDS else value
+
+    def save(self, job):
+        values = [self._encode(column, job.get(column)) for column in self._COLUMNS]
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(self._COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self._COLUMNS))})", values
+            )
+            self._conn.commit()
+
+    def update(self, job_id, **fields):
+        if not fields:
+            return
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        values = [self._encode(field, value) for field, value in fields.items()]
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", values + [job_id])
+            self._conn.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self._COLUMNS, row))
+        for field in self._JSON_FIELDS:
+            job[field] = json.loads(job[field]) if job[field] is not None else None
+        return job
+
+    def delete_finished_before(self, cutoff):
+        with self._lock:
+            params = FINISHED_STATES + (cutoff,)
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", params
+            )]
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", params
+            )
+            self._conn.commit()
+        return expired
+
+
+def create_result_store(backend=None, path=None):
+    """
+    Build the result store named by ``backend`` (or the ``JOB_STORE``
+    environment variable): ``memory`` (default) or ``sqlite``.
+    """
+    backend = backend or os.getenv("JOB_STORE", "memory")
+    if backend == 'memory':
+        return MemoryResultStore()
+    if backend == 'sqlite':
+        return SQLiteResultStore(path or os.getenv("JOB_STORE_PATH", os.path.join(".cache", "jobs.sqlite")))
+    raise ValueError(f"Unknown job store backend: {backend}")
+
+
+class JobContext:
+    """Handle passed to a running job so it can publish progress."""
+
+    def __init__(self, store, job_id, artifact_dir=None):
+        self.store = store
+        self.job_id = job_id
+        self.progress = {}
+        # Directory for large job outputs; removed when the job expires
+        self.artifact_dir = artifact_dir
+
+    def report(self, **progress):
+        self.progress.update(progress)
+        self.store.update(self.job_id, progress=dict(self.progress), updated_at=time.time())
+
+
+class JobManager:
+    """
+    Run analysis jobs on a bounded worker pool and record their state.
+
+    ``submit`` returns immediately with a job ID; status and results are read
+    back through ``get``. Finished jobs are removed ``ttl_seconds`` after they
+    complete, together with their directory under ``artifact_root``.
+    """
+
+    def __init__(self, store=None, max_workers=2, max_pending=16, ttl_seconds=3600,
+                 artifact_root=None):
+        self.store = store or MemoryResultStore()
+        self.artifact_root = artifact_root or os.getenv(
+            "JOB_ARTIFACT_ROOT", os.path.join(".cache", "jobs"))
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, profile=None, **params):
+        """
+        Queue ``fn(job_context, **params)`` to run in the worker pool.
+
+        Args:
+            profile: Optional profiler ('cprofile' or 'pyinstrument') to run
+                the job under; the report is written to its artifact directory
+
+        Returns:
+            The new job's ID
+        """
+        self.purge_expired()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"Too many jobs in progress (limit {self.max_pending})")
+            self._pending += 1
+
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self.store.save({
+            'id': job_id,
+            'kind': kind,
+            'status': QUEUED,
+            'params': dict(params, profile=profile) if profile else params,
+            'progress': {},
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+        })
+        self._executor.submit(self._run, job_id, fn, params, profile)
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def artifact_dir(self, job_id):
+        return os.path.join(self.artifact_root, job_id)
+
+    def purge_expired(self):
+        expired = self.store.delete_finished_before(time.time() - self.ttl_seconds)
+        for job_id in expired:
+            shutil.rmtree(self.artifact_dir(job_id), ignore_errors=True)
+        return len(expired)
+
+    def _run(self, job_id, fn, params, profile=None):
+        try:
+            self.store.update(job_id, status=RUNNING, updated_at=time.time())
+            with capture_profile(profile, self.artifact_dir(job_id)):
+                result = fn(JobContext(self.store, job_id, self.artifact_dir(job_id)), **params)
+            self.store.update(job_id, status=SUCCEEDED, result=result, updated_at=time.time())
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e), updated_at=time.time())
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
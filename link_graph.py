@@ -0,0 +1,311 @@
+"""
+Site link graph and structure analytics.
+
+The crawler records each page's outlinks in a ``LinkGraphBuilder`` (URLs
+interned to int32 ids, edges in two flat arrays) and ``build()`` turns them
+into a ``LinkGraph`` backed by a scipy.sparse CSR adjacency matrix. All of
+the analytics are sparse matrix operations, so they stay fast for sites
+with 100k pages and millions of links.
+"""
+import json
+import os
+from array import array
+
+import numpy as np
+
+UNREACHABLE = -1
+
+
+class LinkGraphBuilder:
+    """Accumulates pages and their outlinks while a crawl runs."""
+
+    def __init__(self):
+        self.urls = []
+        self._ids = {}
+        self._sources = array('i')
+        self._targets = array('i')
+        self._crawled = set()
+
+    def _id(self, url):
+        node = self._ids.get(url)
+        if node is None:
+            node = self._ids[url] = len(self.urls)
+            self.urls.append(url)
+        return node
+
+    def add_page(self, url, links):
+        """Record a crawled page and the URLs it links to (self-links are ignored)."""
+        source = self._id(url)
+        self._crawled.add(source)
+        targets = {self._id(link) for link in links}
+        targets.discard(source)
+        self._sources.extend([source] * len(targets))
+        self._targets.extend(targets)
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, url):
+        return url in self._ids
+
+    def build(self, root=None):
+        """
+        Args:
+            root: URL crawl depth is measured from (default: first page added)
+
+        Returns:
+            LinkGraph
+        """
+        n = len(self.urls)
+        sources = np.frombuffer(self._sources, dtype=np.int32) if self._sources else np.empty(0, np.int32)
+        targets = np.frombuffer(self._targets, dtype=np.int32) if self._targets else np.empty(0, np.int32)
+        crawled = np.zeros(n, dtype=bool)
+        crawled[list(self._crawled)] = True
+        root_id = self._ids.get(root, 0) if n else None
+        return LinkGraph.from_edges(list(self.urls), sources, targets, crawled, root_id)
+
+
+class LinkGraph:
+    """
+    Directed link graph over the URLs seen during a crawl.
+
+    ``matrix[i, j]`` is 1 when page ``i`` links to URL ``j``. ``crawled``
+    marks the nodes that were fetched; the others were only linked to.
+    """
+
+    MATRIX_FILE = 'links.npz'
+    METADATA_FILE = 'links.json'
+
+    def __init__(self, urls, matrix, crawled, root=0):
+        self.urls = urls
+        self.matrix = matrix.tocsr()
+        self.crawled = np.asarray(crawled, dtype=bool)
+        self.root = root
+        self._ids = None
+
+    @classmethod
+    def from_edges(cls, urls, sources, targets, crawled, root=0):
+        """Build a graph from parallel arrays of source and target node ids."""
+        from scipy import sparse
+
+        n = len(urls)
+        matrix = sparse.csr_matrix((np.ones(len(sources), dtype=np.float32), (sources, targets)),
+                                   shape=(n, n))
+        # A link repeated on a page (or restored twice) still counts once
+        matrix.data[:] = 1.0
+        return cls(urls, matrix, crawled, root)
+
+    def __len__(self):
+        return len(self.urls)
+
+    @property
+    def edges(self):
+        return int(self.matrix.nnz)
+
+    def node_ids(self, urls):
+        """Graph ids of ``urls`` (-1 for URLs not in the graph)."""
+        if self._ids is None:
+            self._ids = {url: i for i, url in enumerate(self.urls)}
+        return np.array([self._ids.get(url, -1) for url in urls], dtype=np.int64)
+
+    def in_degree(self):
+        return np.asarray(self.matrix.sum(axis=0)).ravel().astype(np.int64)
+
+    def out_degree(self):
+        return np.diff(self.matrix.indptr).astype(np.int64)
+
+    def pagerank(self, damping=0.85, tolerance=1e-8, max_iterations=100):
+        """
+        PageRank by power iteration; pages without outlinks spread their rank
+        evenly over every node.
+
+        Returns:
+            float64 array of scores summing to 1, one per node
+        """
+        n = len(self)
+        if n == 0:
+            return np.empty(0)
+        out_degree = self.out_degree()
+        dangling = out_degree == 0
+        inverse_degree = np.where(dangling, 0.0, 1.0 / np.maximum(out_degree, 1))
+        transposed = self.matrix.T.tocsr()
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iterations):
+            spread = transposed @ (rank * inverse_degree)
+            updated = damping * (spread + rank[dangling].sum() / n) + (1.0 - damping) / n
+            converged = np.abs(updated - rank).sum() < tolerance
+            rank = updated
+            if converged:
+                break
+        return rank / rank.sum()
+
+    def depths(self, root=None):
+        """Fewest clicks from ``root`` (default: the crawl's start page) to each node; -1 if unreachable."""
+        from scipy.sparse import csgraph
+
+        root = self.root if root is None else root
+        if root is None or len(self) == 0:
+            return np.full(len(self), UNREACHABLE, dtype=np.int64)
+        distances = csgraph.shortest_path(self.matrix, unweighted=True, indices=root)
+        return np.where(np.isinf(distances), UNREACHABLE, distances).astype(np.int64)
+
+    def orphans(self):
+        """Ids of crawled pages (other than the root) that no other page links to."""
+        orphan = self.crawled & (self.in_degree() == 0)
+        if self.root is not None:
+            orphan[self.root] = False
+        return np.flatnonzero(orphan)
+
+    def similar_unlinked(self, store, threshold=0.85, k=10, limit=None, block_elements=1 << 24,
+                         exact_threshold=20000, n_probe=4):
+        """
+        Pairs of pages whose embeddings are similar but which do not link to
+        each other in either direction.
+
+        Similarity is computed block by block: up to ``exact_threshold``
+        pages, row blocks are scored against every page; above it, pages are
+        partitioned with k-means and each partition is only scored against
+        the pages of its ``n_probe`` nearest partitions. Each page keeps its
+        ``k`` best matches, and the link check is a sparse lookup.
+
+        Args:
+            store: EmbeddingStore of the crawled pages
+            threshold: Minimum cosine similarity
+            k: Candidate matches kept per page
+            limit: Maximum number of pairs returned
+            block_elements: Size cap of one block of similarity scores
+
+        Returns:
+            List of (store index, store index, similarity), most similar first
+        """
+        vectors = np.asarray(store.vectors, dtype=np.float32)
+        n = len(vectors)
+        if n < 2:
+            return []
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        if n <= exact_threshold:
+            blocks = _row_blocks(n, block_elements)
+        else:
+            blocks = _partition_blocks(vectors, n_probe)
+
+        lefts, rights, scores = [], [], []
+        for rows, columns in blocks:
+            candidates = vectors if columns is None else vectors[columns]
+            similarity = vectors[rows] @ candidates.T
+            if columns is None:
+                column_ids = np.arange(n)
+                similarity[np.arange(len(rows)), rows] = -np.inf
+            else:
+                column_ids = columns
+                similarity[rows[:, None] == column_ids[None, :]] = -np.inf
+            count = min(k, similarity.shape[1])
+            top = np.argpartition(-similarity, count - 1, axis=1)[:, :count]
+            top_scores = np.take_along_axis(similarity, top, axis=1)
+            keep = top_scores >= threshold
+            row_index, column_index = np.nonzero(keep)
+            lefts.append(rows[row_index])
+            rights.append(column_ids[top[row_index, column_index]])
+            scores.append(top_scores[row_index, column_index])
+
+        left = np.concatenate(lefts)
+        right = np.concatenate(rights)
+        score = np.concatenate(scores)
+        # Each unordered pair once, keeping its best score
+        left, right = np.minimum(left, right), np.maximum(left, right)
+        order = np.lexsort((-score, right, left))
+        left, right, score = left[order], right[order], score[order]
+        first = np.ones(len(left), dtype=bool)
+        first[1:] = (left[1:] != left[:-1]) | (right[1:] != right[:-1])
+        left, right, score = left[first], right[first], score[first]
+
+        nodes = self.node_ids(store.urls)
+        source, target = nodes[left], nodes[right]
+        in_graph = (source >= 0) & (target >= 0)
+        linked = np.zeros(len(left), dtype=bool)
+        if in_graph.any():
+            undirected = self.matrix + self.matrix.T
+            linked[in_graph] = np.asarray(undirected[source[in_graph], target[in_graph]]).ravel() > 0
+        left, right, score = left[~linked], right[~linked], score[~linked]
+
+        order = np.argsort(-score, kind='stable')[:limit]
+        return [(int(left[i]), int(right[i]), float(score[i])) for i in order]
+
+    def summary(self, titles=None, top=20):
+        """
+        JSON-serializable overview: counts, depth histogram, the ``top``
+        crawled pages by PageRank and the orphan pages.
+        """
+        rank = self.pagerank()
+        depth = self.depths()
+        in_degree = self.in_degree()
+        out_degree = self.out_degree()
+        crawled = np.flatnonzero(self.crawled)
+        best = crawled[np.argsort(-rank[crawled], kind='stable')[:top]]
+        levels, counts = np.unique(depth[crawled], return_counts=True)
+        titles = titles or {}
+
+        def page(node):
+            return {'url': self.urls[node], 'title': titles.get(self.urls[node]),
+                    'pagerank': float(rank[node]), 'depth': int(depth[node]),
+                    'inlinks': int(in_degree[node]), 'outlinks': int(out_degree[node])}
+
+        return {
+            'nodes': len(self),
+            'crawled': int(len(crawled)),
+            'edges': self.edges,
+            'depths': {str(int(level)): int(count) for level, count in zip(levels, counts)},
+            'top_pages': [page(node) for node in best],
+            'orphans': [page(node) for node in self.orphans()]
+        }
+
+    def save(self, directory):
+        from scipy import sparse
+
+        os.makedirs(directory, exist_ok=True)
+        sparse.save_npz(os.path.join(directory, self.MATRIX_FILE), self.matrix)
+        with open(os.path.join(directory, self.METADATA_FILE), 'w') as f:
+            json.dump({'urls': self.urls, 'crawled': np.flatnonzero(self.crawled).tolist(),
+                       'root': self.root}, f)
+        return directory
+
+    @classmethod
+    def load(cls, directory):
+        from scipy import sparse
+
+        with open(os.path.join(directory, cls.METADATA_FILE)) as f:
+            metadata = json.load(f)
+        crawled = np.zeros(len(metadata['urls']), dtype=bool)
+        crawled[metadata['crawled']] = True
+        matrix = sparse.load_npz(os.path.join(directory, cls.MATRIX_FILE))
+        return cls(metadata['urls'], matrix, crawled, metadata['root'])
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, cls.METADATA_FILE))
+
+
+def _row_blocks(n, block_elements):
+    """Consecutive row ranges, each scored against every page."""
+    size = max(1, block_elements // n)
+    for start in range(0, n, size):
+        yield np.arange(start, min(start + size, n)), None
+
+
+def _partition_blocks(vectors, n_probe):
+    """k-means partitions, each scored against its ``n_probe`` nearest partitions."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    n_lists = int(np.sqrt(len(vectors)))
+    kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=3, random_state=0)
+    assignments = kmeans.fit_predict(vectors)
+    centroids = kmeans.cluster_centers_
+    order = np.argsort(assignments, kind='stable')
+    bounds = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+    members = [order[bounds[i]:bounds[i + 1]] for i in range(n_lists)]
+    count = min(n_probe, n_lists)
+    nearest = np.argpartition(-(centroids @ centroids.T), count - 1, axis=1)[:, :count]
+    for partition in range(n_lists):
+        if len(members[partition]):
+            probed = np.union1d(nearest[partition], [partition])
+            yield members[partition], np.concatenate([members[p] for p in probed])
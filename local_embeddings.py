@@ -0,0 +1,236 @@
+"""
+Local CPU embedding backends.
+
+These run without an API key or network access, behind the same
+``embed_text``/``get_embeddings`` interface as ``GoogleCloudEmbeddings``:
+
+- ``hashing``: hashed word/bigram term frequencies projected to a dense
+  vector by a fixed sparse random projection (scikit-learn only)
+- ``sentence-transformers``: any sentence-transformers model
+- ``onnx``: a transformer encoder exported to ONNX, run with onnxruntime and
+  a Hugging Face ``tokenizer.json``, mean-pooled
+
+Texts are sorted by length and grouped into batches under a token budget,
+so a batch pads to similar lengths, and batches run on a thread pool (the
+model runtimes release the GIL while they compute) or, for the hashing
+backend whose tokenizer is pure Python, on a process pool.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+from embeddings import EmbeddingClient, register_backend
+
+
+# The client a process-pool worker encodes with, sent once per worker
+_worker_client = None
+
+
+def _init_worker(client):
+    global _worker_client
+    _worker_client = client
+
+
+def _encode_in_worker(texts):
+    return _worker_client._encode_batch(texts)
+
+
+def _normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class LocalEmbeddings(EmbeddingClient):
+    """
+    Base class for in-process embedders; subclasses implement
+    ``_encode_batch(texts)`` returning a 2D float array.
+    """
+
+    def __init__(self, batch_size=64, max_batch_tokens=16384, max_length=512, workers=None,
+                 use_processes=False, chars_per_token=4, cache=None):
+        """
+        Args:
+            batch_size: Maximum number of texts per batch
+            max_batch_tokens: Budget for batch size times its longest text,
+                in estimated tokens (i.e. the padded batch size)
+            max_length: Tokens a text is truncated to by the model
+            workers: Threads encoding batches concurrently (default: CPU count)
+            use_processes: Encode in ``workers`` processes instead of threads
+            chars_per_token: Characters per token used to estimate lengths
+            cache: Optional ``EmbeddingCache`` consulted before encoding
+        """
+        self.batch_size = max(1, batch_size)
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.max_length = max_length
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.use_processes = use_processes
+        self.chars_per_token = chars_per_token
+        self.cache = cache
+        self._pool = None
+
+    def __getstate__(self):
+        # Process-pool workers get the model, not the pool or the cache
+        state = dict(self.__dict__)
+        state.update(_pool=None, cache=None)
+        return state
+
+    def close(self):
+        """Shut down the worker processes, if any were started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _batches(self, texts):
+        """Indices of ``texts`` grouped into length-sorted batches."""
+        lengths = [min(len(text) // self.chars_per_token + 2, self.max_length) for text in texts]
+        order = sorted(range(len(texts)), key=lengths.__getitem__)
+        batches = []
+        batch = []
+        for i in order:
+            # Sorted ascending, so the newest text is the batch's longest
+            if batch and (len(batch) >= self.batch_size
+                          or (len(batch) + 1) * lengths[i] > self.max_batch_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batched(self, texts, task_type=None):
+        batches = self._batches(texts)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+        for batch in batch_texts:
+            metrics.EMBEDDING_BATCH_SIZE.observe(len(batch))
+            metrics.EMBEDDING_TOKENS.inc(sum(len(text) for text in batch) // self.chars_per_token)
+
+        with metrics.STAGE_SECONDS.time(stage='embed'):
+            if len(batches) == 1 or self.workers == 1:
+                results = [self._encode_batch(batch) for batch in batch_texts]
+            elif self.use_processes:
+                if self._pool is None:
+                    # Kept for the client's lifetime so the model is sent once;
+                    # spawned, since forking a threaded server is unsafe
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_init_worker, initargs=(self,))
+                results = list(self._pool.map(_encode_in_worker, batch_texts))
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(batches))) as executor:
+                    results = list(executor.map(self._encode_batch, batch_texts))
+
+        embeddings = [None] * len(texts)
+        for batch, vectors in zip(batches, results):
+            for i, vector in zip(batch, np.asarray(vectors, dtype=np.float32)):
+                embeddings[i] = vector
+        return embeddings
+
+    def _encode_batch(self, texts):
+        raise NotImplementedError
+
+
+@register_backend("hashing")
+class HashingEmbeddings(LocalEmbeddings):
+    """
+    Feature-hashing embedder: sublinear term frequencies of words and word
+    bigrams, hashed into ``n_features`` buckets and projected to
+    ``dimensions`` by a sparse random projection seeded with
+    ``random_state``. Nothing is fitted, so every process (and every job)
+    maps the same text to the same vector, queries included.
+    """
+
+    def __init__(self, dimensions=384, n_features=2 ** 20, ngram_range=(1, 2), random_state=0,
+                 cache=None, **options):
+        from scipy import sparse
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.random_projection import SparseRandomProjection
+
+        # Hashing is cheaper than a cache lookup, so the cache is not used;
+        # the tokenizer holds the GIL, so batches run in processes
+        options.setdefault("use_processes", True)
+        super().__init__(**options)
+        self.dimensions = dimensions
+        self.model_name = f"hashing-{n_features}-{dimensions}-{ngram_range[0]}{ngram_range[1]}-{random_state}"
+        self.vectorizer = HashingVectorizer(n_features=n_features, ngram_range=ngram_range,
+                                            alternate_sign=False, norm=None, dtype=np.float32)
+        # The projection only depends on the shapes and the seed
+        projection = SparseRandomProjection(n_components=dimensions, dense_output=True,
+                                            random_state=random_state)
+        projection.fit(sparse.csr_matrix((1, n_features), dtype=np.float32))
+        self.projection = projection.components_.T.tocsr().astype(np.float32)
+
+    def _encode_batch(self, texts):
+        from sklearn.preprocessing import normalize
+
+        counts = self.vectorizer.transform(texts)
+        counts.data = np.log1p(counts.data)
+        return _normalized((normalize(counts) @ self.projection).toarray())
+
+
+@register_backend("sentence-transformers")
+class SentenceTransformerEmbeddings(LocalEmbeddings):
+    """Any sentence-transformers model, on CPU by default."""
+
+    def __init__(self, model=None, device="cpu", cache=None, **options):
+        from sentence_transformers import SentenceTransformer
+
+        # Torch already parallelizes each batch across cores
+        options.setdefault("workers", 1)
+        super().__init__(cache=cache, **options)
+        model = model or os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        self.model = SentenceTransformer(model, device=device)
+        self.model.max_seq_length = min(self.model.max_seq_length or self.max_length, self.max_length)
+        self.model_name = f"sentence-transformers/{model}"
+
+    def _encode_batch(self, texts):
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True,
+                                 normalize_embeddings=True, show_progress_bar=False)
+
+
+@register_backend("onnx")
+class OnnxEmbeddings(LocalEmbeddings):
+    """
+    A transformer encoder exported to ONNX (e.g. with ``optimum-cli export
+    onnx``), mean-pooled over its last hidden state. Each batch runs on a
+    single-threaded session call, and ``workers`` calls run at once.
+    """
+
+    def __init__(self, model_path=None, tokenizer_path=None, intra_op_threads=1, cache=None,
+                 **options):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        super().__init__(cache=cache, **options)
+        model_path = model_path or os.getenv("ONNX_MODEL_PATH")
+        if not model_path:
+            raise ValueError("ONNX_MODEL_PATH not found in environment variables.")
+        tokenizer_path = tokenizer_path or os.path.join(os.path.dirname(model_path), "tokenizer.json")
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(model_path, session_options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(self.max_length)
+        # Pads to the longest text of each batch
+        self.tokenizer.enable_padding()
+        stat = os.stat(model_path)
+        self.model_name = f"onnx/{os.path.basename(model_path)}-{stat.st_size}-{int(stat.st_mtime)}"
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1.0)
+        return _normalized(pooled)
@@ -0,0 +1,281 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are kept in a module-level registry and
+rendered by ``render()`` for the ``/metrics`` endpoint. Recording a value is
+a dictionary update under a lock, cheap enough for per-request use in the
+crawler and embedding client.
+"""
+import bisect
+import contextlib
+import io
+import math
+import os
+import sys
+import threading
+import time
+
+try:
+    import pyinstrument
+except ImportError:  # optional profiler; cProfile is always available
+    pyinstrument = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    def totals(self):
+        """``{label values: (sum, count)}`` for every observed label set."""
+        with self._lock:
+            return {key: (state[1], state[2]) for key, state in self._values.items()}
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, ('le', _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labels=()):
+    return REGISTRY.register(Counter(name, documentation, labels))
+
+
+def gauge(name, documentation, labels=()):
+    return REGISTRY.register(Gauge(name, documentation, labels))
+
+
+def histogram(name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return REGISTRY.render()
+
+
+# Pipeline metrics shared by the crawler, embedding client and visualizer
+STAGE_SECONDS = histogram('vectorize_stage_seconds',
+                          'Latency of pipeline stages (fetch, parse, embed, cluster, visualize)',
+                          labels=('stage',))
+FETCH_SECONDS = histogram('vectorize_fetch_seconds', 'HTTP fetch latency per host',
+                          labels=('host',))
+FETCH_BYTES = counter('vectorize_fetch_bytes_total', 'Response bytes downloaded per host',
+                      labels=('host',))
+FETCH_RESPONSES = counter('vectorize_fetch_responses_total', 'HTTP responses per host and status',
+                          labels=('host', 'status'))
+PAGES_CRAWLED = counter('vectorize_pages_crawled_total', 'Pages collected by the crawler')
+CRAWL_PAGES_PER_SECOND = gauge('vectorize_crawl_pages_per_second',
+                               'Throughput of the most recently finished crawl')
+CRAWL_RSS_BYTES = gauge('vectorize_crawl_rss_bytes',
+                        'Process resident memory last checked against a crawl memory ceiling')
+EMBEDDING_REQUESTS = counter('vectorize_embedding_requests_total',
+                             'Embedding API calls by outcome', labels=('outcome',))
+EMBEDDING_BATCH_SIZE = histogram('vectorize_embedding_batch_size', 'Texts per embedding API call',
+                                 buckets=SIZE_BUCKETS)
+EMBEDDING_TOKENS = counter('vectorize_embedding_tokens_total',
+                           'Estimated tokens sent for embedding (characters / 4)')
+EMBEDDING_CACHE_LOOKUPS = counter('vectorize_embedding_cache_lookups_total',
+                                  'Embedding cache lookups by result', labels=('result',))
+REDUCER_FIT_SECONDS = histogram('vectorize_reducer_fit_seconds',
+                                'Time to fit a dimensionality reducer', labels=('method',))
+
+
+def process_rss():
+    """Resident set size of this process in bytes (the peak where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+_cprofile_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def capture_profile(profiler, directory):
+    """
+    Profile the calling thread for the duration of the ``with`` block.
+
+    cProfile output is written as ``profile.txt`` (cumulative-time listing),
+    pyinstrument output as ``profile.html``. Work handed to other threads,
+    such as crawler fetch workers, shows up only as time spent waiting.
+
+    Args:
+        profiler: 'cprofile', 'pyinstrument' or None to disable
+        directory: Where the report is written
+
+    Yields:
+        Path of the report that will be written, or None
+    """
+    if not profiler:
+        yield None
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {profiler}")
+    if profiler == 'pyinstrument' and pyinstrument is None:
+        raise ValueError("pyinstrument is not installed")
+
+    os.makedirs(directory, exist_ok=True)
+    if profiler == 'pyinstrument':
+        path = os.path.join(directory, 'profile.html')
+        profile = pyinstrument.Profiler()
+        profile.start()
+        try:
+            yield path
+        finally:
+            profile.stop()
+            with open(path, 'w') as f:
+                f.write(profile.output_html())
+        return
+
+    import cProfile
+    import pstats
+
+    # Since Python 3.12 cProfile claims the process-wide sys.monitoring
+    # slot, so only one job can be profiled at a time; the others run unprofiled
+    if not _cprofile_lock.acquire(blocking=False):
+        print("Another job is being profiled; running this one without cProfile")
+        yield None
+        return
+    try:
+        path = os.path.join(directory, 'profile.txt')
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            print(f"cProfile unavailable, running without it: {e}")
+            yield None
+            return
+        try:
+            yield path
+        finally:
+            profile.disable()
+            report = io.StringIO()
+            pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(60)
+            with open(path, 'w') as f:
+                f.write(report.getvalue())
+    finally:
+        _cprofile_lock.release()
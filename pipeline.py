@@ -0,0 +1,114 @@
+import queue
+import threading
+
+from embedding_store import EmbeddingStore
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class StreamingPipeline:
+    """
+    Overlap crawling and embedding instead of running them back to back.
+
+    The crawler runs on a background thread and hands pages over through a
+    bounded queue; when the queue is full the crawler blocks, which keeps
+    memory bounded. The caller's thread embeds pages in micro-batches and
+    receives progress events as soon as each step finishes. Embedded pages
+    are collected in ``processed``, an ``EmbeddingStore``.
+    """
+
+    def __init__(self, crawler, processor, batch_size=16, max_queue=64, flush_interval=1.0,
+                 deduplicator=None):
+        """
+        Args:
+            crawler: WebCrawler (anything with ``iter_pages(max_pages)``)
+            processor: EmbeddingProcessor used to embed each micro-batch
+            batch_size: Pages embedded per call
+            max_queue: Crawled pages allowed to wait for embedding
+            flush_interval: Seconds to wait for a full batch before embedding
+                a partial one
+            deduplicator: Optional Deduplicator; duplicate pages are reported
+                but never embedded
+        """
+        self.crawler = crawler
+        self.processor = processor
+        self.batch_size = max(1, batch_size)
+        self.max_queue = max(1, max_queue)
+        self.flush_interval = flush_interval
+        self.deduplicator = deduplicator
+        # A memory-bounded crawler already keeps every page, on disk
+        self._spilled = getattr(crawler, 'spill', None) is not None
+        self.pages = crawler.pages_data if self._spilled else []
+        self.processed = EmbeddingStore()
+
+    def run(self, max_pages=None):
+        """
+        Run the pipeline.
+
+        Yields:
+            ``('page', page)`` for every crawled page,
+            ``('duplicate', page)`` for pages skipped as duplicates and
+            ``('embedded', batch)`` for every embedded micro-batch
+        """
+        pages = queue.Queue(maxsize=self.max_queue)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for page in self.crawler.iter_pages(max_pages):
+                    if not put(page):
+                        break
+            except Exception as e:
+                put(_Failure(e))
+            finally:
+                put(_DONE)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        batch = []
+        finished = False
+        try:
+            while not finished:
+                try:
+                    item = pages.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+
+                if item is _DONE:
+                    finished = True
+                elif isinstance(item, _Failure):
+                    raise item.error
+                elif item is not None:
+                    if not self._spilled:
+                        self.pages.append(item)
+                    yield 'page', item
+                    if self.deduplicator is not None and self.deduplicator.check(item) is not None:
+                        yield 'duplicate', item
+                    else:
+                        batch.append(item)
+
+                # Embed a full batch, or whatever is waiting when the crawl
+                # stalls or ends, so results never sit in the buffer
+                if batch and (finished or item is None or len(batch) >= self.batch_size):
+                    processed = self.processor.generate_embeddings(batch)
+                    batch = []
+                    self.processed.extend(processed)
+                    yield 'embedded', processed
+        finally:
+            stop.set()
+            producer.join()
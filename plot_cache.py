@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Files whose size and modification time identify a saved EmbeddingStore
+# (and its topic clusters and sites, which color the plots)
+VERSION_FILES = ('vectors.npy', 'metadata.json', 'clusters.json', 'sites.json')
+
+
+class CachedPayload:
+    """A compressed JSON payload and the ETag identifying its dataset version."""
+
+    def __init__(self, etag, gzip_body, brotli_body=None):
+        self.etag = etag
+        self.gzip = gzip_body
+        self.brotli = brotli_body
+
+    def body(self, accepted_encodings):
+        """
+        Pick the best encoding the client accepts.
+
+        Returns:
+            Tuple (body bytes, Content-Encoding or None)
+        """
+        if self.brotli is not None and 'br' in accepted_encodings:
+            return self.brotli, 'br'
+        if 'gzip' in accepted_encodings:
+            return self.gzip, 'gzip'
+        return gzip.decompress(self.gzip), None
+
+
+class PlotPayloadCache:
+    """
+    Cache of /visualize payloads, keyed by dataset version.
+
+    The version is derived from the saved store's files plus the visualizer
+    settings, so a payload is computed once per dataset and reused until the
+    data changes. Compressed bodies are written next to the store (so they
+    survive restarts) and the most recent ones are also kept in memory.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per dataset version being built
+        self._building = {}
+
+    @staticmethod
+    def dataset_version(directory, *params):
+        digest = hashlib.sha1()
+        for name in VERSION_FILES:
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        digest.update(json.dumps(params).encode())
+        return digest.hexdigest()[:16]
+
+    def get(self, directory, build, params=()):
+        """
+        Return the cached payload for the store in ``directory``.
+
+        Args:
+            directory: Saved EmbeddingStore directory
+            build: Callable returning the payload (JSON-serializable) on a miss
+            params: Settings that change the payload, included in the version
+
+        Returns:
+            CachedPayload
+        """
+        version = self.dataset_version(directory, *params)
+        with self._lock:
+            entry = self._entries.get(version)
+            if entry is not None:
+                self._entries.move_to_end(version)
+                return entry
+            build_lock = self._building.setdefault(version, threading.Lock())
+
+        # Only requests for the same version wait here, so a long UMAP fit
+        # does not hold up cache hits for other datasets
+        with build_lock:
+            with self._lock:
+                entry = self._entries.get(version)
+            if entry is None:
+                entry = self._load(directory, version)
+            if entry is None:
+                body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+                entry = CachedPayload(
+                    version,
+                    gzip.compress(body, compresslevel=6),
+                    brotli.compress(body, quality=5) if brotli is not None else None
+                )
+                self._save(directory, entry)
+
+            with self._lock:
+                self._entries[version] = entry
+                self._entries.move_to_end(version)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._building.pop(version, None)
+            return entry
+
+    @staticmethod
+    def _path(directory, version, suffix):
+        return os.path.join(directory, f"plots-{version}.json.{suffix}")
+
+    def _load(self, directory, version):
+        gzip_path = self._path(directory, version, 'gz')
+        if not os.path.exists(gzip_path):
+            return None
+        with open(gzip_path, 'rb') as f:
+            gzip_body = f.read()
+        brotli_body = None
+        brotli_path = self._path(directory, version, 'br')
+        if os.path.exists(brotli_path):
+            with open(brotli_path, 'rb') as f:
+                brotli_body = f.read()
+        return CachedPayload(version, gzip_body, brotli_body)
+
+    def _save(self, directory, entry):
+        for suffix, body in (('br', entry.brotli), ('gz', entry.gzip)):
+            if body is None:
+                continue
+            # Write then rename so a reader never sees a partial file
+            path = self._path(directory, entry.etag, suffix)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(body)
+            os.replace(path + '.tmp', path)
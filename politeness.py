@@ -0,0 +1,73 @@
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket: ``rate`` tokens per second, holding at most
+    ``capacity`` tokens.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def try_acquire(self):
+        """
+        Take a token if one is available.
+
+        Returns:
+            0.0 when a token was taken, otherwise the seconds until one will be
+        """
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class PolitenessScheduler:
+    """
+    Per-host request pacing for the crawler.
+
+    Each host gets a token bucket. A host's robots.txt Crawl-delay wins over
+    ``requests_per_second`` (and allows no bursts); hosts with neither are
+    not paced at all, so the crawler runs as fast as its concurrency caps
+    allow wherever the site does not ask otherwise.
+    """
+
+    def __init__(self, requests_per_second=None, burst=1, clock=time.monotonic):
+        self.requests_per_second = requests_per_second
+        self.burst = max(1, burst)
+        self.clock = clock
+        self._buckets = {}
+
+    def configure(self, host, crawl_delay=None):
+        """Create the bucket for ``host``; call once its robots.txt is known."""
+        if host in self._buckets:
+            return
+        if crawl_delay:
+            self._buckets[host] = TokenBucket(1.0 / crawl_delay, 1, self.clock)
+        elif self.requests_per_second:
+            self._buckets[host] = TokenBucket(self.requests_per_second, self.burst, self.clock)
+        else:
+            self._buckets[host] = None
+
+    def is_configured(self, host):
+        return host in self._buckets
+
+    def reserve(self, host):
+        """
+        Claim a request slot for ``host``.
+
+        Returns:
+            0.0 if the request may go now, otherwise seconds to wait
+        """
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            return 0.0
+        return bucket.try_acquire()
@@ -1,12 +1,42 @@
 # Project Structure
 # ├── app.py             # Main Flask application
 # ├── crawler.py         # Web crawler functionality
-# ├── embeddings.py      # Google Cloud embedding integration
+# ├── crawl_state.py     # Per-URL state for incremental re-crawls
+# ├── crawl_spill.py     # On-disk frontier, compressed page segments for bounded crawls
+# ├── discovery.py       # robots.txt rules and sitemap seeding
+# ├── politeness.py      # Per-host token-bucket request pacing
+# ├── extractors.py      # Single-pass HTML extraction backends
+# ├── embeddings.py      # Embedding backend registry and Google Cloud integration
+# ├── local_embeddings.py # Local CPU embedding backends (hashing, ONNX, sentence-transformers)
+# ├── embedding_cache.py # Persistent content-addressed embedding cache
+# ├── chunking.py        # Overlapping text chunks and page-vector pooling
+# ├── embedding_store.py # Columnar float32 storage for embedded pages
+# ├── vector_index.py    # Cosine similarity index (exact / IVF)
+# ├── clustering.py      # Topic clusters, representatives and keywords
 # ├── visualizer.py      # Visualization utilities
+# ├── plot_cache.py      # Compressed, versioned /visualize payload cache
+# ├── export.py          # Streaming JSONL/NPY/Parquet export with quantization
+# ├── reduction.py       # Fit-once PCA/UMAP reduction engine
+# ├── pipeline.py        # Streaming crawl -> embed pipeline
+# ├── dedup.py           # URL canonicalization and near-duplicate detection
+# ├── link_graph.py      # Sparse link graph: PageRank, depth, orphans, unlinked similar pages
+# ├── comparison.py      # Multi-site crawl, centroid distances and coverage gaps
+# ├── jobs.py            # Background job queue and result stores
+# ├── metrics.py         # Prometheus metrics and per-job profiling
+# ├── benchmarks/        # Performance benchmarks against local fixtures
+# │   ├── fixture_site.py  # Synthetic website (with robots.txt/sitemaps) over local HTTP
+# │   ├── stub_embeddings.py # Deterministic local embedding backend
+# │   ├── bench_crawler.py # Crawler pages/sec vs. worker count, sitemap discovery
+# │   ├── bench_embeddings.py # Embedding texts/sec vs. batch size or local workers
+# │   ├── bench_extractors.py # HTML extraction backend comparison
+# │   ├── bench_pipeline.py # End-to-end crawl/embed/visualize timings as JSON
+# │   ├── bench_reduction.py # Planned UMAP/PCA projection time vs. dataset size
+# │   └── bench_import.py  # Cold-start import time budget for app.py
 # ├── templates/         # HTML templates
 # │   ├── index.html     # Main page
 # │   └── results.html   # Visualization page
 # ├── static/            # Static assets
 # │   ├── css/
 # │   └── js/
-# └── requirements.txt   # Dependencies 
\ No newline at end of file
+# ├── requirements.txt   # Dependencies
+# └── requirements-parquet.txt # Optional pyarrow for Parquet export 
\ No newline at end of file
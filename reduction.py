@@ -0,0 +1,524 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import metrics
+
+# Persist numba's compiled UMAP/pynndescent kernels between processes so only
+# the first run on a machine pays for JIT compilation. Must be set before
+# umap (and therefore numba) is imported.
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(".cache", "numba"))
+
+# Above this many samples PCA is fit chunk by chunk instead of in one pass
+INCREMENTAL_PCA_THRESHOLD = 20000
+
+# Below this many samples the UMAP views are PCA
+MIN_UMAP_SAMPLES = 15
+# UMAP computes exact neighbors itself below this size (its own threshold),
+# without compiling or running pynndescent
+EXACT_NEIGHBORS_THRESHOLD = 4096
+# Wider inputs are reduced with PCA before the UMAP neighbor search
+PCA_PREREDUCTION_DIMENSIONS = 50
+# Above this many samples UMAP runs its neighbor search in low-memory mode
+LOW_MEMORY_THRESHOLD = 100000
+# Fewest layout epochs used to fit a time budget
+MIN_UMAP_EPOCHS = 30
+# Rough single-core costs of UMAP on 50-dimensional input, used to fit the
+# work into a time budget: seconds per neighbor-search row and per edge per
+# layout epoch
+NEIGHBOR_SECONDS_PER_SAMPLE = 1e-4
+LAYOUT_SECONDS_PER_EDGE_EPOCH = 2.5e-7
+# Seconds the UMAP views of one dataset may take
+DEFAULT_TIME_BUDGET = float(os.getenv("REDUCTION_TIME_BUDGET", 120))
+DEFAULT_CACHE_DIR = os.getenv("REDUCTION_CACHE_DIR", os.path.join(".cache", "reductions"))
+
+
+def plan_reduction(n_samples, n_features, max_dimensions=3, time_budget=None, views=2):
+    """
+    Choose UMAP/PCA settings for a dataset from its size and dimensionality.
+
+    - Fewer than ``MIN_UMAP_SAMPLES`` points: PCA only.
+    - The neighborhood grows with the dataset, from 5 up to UMAP's usual 15
+      (10 above ``LOW_MEMORY_THRESHOLD``, where the neighbor search also
+      switches to low-memory mode).
+    - Inputs wider than ``PCA_PREREDUCTION_DIMENSIONS`` are PCA-reduced to
+      that many dimensions first, which speeds up the neighbor search.
+    - Large inputs get as many layout epochs (up to UMAP's 200) as
+      ``time_budget`` allows for ``views`` layouts; if even
+      ``MIN_UMAP_EPOCHS`` do not fit, UMAP is fit on a sample and the
+      remaining points are placed with ``transform``.
+
+    Returns:
+        Dictionary of ``ReductionEngine`` keyword arguments
+    """
+    time_budget = DEFAULT_TIME_BUDGET if time_budget is None else time_budget
+    plan = {
+        'max_dimensions': max_dimensions,
+        'use_umap': n_samples >= MIN_UMAP_SAMPLES,
+        'n_neighbors': int(np.clip(round(np.sqrt(n_samples)), 5, 15)),
+        'pca_dimensions': None,
+        'low_memory': n_samples >= LOW_MEMORY_THRESHOLD,
+        'n_epochs': None,
+        'fit_samples': None
+    }
+    if n_samples >= LOW_MEMORY_THRESHOLD:
+        plan['n_neighbors'] = 10
+    if n_features > PCA_PREREDUCTION_DIMENSIONS and n_samples > PCA_PREREDUCTION_DIMENSIONS:
+        plan['pca_dimensions'] = PCA_PREREDUCTION_DIMENSIONS
+    if not plan['use_umap'] or n_samples < EXACT_NEIGHBORS_THRESHOLD:
+        # Small enough that UMAP's defaults finish in seconds
+        return plan
+
+    edge_epoch = views * plan['n_neighbors'] * LAYOUT_SECONDS_PER_EDGE_EPOCH
+    available = time_budget - n_samples * NEIGHBOR_SECONDS_PER_SAMPLE
+    epochs = int(available / (n_samples * edge_epoch)) if available > 0 else 0
+    plan['n_epochs'] = int(np.clip(epochs, MIN_UMAP_EPOCHS, 200))
+    if epochs < MIN_UMAP_EPOCHS:
+        # Placing a point with transform costs about a third of fitting it
+        rate = edge_epoch * MIN_UMAP_EPOCHS + NEIGHBOR_SECONDS_PER_SAMPLE
+        sample = int((time_budget - n_samples * rate / 3) / (rate * 2 / 3))
+        plan['fit_samples'] = int(np.clip(sample, EXACT_NEIGHBORS_THRESHOLD, n_samples))
+    return plan
+
+
+class ReductionEngine:
+    """
+    Fit dimensionality reducers once per dataset and reuse them.
+
+    The embeddings are packed into one contiguous float32 matrix. PCA is fit
+    once at the largest requested dimensionality; lower-dimensional views
+    are the leading components of that projection. UMAP computes its
+    nearest-neighbor graph once and shares it between every target
+    dimensionality. Fitted reducers are kept so new points can be projected
+    with ``transform`` instead of refitting.
+
+    Large inputs can be memory-mapped float32 arrays: PCA then switches to
+    IncrementalPCA over ``chunk_size`` rows at a time, and UMAP uses the
+    approximate (NN-descent) neighbor search in low-memory mode. Use
+    ``planned`` to pick the settings from the dataset's shape.
+    """
+
+    def __init__(self, embeddings, max_dimensions=3, n_neighbors=15, metric='euclidean',
+                 random_state=None, incremental=None, chunk_size=4096, low_memory=True,
+                 use_umap=True, pca_dimensions=None, n_epochs=None, fit_samples=None, cache=None):
+        """
+        Args:
+            embeddings: Sequence of vectors or a 2D array (n_samples, n_features),
+                including a ``np.memmap``
+            max_dimensions: Largest projection that will be requested
+            n_neighbors: UMAP neighborhood size
+            metric: Distance metric for the UMAP neighbor graph
+            random_state: Seed for reproducible UMAP layouts
+            incremental: Fit PCA in chunks; None decides from the sample count
+            chunk_size: Rows per chunk for incremental PCA
+            low_memory: Use UMAP's low-memory nearest-neighbor descent
+            use_umap: False makes every UMAP view a PCA view
+            pca_dimensions: PCA-reduce the input to this many dimensions
+                before UMAP (None runs UMAP on the raw vectors)
+            n_epochs: UMAP layout epochs (None for UMAP's default)
+            fit_samples: Fit UMAP on this many randomly chosen rows and place
+                the others with ``transform``
+            cache: Optional ``ProjectionCache``; UMAP projections are looked
+                up there by dataset hash before fitting. ``transform`` fits
+                its own reducer when the projection came from the cache
+        """
+        # float32 arrays (and memmaps) are used as-is without copying
+        self.matrix = np.asarray(embeddings, dtype=np.float32)
+        if not self.matrix.flags['C_CONTIGUOUS']:
+            self.matrix = np.ascontiguousarray(self.matrix)
+        if self.matrix.ndim != 2:
+            raise ValueError("Embeddings must form a 2D matrix")
+        self.max_dimensions = max_dimensions
+        self.n_neighbors = n_neighbors
+        self.metric = metric
+        self.random_state = random_state
+        if incremental is None:
+            incremental = self.matrix.shape[0] >= INCREMENTAL_PCA_THRESHOLD
+        self.incremental = incremental
+        self.chunk_size = max(chunk_size, max_dimensions, pca_dimensions or 0)
+        self.low_memory = low_memory
+        self.use_umap = use_umap
+        self.pca_dimensions = pca_dimensions
+        self.n_epochs = n_epochs
+        self.fit_samples = fit_samples if fit_samples and fit_samples < self.n_samples else None
+        self.cache = cache
+        self._pca = None
+        self._pca_reduced = None
+        self._pca_projection = None
+        self._fit_rows = None
+        self._knn = None
+        self._umap = {}
+        self._umap_projection = {}
+        self._fingerprint = None
+
+    @classmethod
+    def from_npy(cls, path, **kwargs):
+        """Build an engine over a ``.npy`` file without loading it into memory."""
+        return cls(np.load(path, mmap_mode='r'), **kwargs)
+
+    @classmethod
+    def planned(cls, embeddings, time_budget=None, cache=None, **kwargs):
+        """
+        Build an engine with the settings ``plan_reduction`` picks for the
+        dataset's shape; ``kwargs`` override them.
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError("Embeddings must form a 2D matrix")
+        plan = plan_reduction(*matrix.shape, max_dimensions=kwargs.get('max_dimensions', 3),
+                              time_budget=time_budget)
+        plan.update(kwargs)
+        return cls(matrix, cache=cache, **plan)
+
+    @property
+    def n_samples(self):
+        return self.matrix.shape[0]
+
+    def project(self, method='pca', dimensions=3):
+        """
+        Returns:
+            Array of shape (n_samples, dimensions) with the projected points
+        """
+        if dimensions > self.max_dimensions:
+            raise ValueError(f"dimensions must be at most {self.max_dimensions}")
+        if method == 'umap' and self._umap_supported(dimensions):
+            return self._project_umap(dimensions)
+        # PCA, and the fallback for datasets too small for UMAP
+        return self._project_pca()[:, :dimensions]
+
+    def transform(self, embeddings, method='pca', dimensions=3):
+        """Project new points with the already fitted reducer."""
+        points = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if method == 'umap' and self._umap_supported(dimensions):
+            if dimensions not in self._umap:
+                self._fit_umap(dimensions)
+            if self.pca_dimensions:
+                self._project_pca()
+                points = np.ascontiguousarray(self._pca.transform(points), dtype=np.float32)
+            return self._umap[dimensions].transform(points)
+        self._project_pca()
+        return self._pad(self._pca.transform(points))[:, :dimensions]
+
+    def _project_pca(self):
+        if self._pca_projection is None:
+            from sklearn.decomposition import PCA, IncrementalPCA
+
+            # With pre-reduction one fit serves both: the leading components
+            # are the PCA view, all of them are UMAP's input
+            n_components = min(max(self.max_dimensions, self.pca_dimensions or 0), *self.matrix.shape)
+            with metrics.REDUCER_FIT_SECONDS.time(method='pca'):
+                if self.incremental:
+                    self._pca = IncrementalPCA(n_components=n_components)
+                    for chunk in self._chunks():
+                        # partial_fit needs at least n_components rows per chunk
+                        if chunk.shape[0] >= n_components:
+                            self._pca.partial_fit(chunk)
+                    projection = np.vstack([self._pca.transform(chunk) for chunk in self._chunks()])
+                else:
+                    self._pca = PCA(n_components=n_components)
+                    projection = self._pca.fit_transform(self.matrix)
+            projection = np.ascontiguousarray(projection, dtype=np.float32)
+            if self.pca_dimensions:
+                self._pca_reduced = projection
+            self._pca_projection = self._pad(projection[:, :self.max_dimensions])
+        return self._pca_projection
+
+    def _chunks(self):
+        for start in range(0, self.n_samples, self.chunk_size):
+            yield np.asarray(self.matrix[start:start + self.chunk_size])
+
+    def _pad(self, projection):
+        """Zero-fill missing axes when there are fewer samples than dimensions."""
+        missing = self.max_dimensions - projection.shape[1]
+        if missing > 0:
+            projection = np.hstack([projection, np.zeros((projection.shape[0], missing),
+                                                         dtype=projection.dtype)])
+        return projection
+
+    def _umap_supported(self, dimensions):
+        # UMAP's spectral initialisation needs more points than target dimensions
+        return self.use_umap and self.n_samples > dimensions + 1
+
+    def _umap_input(self):
+        if self.pca_dimensions:
+            self._project_pca()
+            return self._pca_reduced
+        # UMAP's numba kernels reject read-only buffers such as memory maps
+        if not self.matrix.flags['WRITEABLE']:
+            self.matrix = np.array(self.matrix)
+        return self.matrix
+
+    def _umap_rows(self):
+        """Rows UMAP is fit on: all of them, or a fixed random sample."""
+        if self._fit_rows is None:
+            if self.fit_samples:
+                rng = np.random.default_rng(self.random_state)
+                self._fit_rows = np.sort(rng.choice(self.n_samples, self.fit_samples, replace=False))
+            else:
+                self._fit_rows = slice(None)
+        return self._fit_rows
+
+    def _fit_size(self):
+        return self.fit_samples or self.n_samples
+
+    def _neighbor_graph(self):
+        """Neighbor graph shared by every UMAP dimensionality, or None when UMAP finds exact neighbors itself."""
+        if self._fit_size() < EXACT_NEIGHBORS_THRESHOLD:
+            return None
+        if self._knn is None:
+            from umap.umap_ import nearest_neighbors
+            with metrics.REDUCER_FIT_SECONDS.time(method='knn'):
+                self._knn = nearest_neighbors(
+                    self._umap_input()[self._umap_rows()],
+                    n_neighbors=self._effective_neighbors(),
+                    metric=self.metric,
+                    metric_kwds={},
+                    angular=False,
+                    random_state=self.random_state,
+                    low_memory=self.low_memory
+                )
+        return self._knn
+
+    def _effective_neighbors(self):
+        return max(2, min(self.n_neighbors, self._fit_size() - 1))
+
+    def settings(self):
+        """Everything besides the data that changes a UMAP layout."""
+        return {'n_neighbors': self._effective_neighbors(), 'metric': self.metric,
+                'random_state': self.random_state, 'pca_dimensions': self.pca_dimensions,
+                'n_epochs': self.n_epochs, 'fit_samples': self.fit_samples}
+
+    def fingerprint(self):
+        """Hash of the input matrix, computed once."""
+        if self._fingerprint is None:
+            self._fingerprint = ProjectionCache.fingerprint(self.matrix, self.chunk_size)
+        return self._fingerprint
+
+    def _project_umap(self, dimensions):
+        if dimensions not in self._umap_projection:
+            key = None
+            if self.cache is not None:
+                key = self.cache.key(self.fingerprint(), 'umap', dimensions, self.settings())
+                cached = self.cache.get(key)
+                if cached is not None and cached.shape == (self.n_samples, dimensions):
+                    self._umap_projection[dimensions] = cached
+                    return cached
+            projection = self._fit_umap(dimensions)
+            if self.fit_samples:
+                # Points outside the sample are placed into its layout
+                rest = np.ones(self.n_samples, dtype=bool)
+                rest[self._umap_rows()] = False
+                full = np.empty((self.n_samples, dimensions), dtype=np.float32)
+                full[self._umap_rows()] = projection
+                with metrics.REDUCER_FIT_SECONDS.time(method='umap_transform'):
+                    full[rest] = self._umap[dimensions].transform(self._umap_input()[rest])
+                projection = full
+            self._umap_projection[dimensions] = projection
+            if key is not None:
+                self.cache.put(key, projection)
+        return self._umap_projection[dimensions]
+
+    def _fit_umap(self, dimensions):
+        import umap
+        reducer = umap.UMAP(
+            n_components=dimensions,
+            n_neighbors=self._effective_neighbors(),
+            metric=self.metric,
+            random_state=self.random_state,
+            low_memory=self.low_memory,
+            n_epochs=self.n_epochs,
+            precomputed_knn=self._neighbor_graph() or (None, None, None)
+        )
+        with metrics.REDUCER_FIT_SECONDS.time(method='umap'):
+            projection = reducer.fit_transform(self._umap_input()[self._umap_rows()])
+        self._umap[dimensions] = reducer
+        return np.asarray(projection, dtype=np.float32)
+
+
+class ReferenceReduction:
+    """
+    Fit the reducers on a subset of rows (e.g. one reference site) and
+    project every other row with ``transform``, so the other rows are
+    placed in the reference's space without changing its layout.
+
+    Has the same ``n_samples``/``project``/``transform`` interface as
+    ``ReductionEngine``.
+    """
+
+    def __init__(self, embeddings, reference_rows, **kwargs):
+        """
+        Args:
+            embeddings: 2D array (n_samples, n_features)
+            reference_rows: Indices of the rows the reducers are fit on
+            kwargs: Passed to ``ReductionEngine.planned`` for the reference rows
+        """
+        self.matrix = np.asarray(embeddings, dtype=np.float32)
+        self.reference_rows = np.asarray(reference_rows, dtype=np.int64)
+        self.other_rows = np.setdiff1d(np.arange(self.matrix.shape[0]), self.reference_rows)
+        self.engine = ReductionEngine.planned(self.matrix[self.reference_rows], **kwargs)
+        self._projections = {}
+
+    @property
+    def n_samples(self):
+        return self.matrix.shape[0]
+
+    def project(self, method='pca', dimensions=3):
+        key = (method, dimensions)
+        if key not in self._projections:
+            projection = np.empty((self.n_samples, dimensions), dtype=np.float32)
+            projection[self.reference_rows] = self.engine.project(method, dimensions)
+            if len(self.other_rows):
+                projection[self.other_rows] = self.engine.transform(self.matrix[self.other_rows],
+                                                                    method, dimensions)
+            self._projections[key] = projection
+        return self._projections[key]
+
+    def transform(self, embeddings, method='pca', dimensions=3):
+        return self.engine.transform(embeddings, method, dimensions)
+
+
+class ProjectionCache:
+    """
+    Projections saved as ``.npy`` files, keyed by a hash of the input matrix
+    and the reducer settings, so the same vectors are only laid out once
+    (across jobs and restarts). The oldest files beyond ``max_entries`` are
+    removed.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=64):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    @staticmethod
+    def fingerprint(matrix, chunk_size=4096):
+        """Hash of a 2D float32 matrix, read ``chunk_size`` rows at a time."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{matrix.shape}:{matrix.dtype}".encode())
+        for start in range(0, matrix.shape[0], chunk_size):
+            digest.update(np.ascontiguousarray(matrix[start:start + chunk_size]).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(fingerprint, method, dimensions, settings):
+        options = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+        return f"{fingerprint}-{method}{dimensions}-{options}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key):
+        try:
+            return np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, projection):
+        # The cache is an optimization: an unwritable directory (e.g. a
+        # read-only serverless filesystem) just means the next call misses
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            # Write then rename so a reader never sees a partial file
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, np.asarray(projection, dtype=np.float32))
+            os.replace(path + '.tmp', path)
+            entries = sorted((os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                              if name.endswith('.npy')), key=os.path.getmtime)
+            for stale in entries[:-self.max_entries]:
+                os.remove(stale)
+        except OSError as e:
+            print(f"Could not write projection cache in {self.directory}: {e}")
+
+
+_warm_lock = threading.Lock()
+_warmed = False
+
+
+def warm_up(background=False):
+    """
+    Compile UMAP's numba kernels (neighbor descent, fuzzy graph, layout and
+    transform) on a tiny dataset, once per process, so the first real
+    projection does not pay for it. The compiled code is also cached in
+    ``NUMBA_CACHE_DIR`` for later processes.
+
+    Args:
+        background: Run on a daemon thread, e.g. while a crawl is running
+
+    Returns:
+        The thread when ``background`` is set
+    """
+    if background:
+        thread = threading.Thread(target=warm_up, name='umap-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    global _warmed
+    with _warm_lock:
+        if _warmed:
+            return None
+        import umap
+        from umap.umap_ import nearest_neighbors
+
+        data = np.random.default_rng(0).normal(size=(64, 8)).astype(np.float32)
+        knn = nearest_neighbors(data, n_neighbors=5, metric='euclidean', metric_kwds={},
+                                angular=False, random_state=None, low_memory=True)
+        # The approximate path large datasets take, then the exact small-data one
+        umap.UMAP(n_neighbors=5, n_epochs=5, precomputed_knn=knn,
+                  force_approximation_algorithm=True).fit(data).transform(data[:4])
+        umap.UMAP(n_neighbors=5, n_epochs=5).fit(data).transform(data[:4])
+        _warmed = True
+    return None
+
+
+def density_downsample(points, max_points, grid_size=64, random_state=0):
+    """
+    Pick at most ``max_points`` rows of ``points`` while keeping sparse regions.
+
+    Points are bucketed into a grid over their first two or three
+    coordinates. Every occupied cell gets an equal share of the budget (cells
+    with fewer points give their unused share to the others), so dense
+    clusters are thinned while isolated points and outliers survive.
+
+    Returns:
+        Sorted array of selected row indices
+    """
+    n = points.shape[0]
+    if n <= max_points:
+        return np.arange(n)
+
+    coords = np.asarray(points[:, :3], dtype=np.float64)
+    lo = coords.min(axis=0)
+    span = np.maximum(coords.max(axis=0) - lo, 1e-12)
+    cells = np.minimum(((coords - lo) / span * grid_size).astype(np.int64), grid_size - 1)
+    cell_ids = np.ravel_multi_index(cells.T, (grid_size,) * cells.shape[1])
+
+    order = np.argsort(cell_ids, kind='stable')
+    unique_cells, starts, counts = np.unique(cell_ids[order], return_index=True, return_counts=True)
+
+    # Water-filling: find the per-cell cap that spends the budget exactly
+    sorted_counts = np.sort(counts)
+    remaining = max_points
+    cap = sorted_counts[-1]
+    for i, count in enumerate(sorted_counts):
+        cells_left = len(sorted_counts) - i
+        if count * cells_left >= remaining:
+            cap = remaining // cells_left
+            break
+        remaining -= count
+    quotas = np.minimum(counts, max(cap, 1))
+    # Hand out what rounding left over, one extra point per unfilled cell
+    leftover = max_points - int(quotas.sum())
+    if leftover > 0:
+        unfilled = np.flatnonzero(quotas < counts)[:leftover]
+        quotas[unfilled] += 1
+
+    rng = np.random.default_rng(random_state)
+    selected = []
+    for start, count, quota in zip(starts, counts, quotas):
+        members = order[start:start + count]
+        if quota < count:
+            members = rng.choice(members, size=quota, replace=False)
+        selected.append(members)
+    return np.sort(np.concatenate(selected))[:max_points]
@@ -1,7 +1,15 @@
 import streamlit as st
 from crawler import WebCrawler
-from embeddings import GoogleCloudEmbeddings, EmbeddingProcessor
+from crawl_state import CrawlStateStore
+from embeddings import DEFAULT_BACKEND, EmbeddingProcessor, create_embedding_client, embedding_backends
+from embedding_cache import EmbeddingCache
+from pipeline import StreamingPipeline
+from dedup import Deduplicator
+from vector_index import VectorIndex
 from visualizer import EmbeddingVisualizer
+from clustering import TopicClusterer
+from comparison import SiteComparison, crawl_sites, embed_sites, site_name
+from reduction import warm_up
 import os
 from dotenv import load_dotenv
 import time
@@ -23,6 +31,24 @@ if 'processed_data' not in st.session_state:
 if 'visualizations' not in st.session_state:
     st.session_state.visualizations = {}
 
+if 'search_index' not in st.session_state:
+    st.session_state.search_index = None
+
+if 'clusters' not in st.session_state:
+    st.session_state.clusters = None
+
+if 'passage_index' not in st.session_state:
+    st.session_state.passage_index = None
+
+if 'link_graph' not in st.session_state:
+    st.session_state.link_graph = None
+
+if 'comparison' not in st.session_state:
+    st.session_state.comparison = None
+
+if 'embedding_backend' not in st.session_state:
+    st.session_state.embedding_backend = DEFAULT_BACKEND
+
 # App title and description
 st.title("Vectorize")
 st.subheader("Web content analysis and visualization using embeddings")
@@ -30,40 +56,134 @@ st.subheader("Web content analysis and visualization using embeddings")
 # Sidebar for inputs
 with st.sidebar:
     st.header("Input")
-    url = st.text_input("Enter a URL to analyze:")
+    analysis_mode = st.radio("Mode:", ["Single site", "Compare sites"], horizontal=True)
+    if analysis_mode == "Single site":
+        url = st.text_input("Enter a URL to analyze:")
+        site_urls = []
+    else:
+        url = None
+        site_urls = [line.strip() for line in
+                     st.text_area("Site URLs (one per line, yours first):").splitlines() if line.strip()]
+        projection_mode = st.selectbox(
+            "Projection:", ["joint", "reference"],
+            format_func=lambda mode: ("Fit on all sites together" if mode == "joint"
+                                      else "Fit on my site, place competitors in its space")
+        )
     max_pages = st.slider("Maximum pages to crawl:", 1, 5, 3)
-    process_button = st.button("Process URL")
+    incremental = st.checkbox("Incremental re-crawl (skip unchanged pages)")
+    backends = embedding_backends()
+    backend = st.selectbox("Embedding backend:", backends,
+                           index=backends.index(DEFAULT_BACKEND) if DEFAULT_BACKEND in backends else 0,
+                           help="Local backends run on this machine without an API key")
+    process_button = st.button("Process URL" if analysis_mode == "Single site" else "Compare sites")
+
+if process_button and (url or site_urls):
+    # Compile UMAP while crawling, so the plots do not wait for it
+    warm_up(background=True)
+    st.session_state.processed_data = None
+    st.session_state.visualizations = {}
+    st.session_state.search_index = None
+    st.session_state.passage_index = None
+    st.session_state.clusters = None
+    st.session_state.link_graph = None
+    st.session_state.comparison = None
+
+# Multi-site mode: crawl every site at once into one store
+if process_button and site_urls:
+    if len(site_urls) < 2:
+        st.error("Enter at least two site URLs to compare.")
+        st.stop()
+    crawlers = [WebCrawler(base_url=site_url, max_pages=max_pages,
+                           state_store=CrawlStateStore() if incremental else None)
+                for site_url in site_urls]
+    with st.spinner(f"Crawling {len(site_urls)} sites (max {max_pages} pages each)..."):
+        site_pages = crawl_sites(crawlers)
+    site_pages = [Deduplicator().dedupe(pages) for pages in site_pages]
+
+    # Cached embeddings are reused, so adding a competitor only embeds its pages
+    embedding_client = create_embedding_client(backend, cache=EmbeddingCache())
+    st.session_state.embedding_backend = backend
+    embedding_processor = EmbeddingProcessor(embedding_client=embedding_client)
+    try:
+        with st.spinner("Generating embeddings..."):
+            store, site_labels = embed_sites(embedding_processor, site_pages)
+    finally:
+        embedding_client.close()
+
+    if len(store) and projection_mode == 'reference' and not (site_labels == 0).any():
+        st.warning(f"No pages were crawled from {site_name(site_urls[0])}; "
+                   "showing a joint projection instead.")
+        projection_mode = 'joint'
+
+    if len(store):
+        sites = {'sites': [site_name(site_url) for site_url in site_urls], 'labels': site_labels,
+                 'reference': 0, 'mode': projection_mode}
+        st.session_state.processed_data = store
+        st.session_state.search_index = VectorIndex.from_store(store)
+        if len(embedding_processor.passages):
+            st.session_state.passages = embedding_processor.passages
+            st.session_state.passage_index = VectorIndex.from_store(embedding_processor.passages)
+        with st.spinner("Finding topics..."):
+            st.session_state.clusters = TopicClusterer().fit(store)
+        st.session_state.comparison = SiteComparison(store, site_labels, sites['sites']).report(
+            clusters=st.session_state.clusters)
+        with st.spinner("Generating visualizations..."):
+            # Points are colored by site; in reference mode the reducers are
+            # fit on the first site and the others are projected into it
+            visualizer = EmbeddingVisualizer(clusters=st.session_state.clusters, sites=sites)
+            st.session_state.visualizations = visualizer.generate_visualizations(store)
+    else:
+        st.error("No pages could be crawled from these sites.")
 
 # Main content area
 if process_button and url:
-    st.session_state.processed_data = None
-    st.session_state.visualizations = {}
-    
-    with st.spinner(f"Crawling website (max {max_pages} pages)..."):
-        crawler = WebCrawler(base_url=url)
-        content = crawler.crawl(max_pages=max_pages)
-    
-    with st.spinner("Generating embeddings..."):
-        embedding_client = GoogleCloudEmbeddings()
-        embedding_processor = EmbeddingProcessor(embedding_client=embedding_client)
-        
-        embeddings_data = embedding_processor.generate_embeddings(content)
-        
-        st.session_state.processed_data = embeddings_data
+    crawler = WebCrawler(base_url=url, state_store=CrawlStateStore() if incremental else None)
+    embedding_client = create_embedding_client(backend, cache=EmbeddingCache())
+    # Queries have to be embedded by the same backend as the pages
+    st.session_state.embedding_backend = backend
+    embedding_processor = EmbeddingProcessor(embedding_client=embedding_client)
+    deduplicator = Deduplicator()
+    pipeline = StreamingPipeline(crawler, embedding_processor, deduplicator=deduplicator)
+
+    # Crawling and embedding overlap; show progress as each page and batch lands
+    progress = st.progress(0.0, text=f"Crawling website (max {max_pages} pages)...")
+    try:
+        for event, payload in pipeline.run(max_pages=max_pages):
+            progress.progress(
+                min(len(pipeline.processed) / max_pages, 1.0),
+                text=f"Crawled {len(pipeline.pages)} pages, embedded {len(pipeline.processed)}"
+            )
+    finally:
+        embedding_client.close()
+    progress.empty()
+
+    content = pipeline.pages
+    embeddings_data = pipeline.processed
+    st.session_state.link_graph = crawler.build_link_graph()
+    st.session_state.processed_data = embeddings_data
+    st.session_state.search_index = VectorIndex.from_store(embeddings_data)
+    if len(embedding_processor.passages):
+        st.session_state.passages = embedding_processor.passages
+        st.session_state.passage_index = VectorIndex.from_store(embedding_processor.passages)
     
     if st.session_state.processed_data:
+        with st.spinner("Finding topics..."):
+            # Clusters come from the full embeddings, not the 2D/3D projections
+            st.session_state.clusters = TopicClusterer().fit(st.session_state.processed_data)
+
         with st.spinner("Generating visualizations..."):
-            visualizer = EmbeddingVisualizer()
+            visualizer = EmbeddingVisualizer(clusters=st.session_state.clusters)
 
-            # Generate PCA and UMAP visualizations
-            st.session_state.visualizations['pca_3d'] = visualizer.visualize_embeddings(st.session_state.processed_data, method='pca', dimensions=3)
-            st.session_state.visualizations['pca_2d'] = visualizer.visualize_embeddings(st.session_state.processed_data, method='pca', dimensions=2)
-            st.session_state.visualizations['umap_3d'] = visualizer.visualize_embeddings(st.session_state.processed_data, method='umap', dimensions=3)
-            st.session_state.visualizations['umap_2d'] = visualizer.visualize_embeddings(st.session_state.processed_data, method='umap', dimensions=2)
+            # Generate PCA and UMAP visualizations; reducers are fit once and shared
+            st.session_state.visualizations = visualizer.generate_visualizations(st.session_state.processed_data)
 
             st.subheader("Content Statistics")
             st.write(f"Total pages crawled: {len(content)}")
+            if incremental:
+                st.write(f"Unchanged since last crawl: {len(crawler.unchanged_urls)}")
             st.write(f"Total embeddings generated: {len(embeddings_data)}")
+            st.write(f"Duplicate pages skipped: {deduplicator.skipped}")
+            st.write(f"Topics found: {len(st.session_state.clusters['clusters'])}")
 
 # Display visualizations if available
 if st.session_state.visualizations:
@@ -98,6 +218,117 @@ if st.session_state.visualizations:
         st.subheader("Crawled Pages")
         display_table(st.session_state.processed_data)
 
+# Topic summaries from the clustering stage
+if st.session_state.processed_data and st.session_state.clusters is not None:
+    st.subheader("🧩 Topics")
+    store = st.session_state.processed_data
+    st.dataframe(
+        [{'Topic': cluster['id'],
+          'Pages': cluster['size'],
+          'Keywords': ', '.join(cluster['keywords']),
+          'Representative pages': ' | '.join(store.titles[i] or store.urls[i]
+                                             for i in cluster['representatives'])}
+         for cluster in st.session_state.clusters['clusters']],
+        use_container_width=True
+    )
+
+# Distance between sites and what the reference site is missing
+if st.session_state.processed_data and st.session_state.comparison is not None:
+    report = st.session_state.comparison
+    st.subheader("🆚 Site Comparison")
+    st.write(f"Reference site: {report['reference']} — " +
+             ", ".join(f"{site['site']}: {site['pages']} pages" for site in report['sites']))
+    names = [site['site'] for site in report['sites']]
+    st.write("Distance between site centroids (cosine; 0 = same overall content):")
+    st.dataframe({'Site': names, **{name: [round(row[i], 3) for row in report['centroid_distances']]
+                                    for i, name in enumerate(names)}}, use_container_width=True)
+    for site in report['coverage']:
+        st.write(f"**{site['site']}**: {site['uncovered']} of {site['pages']} pages have no close "
+                 f"match on {report['reference']}")
+        if site['gaps']:
+            st.dataframe([{'Page': gap['title'] or gap['url'], 'URL': gap['url'],
+                           'Closest match': gap['closest_url'],
+                           'Similarity': round(gap['similarity'], 3) if gap['similarity'] is not None else None}
+                          for gap in site['gaps']], use_container_width=True)
+    missing = [topic for topic in report.get('topics', []) if topic['missing']]
+    if missing:
+        st.write(f"Topics covered by competitors but not by {report['reference']}:")
+        st.dataframe([{'Topic': topic['id'], 'Keywords': ', '.join(topic['keywords']), **topic['pages']}
+                      for topic in missing], use_container_width=True)
+
+# Link graph analytics next to the embeddings
+if st.session_state.processed_data and st.session_state.link_graph is not None:
+    st.subheader("🕸️ Site Structure")
+    store = st.session_state.processed_data
+    graph = st.session_state.link_graph
+    summary = graph.summary(titles=dict(zip(store.urls, store.titles)))
+    st.write(f"{summary['crawled']} pages crawled, {summary['edges']} links, "
+             f"{len(summary['orphans'])} orphan pages (no internal links point to them)")
+    st.dataframe(
+        [{'Page': page['title'] or page['url'], 'URL': page['url'],
+          'PageRank': round(page['pagerank'], 4),
+          'Depth': page['depth'] if page['depth'] >= 0 else None,
+          'Inlinks': page['inlinks']} for page in summary['top_pages']],
+        use_container_width=True
+    )
+    if summary['orphans']:
+        st.write("Orphan pages:")
+        st.dataframe([{'Page': page['title'] or page['url'], 'URL': page['url']}
+                      for page in summary['orphans']], use_container_width=True)
+
+    threshold = st.slider("Similarity for missing-link suggestions:", 0.5, 1.0, 0.85, 0.01)
+    pairs = graph.similar_unlinked(store, threshold=threshold, limit=50)
+    st.write("Similar pages that don't link to each other:")
+    st.dataframe(
+        [{'Page': store.titles[i] or store.urls[i], 'Similar page': store.titles[j] or store.urls[j],
+          'Similarity': round(score, 3)} for i, j, score in pairs],
+        use_container_width=True
+    )
+
+# Semantic search over the embedded pages
+if st.session_state.processed_data and st.session_state.search_index is not None:
+    st.subheader("🔎 Semantic Search")
+    store = st.session_state.processed_data
+    index = st.session_state.search_index
+
+    def display_hits(hits):
+        st.dataframe(
+            [{'Title': store.titles[i], 'URL': store.urls[i], 'Similarity': round(score, 3)}
+             for i, score in hits],
+            use_container_width=True
+        )
+
+    search_tab, similar_tab = st.tabs(["Search by text", "Similar pages"])
+
+    with search_tab:
+        query = st.text_input("Find pages about:")
+        search_passages = st.checkbox("Match individual passages",
+                                      disabled=st.session_state.passage_index is None)
+        if query.strip():
+            with st.spinner("Searching..."):
+                embedding_client = create_embedding_client(st.session_state.embedding_backend,
+                                                            cache=EmbeddingCache())
+                try:
+                    query_vector = embedding_client.embed_query(query)
+                finally:
+                    embedding_client.close()
+                if search_passages:
+                    passages = st.session_state.passages
+                    st.dataframe(
+                        [{'Title': passages.titles[i], 'URL': passages.urls[i],
+                          'Passage': passages.content(i), 'Similarity': round(score, 3)}
+                         for i, score in st.session_state.passage_index.search(query_vector, k=10)],
+                        use_container_width=True
+                    )
+                else:
+                    display_hits(index.search(query_vector, k=10))
+
+    with similar_tab:
+        selected = st.selectbox("Find pages similar to:", store.urls)
+        if selected:
+            position = store.urls.index(selected)
+            display_hits(index.search(index.vector(position), k=10, exclude=position))
+
 # Footer
 st.markdown("---")
 st.caption("Powered by Google Generative AI and Streamlit")
@@ -122,7 +353,7 @@ with st.expander("Click here for a detailed guide on understanding these visuali
     2. **UMAP (Uniform Manifold Approximation and Projection)**
        - A more advanced technique that better preserves local relationships
        - Shows clusters more clearly
-       - May fall back to PCA for very small datasets (fewer than 4 pages)
+       - Falls back to PCA for very small datasets (fewer than 15 pages)
 
     #### 2D vs 3D Views
 
@@ -144,7 +375,7 @@ with st.expander("Click here for a detailed guide on understanding these visuali
 
     #### What to Look For
 
-    1. **Clusters**: Groups of pages that are close together likely have similar content
+    1. **Clusters**: Points are colored by topic. Topics are computed on the full embeddings, so a topic that looks split in 2D/3D is still one group; see the Topics table for each topic's keywords and most typical pages
     2. **Outliers**: Pages far from others may have unique content
     3. **Gradients**: Smooth transitions between topics
     4. **Dimensions**: Each axis represents a mathematical combination of features from the original embeddings
@@ -154,7 +385,7 @@ with st.expander("Click here for a detailed guide on understanding these visuali
     - **Content Organization**: Identify logical groupings for site structure
     - **Content Gaps**: Find areas where content is sparse
     - **Redundancy**: Identify pages with very similar content
-    - **Navigation Improvements**: Create better internal linking between related pages
+    - **Navigation Improvements**: Create better internal linking between related pages; the Site Structure section lists similar pages that don't link to each other yet
     
     #### Technical Notes
     
@@ -178,8 +409,10 @@ with st.expander("Troubleshooting"):
        - Check if the pages have enough unique content
 
     3. **UMAP warnings**
-       - UMAP works best with larger datasets (10+ pages)
-       - For small datasets, the system automatically falls back to PCA
+       - UMAP works best with larger datasets (15+ pages)
+       - For smaller datasets, the system automatically falls back to PCA
+       - Very large datasets get fewer layout epochs, or a sampled fit, to stay
+         within the time budget (`REDUCTION_TIME_BUDGET` seconds)
 
     4. **Slow performance**
        - Reduce the number of pages crawled
@@ -0,0 +1,191 @@
+import json
+import os
+
+import numpy as np
+
+# Above this many vectors the index switches from brute force to IVF
+IVF_THRESHOLD = 20000
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over page embeddings.
+
+    Vectors are L2-normalized into a float32 matrix so similarity is a dot
+    product. Small indexes answer queries with one BLAS matrix product and
+    a partial sort. Once the index grows past ``ivf_threshold`` vectors it
+    trains an inverted-file (IVF) layer: k-means centroids partition the
+    vectors into lists, and a query only scores the ``n_probe`` lists whose
+    centroids are closest. New vectors can be added at any time; once IVF is
+    trained they are assigned to their nearest list without retraining.
+    The matrix grows geometrically, so adding in batches stays linear.
+    """
+
+    VECTORS_FILE = 'index_vectors.npy'
+    CENTROIDS_FILE = 'index_centroids.npy'
+    ASSIGNMENTS_FILE = 'index_assignments.npy'
+    METADATA_FILE = 'index.json'
+
+    def __init__(self, dimensions=None, ivf_threshold=IVF_THRESHOLD, n_lists=None, n_probe=8):
+        self.dimensions = dimensions
+        self.ivf_threshold = ivf_threshold
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self._buffer = np.empty((0, dimensions or 0), dtype=np.float32)
+        self._size = 0
+        self._centroids = None
+        self._assignments = None
+        self._lists = None
+
+    @classmethod
+    def from_store(cls, store, **kwargs):
+        index = cls(dimensions=store.dimensions, **kwargs)
+        index.add(store.vectors)
+        return index
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def _vectors(self):
+        """The indexed vectors: a view of the filled part of the buffer."""
+        return self._buffer[:self._size]
+
+    @_vectors.setter
+    def _vectors(self, vectors):
+        self._buffer = vectors
+        self._size = vectors.shape[0]
+
+    @property
+    def uses_ivf(self):
+        return self._centroids is not None
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, vectors):
+        """Add vectors; their ids continue from the current size of the index."""
+        # Checked before normalizing: ndmin=2 would turn [] into one empty row
+        if len(vectors) == 0:
+            return
+        vectors = self._normalize(vectors)
+        if self.dimensions is None or self._size == 0:
+            self.dimensions = vectors.shape[1]
+            self._buffer = np.empty((len(vectors), self.dimensions), dtype=np.float32)
+        start = self._size
+        needed = start + len(vectors)
+        if needed > self._buffer.shape[0]:
+            grown = np.empty((max(needed, 2 * self._buffer.shape[0]), self.dimensions),
+                             dtype=np.float32)
+            grown[:start] = self._buffer[:start]
+            self._buffer = grown
+        self._buffer[start:needed] = vectors
+        self._size = needed
+
+        if self.uses_ivf:
+            assignments = self._nearest_lists(vectors, 1)[:, 0]
+            self._assignments = np.concatenate([self._assignments, assignments])
+            for offset, list_id in enumerate(assignments):
+                self._lists[list_id].append(start + offset)
+        elif len(self) >= self.ivf_threshold:
+            self._train_ivf()
+
+    def _train_ivf(self):
+        from sklearn.cluster import MiniBatchKMeans
+
+        n_lists = self.n_lists or int(np.sqrt(len(self)))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=3, random_state=0)
+        kmeans.fit(self._vectors)
+        self._centroids = self._normalize(kmeans.cluster_centers_)
+        self._assignments = self._nearest_lists(self._vectors, 1)[:, 0]
+        self._build_lists()
+
+    def _build_lists(self):
+        order = np.argsort(self._assignments, kind='stable')
+        bounds = np.searchsorted(self._assignments[order], np.arange(len(self._centroids) + 1))
+        self._lists = [list(order[bounds[i]:bounds[i + 1]]) for i in range(len(self._centroids))]
+
+    def _nearest_lists(self, vectors, count):
+        scores = vectors @ self._centroids.T
+        count = min(count, scores.shape[1])
+        return np.argpartition(-scores, count - 1, axis=1)[:, :count]
+
+    def search(self, query, k=10, exclude=None):
+        """
+        Find the ``k`` most similar indexed vectors to ``query``.
+
+        Args:
+            query: A single embedding vector
+            k: Number of results
+            exclude: Optional id to leave out (e.g. the query page itself)
+
+        Returns:
+            List of ``(id, cosine_similarity)`` pairs, best first
+        """
+        if len(self) == 0:
+            return []
+        query = self._normalize(query)[0]
+
+        if self.uses_ivf:
+            lists = self._nearest_lists(query[None, :], self.n_probe)[0]
+            candidates = np.fromiter((i for list_id in lists for i in self._lists[list_id]),
+                                     dtype=np.int64)
+        else:
+            candidates = None
+
+        matrix = self._vectors if candidates is None else self._vectors[candidates]
+        scores = matrix @ query
+        if exclude is not None:
+            if candidates is None:
+                scores[exclude] = -np.inf
+            else:
+                scores[candidates == exclude] = -np.inf
+
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = top if candidates is None else candidates[top]
+        return [(int(i), float(scores[t])) for i, t in zip(ids, top) if np.isfinite(scores[t])]
+
+    def vector(self, index):
+        return self._vectors[index]
+
+    def save(self, directory):
+        """Persist the index, typically next to the EmbeddingStore it was built from."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, self.VECTORS_FILE), self._vectors)
+        if self.uses_ivf:
+            np.save(os.path.join(directory, self.CENTROIDS_FILE), self._centroids)
+            np.save(os.path.join(directory, self.ASSIGNMENTS_FILE), self._assignments)
+        with open(os.path.join(directory, self.METADATA_FILE), 'w') as f:
+            json.dump({
+                'dimensions': self.dimensions,
+                'ivf_threshold': self.ivf_threshold,
+                'n_lists': self.n_lists,
+                'n_probe': self.n_probe,
+                'ivf': self.uses_ivf
+            }, f)
+        return directory
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, cls.METADATA_FILE)) as f:
+            metadata = json.load(f)
+        index = cls(dimensions=metadata['dimensions'], ivf_threshold=metadata['ivf_threshold'],
+                    n_lists=metadata['n_lists'], n_probe=metadata['n_probe'])
+        index._vectors = np.load(os.path.join(directory, cls.VECTORS_FILE), mmap_mode='r')
+        if metadata['ivf']:
+            index._centroids = np.load(os.path.join(directory, cls.CENTROIDS_FILE))
+            index._assignments = np.load(os.path.join(directory, cls.ASSIGNMENTS_FILE))
+            index._build_lists()
+        return index
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, cls.METADATA_FILE))
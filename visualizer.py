@@ -1,63 +1,142 @@
-import pandas as pd
+import base64
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from sklearn.decomposition import PCA
-import umap
 import warnings
-from scipy import sparse
+from reduction import ProjectionCache, ReductionEngine, ReferenceReduction, density_downsample
+from embedding_store import EmbeddingStore
+import metrics
 
 class EmbeddingVisualizer:
-    def __init__(self):
+    def __init__(self, embeddings_data=None, max_points=20000, lazy_hover_threshold=5000,
+                 clusters=None, sites=None):
+        """
+        Args:
+            embeddings_data: Optional EmbeddingStore or list of dictionaries
+                with content and embedding
+            clusters: Optional ``TopicClusterer.fit`` result; points are then
+                colored by topic
+            sites: Optional ``load_sites`` result for a multi-site store;
+                points are then colored by site, and with mode 'reference'
+                the reducers are fit on the reference site only
+            max_points: Points sent to the browser per figure; larger datasets
+                are thinned with density-aware downsampling
+            lazy_hover_threshold: Above this many pages the content preview is
+                left out of the figure and fetched on demand by index
+        """
         warnings.filterwarnings('ignore')
+        self.embeddings_data = embeddings_data
+        self.max_points = max_points
+        self.lazy_hover_threshold = lazy_hover_threshold
+        self.clusters = clusters
+        self.sites = sites
+        self._engine = None
+        self._engine_source = None
+        self._store = None
+        self._store_source = None
+
+    def as_store(self, embeddings_data):
+        """Return ``embeddings_data`` as an EmbeddingStore, converting a list once."""
+        if isinstance(embeddings_data, EmbeddingStore):
+            return embeddings_data
+        if (self._store is None or self._store_source is not embeddings_data
+                or len(self._store) != len(embeddings_data)):
+            self._store = EmbeddingStore.from_pages(embeddings_data)
+            self._store_source = embeddings_data
+        return self._store
+
+    def reduction_engine(self, embeddings_data):
+        """Return the ReductionEngine for this dataset, building it on first use."""
+        # Repeated calls with the same, unmodified dataset reuse the fitted reducers
+        store = self.as_store(embeddings_data)
+        if (self._engine is None or self._engine_source is not embeddings_data
+                or self._engine.n_samples != len(store)):
+            reference_rows = None
+            if self.sites is not None and self.sites.get('mode') == 'reference':
+                reference_rows = np.flatnonzero(self.sites['labels'] == self.sites['reference'])
+            if reference_rows is not None and len(reference_rows):
+                # Other sites are projected into the reference site's space
+                self._engine = ReferenceReduction(store.vectors, reference_rows)
+            else:
+                # Settings chosen from the dataset's size; layouts of vectors
+                # seen before come from the projection cache
+                self._engine = ReductionEngine.planned(store.vectors, cache=ProjectionCache())
+            self._engine_source = embeddings_data
+        return self._engine
+
+    def generate_visualizations(self, embeddings_data=None):
+        """
+        Build the PCA and UMAP views in 3D and 2D.
+
+        Returns:
+            Dictionary with 'pca_3d', 'pca_2d', 'umap_3d' and 'umap_2d' figures
+        """
+        embeddings_data = embeddings_data if embeddings_data is not None else self.embeddings_data
+        with metrics.STAGE_SECONDS.time(stage='visualize'):
+            return {
+                f"{method}_{dimensions}d": self.visualize_embeddings(embeddings_data, method=method,
+                                                                     dimensions=dimensions)
+                for method in ('pca', 'umap')
+                for dimensions in (3, 2)
+            }
         
     def visualize_embeddings(self, embeddings_data, method='pca', dimensions=3):
         """
         Visualize embeddings using dimensionality reduction
         
         Args:
-            embeddings_data: List of dictionaries with content and embedding
+            embeddings_data: EmbeddingStore or list of dictionaries with content
+                and embedding
             method: 'pca' or 'umap' for dimensionality reduction
             dimensions: Number of dimensions for the visualization
             
         Returns:
             Plotly figure object
         """
+        # pandas and plotly are only needed to build figures, not payloads
+        import pandas as pd
+        import plotly.express as px
+
         if not embeddings_data:
             return px.scatter(title="No data to visualize")
         
         # Print the first item to debug the structure
         print("Data structure sample:", embeddings_data[0].keys())
         
-        # Extract embeddings, URLs, titles, and content
-        embeddings = np.array([item['embedding'] for item in embeddings_data])
-        urls = [item['url'] for item in embeddings_data]
-        titles = [item['title'] for item in embeddings_data]
-        texts = [item['content'][:200] + '...' if len(item['content']) > 200 else item['content'] for item in embeddings_data]
-        
-        # Reduce dimensions
-        if method == 'pca':
-            reducer = PCA(n_components=dimensions)
-        else:  # umap
-            reducer = umap.UMAP(n_components=dimensions)
-        
-        reduced_data = reducer.fit_transform(embeddings)
+        # Reduce dimensions, reusing reducers fitted by earlier calls
+        reduced_data = self.reduction_engine(embeddings_data).project(method, dimensions)
+        store = self.as_store(embeddings_data)
+
+        # Keep the browser responsive on very large crawls
+        indices = density_downsample(reduced_data, self.max_points)
+        large = len(store) > self.lazy_hover_threshold
         
-        # Create dataframe for plotting
-        df = pd.DataFrame(reduced_data, columns=[f"Dimension {i+1}" for i in range(dimensions)])
-        df['url'] = urls
-        df['title'] = titles
-        df['content'] = texts
+        # Extract URLs, titles, and content
+        df = pd.DataFrame(reduced_data[indices], columns=[f"Dimension {i+1}" for i in range(dimensions)])
+        df['index'] = indices
+        df['url'] = [store.urls[i] for i in indices]
+        df['title'] = [store.titles[i] for i in indices]
         
         hover_data = {
             'url': True,
             'title': True,
-            'content': True
+            'index': False
         }
+        color = None
+        if self.clusters is not None:
+            df['topic'] = [self._topic_name(label) for label in self.clusters['labels'][indices]]
+            hover_data['topic'] = True
+            color = 'topic'
+        if self.sites is not None:
+            # Site overlays take the color; the topic stays in the hover text
+            df['site'] = [self.sites['sites'][label] for label in self.sites['labels'][indices]]
+            hover_data['site'] = True
+            color = 'site'
+        if not large:
+            df['content'] = [self._preview(store.content(i)) for i in indices]
+            hover_data['content'] = True
         
         if dimensions == 3:
             fig = px.scatter_3d(df, x='Dimension 1', y='Dimension 2', z='Dimension 3',
-                                hover_data=hover_data,
+                                hover_data=hover_data, custom_data=['index'], color=color,
                                 title=f"{method.upper()} 3D Visualization")
             fig.update_layout(scene=dict(
                 xaxis_title='Dimension 1',
@@ -66,11 +145,93 @@ class EmbeddingVisualizer:
             ))
         else:
             fig = px.scatter(df, x='Dimension 1', y='Dimension 2',
-                             hover_data=hover_data,
+                             hover_data=hover_data, custom_data=['index'], color=color,
+                             render_mode='webgl' if large else 'auto',
                              title=f"{method.upper()} 2D Visualization")
             fig.update_layout(
                 xaxis_title='Dimension 1',
                 yaxis_title='Dimension 2'
             )
         
-        return fig 
\ No newline at end of file
+        if len(indices) < len(store):
+            fig.update_layout(title=f"{fig.layout.title.text} "
+                                    f"({len(indices)} of {len(store)} pages shown)")
+        
+        return fig
+
+    def build_payload(self, embeddings_data=None):
+        """
+        Compact, JSON-serializable form of all four views for the browser.
+
+        Instead of four Plotly figures that each repeat the hover text of
+        every point, the payload has one shared point table and, per view,
+        the rows of that table it plots plus their coordinates. Numeric
+        arrays are base64-encoded little-endian binary (int32 rows, float32
+        coordinates) that the page decodes into typed arrays.
+
+        Returns:
+            Dictionary with 'total', 'points' (index, url, title and, for
+            small datasets, preview columns; cluster and site when known),
+            'views' and, when known, 'clusters' and 'sites'
+        """
+        with metrics.STAGE_SECONDS.time(stage='visualize'):
+            return self._build_payload(embeddings_data if embeddings_data is not None
+                                       else self.embeddings_data)
+
+    def _build_payload(self, embeddings_data):
+        store = self.as_store(embeddings_data)
+        engine = self.reduction_engine(embeddings_data)
+
+        selections = {}
+        for method in ('pca', 'umap'):
+            for dimensions in (3, 2):
+                reduced = engine.project(method, dimensions)
+                selections[f"{method}_{dimensions}d"] = (reduced, density_downsample(reduced, self.max_points))
+
+        # Union of the points any view shows, in index order
+        shown = np.unique(np.concatenate([indices for _, indices in selections.values()]))
+        points = {
+            'index': shown.tolist(),
+            'url': [store.urls[i] for i in shown],
+            'title': [store.titles[i] for i in shown]
+        }
+        if len(store) <= self.lazy_hover_threshold:
+            points['preview'] = [self._preview(store.content(i)) for i in shown]
+        if self.clusters is not None:
+            points['cluster'] = self.clusters['labels'][shown].tolist()
+        if self.sites is not None:
+            points['site'] = self.sites['labels'][shown].tolist()
+
+        views = {}
+        for name, (reduced, indices) in selections.items():
+            method, dimensions = name.split('_')
+            views[name] = {
+                'method': method,
+                'dimensions': int(dimensions[0]),
+                'rows': self._encode(np.searchsorted(shown, indices).astype('<i4')),
+                'coords': self._encode(np.ascontiguousarray(reduced[indices], dtype='<f4')),
+                'shown': int(len(indices))
+            }
+        payload = {'total': len(store), 'points': points, 'views': views}
+        if self.clusters is not None:
+            payload['clusters'] = [{'id': cluster['id'], 'name': self._topic_name(cluster['id']),
+                                    'size': cluster['size']}
+                                   for cluster in self.clusters['clusters']]
+        if self.sites is not None:
+            payload['sites'] = self.sites['sites']
+        return payload
+
+    def _topic_name(self, label):
+        """Legend label for a cluster: its id and leading keywords."""
+        if label < 0:
+            return 'Unclustered'
+        keywords = self.clusters['clusters'][label]['keywords'][:3]
+        return f"Topic {label}: {', '.join(keywords)}" if keywords else f"Topic {label}"
+
+    @staticmethod
+    def _encode(array):
+        return base64.b64encode(array.tobytes()).decode('ascii')
+
+    @staticmethod
+    def _preview(content):
+        return content[:200] + '...' if len(content) > 200 else content